@@ -1,15 +1,22 @@
 import os
 import math
 import time
-import datetime
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import ephem
+import erfa
 import numpy as np
 from PyQt5 import QtCore
-from pyorbital import tlefile
-from astropy.coordinates import SkyCoord, EarthLocation, FK5
-from astropy.time import Time
-from skyfield.api import load
+from Core.Astronomy.AstronomyContext import AstronomyContext
+from Core.Astronomy.EphemerisPool import EphemerisPool
+from Core.Astronomy.MatrixCache import radec_to_vectors, vectors_to_radec
+from Core.Astronomy.RateEstimator import RateEstimator
+from Core.Astronomy.SatellitePropagator import SatellitePropagator
+from Core.Astronomy.ScanMap import ScanMap, scan_grid
+from Core.Astronomy.TrajectoryCache import TrajectoryCache
+from Core.Handlers.TLECatalog import TLECatalog
 
 
 RAD_TO_DEG = 57.2957795131  # Radians to degrees conversion factor
@@ -19,6 +26,30 @@ SEC_TO_DAY = 1.1574074e-5  # How many days a second has
 MOTOR_RA_STEPS_PER_DEGREE = 43200.0 / 15.0  # 43200 is in steps per hour of right ascension
 MOTOR_DEC_STEPS_PER_DEGREE = 10000.0  # Steps per degree
 MAX_STEP_FREQUENCY = 200.0  # Maximum stepping frequency of the motors in Hz
+LOCATION_SETTINGS = (("location", "latitude"), ("location", "longitude"), ("location", "altitude"))
+SCAN_CHUNK_SIZE = 256  # Number of scan points calculated at once, when streaming them
+# Smallest maps calculated in parallel. Starting the worker processes takes a couple of seconds, which is only worth it
+# for large maps, and sooner for the planetary objects, whose points are calculated one by one.
+PARALLEL_SCAN_MIN_POINTS = 100000
+PARALLEL_SCAN_MIN_PLANETARY_POINTS = 5000
+
+_scan_worker = None  # Calculations object of a scan worker process
+
+
+def _init_scan_worker(settings_file: str):
+    """
+    Create the calculations object of a scan worker process, from the settings file of the application.
+    """
+    global _scan_worker
+    from Core.Configuration.ConfigData import ConfData  # Imported here, since only the workers need it
+    _scan_worker = Calculations(ConfData(settings_file))
+
+
+def _scan_worker_chunk(points, increments, tr_time: int, objec):
+    """
+    Calculate a chunk of scanning points in a scan worker process.
+    """
+    return _scan_worker.scan_chunk_points(points, increments, tr_time, objec)
 
 
 class Calculations(QtCore.QObject):
@@ -29,7 +60,7 @@ class Calculations(QtCore.QObject):
     Todo:
         Replace deprecated PyEphem with astropy and skyfield
     """
-    def __init__(self, cfg_data, parent=None):
+    def __init__(self, cfg_data, parent=None, tle_catalog=None):
         """
         Calculations class constructor to initialize the required variables. Also the logger object is created.
 
@@ -39,16 +70,41 @@ class Calculations(QtCore.QObject):
         Args:
             cfg_data: The XML parser object
             parent: Parent class, if any
+            tle_catalog: The `TLECatalog` of the saved TLE files. By default, one is created for the files of the TLE
+                URLs in the settings.
         """
         super(Calculations, self).__init__(parent)
         self.logger = logging.getLogger(__name__)  # Create the logger for the file
         self.cfg_data = cfg_data
 
         lat_lon = cfg_data.get_lat_lon()  # Get the latitude and longitude
-        self.location = EarthLocation(lat=lat_lon[0], lon=lat_lon[1])  # Astropy location object
-        self.observer = ephem.Observer()  # Create the observer object
-        self.observer.lat, self.observer.lon = lat_lon[0], lat_lon[1]  # Provide the observer's location
-        self.observer.elevation = float(cfg_data.get_altitude())  # Set the location's altitude in meters
+        self.context = AstronomyContext(lat_lon[0], lat_lon[1], cfg_data.get_altitude())  # Long lived objects
+        self.location = self.context.location  # Astropy location object
+        self.ephemeris = EphemerisPool()  # Reusable planetary bodies
+        self.rate_estimator = RateEstimator()  # Rate of change fitting for the moving objects
+        if tle_catalog is None:
+            tle_catalog = TLECatalog([os.path.abspath("TLE/" + url.split("/")[-1])
+                                      for url in cfg_data.get_tle_url().split()])
+        self.tle_catalog = tle_catalog  # Satellites of the TLE files, indexed by name and NORAD ID
+        self.satellites = SatellitePropagator(self.context)  # Vectorized satellite positions
+        self.trajectories = TrajectoryCache(self.satellites)  # Interpolated positions of the pointed satellites
+        cfg_data.subscribe(self.location_changed, LOCATION_SETTINGS)  # Follow the location set by the user
+
+    def location_changed(self, changed=None):
+        """
+        Update the observer location of the context from the settings. The local observers and the satellite positions
+        are derived from the context, so they follow the new location.
+
+        Args:
+            changed: The changed location settings
+        """
+        self.context.set_location(self.cfg_data.get_value("location", "latitude"),
+                                  self.cfg_data.get_value("location", "longitude"),
+                                  self.cfg_data.get_value("location", "altitude") or 0.0)
+        location = self.context.observer
+        self.location = location.location
+        self.trajectories.invalidate()  # The satellite positions are relative to the observer
+        self.logger.info("Observer location changed to %.4f, %.4f", location.latitude, location.longitude)
 
     def hour_angle(self, object_ra: float, object_dec: float, date=None):
         """
@@ -72,26 +128,9 @@ class Calculations(QtCore.QObject):
         Returns:
             float: Calculated hour angle
         """
-        if date is None:
-            date = self.current_time()
-        else:
-            if len(date) == 3:
-                day = int(date[2])
-                hour = (date[2] - day) * 24
-                minute = (hour - int(hour)) * 60
-                second = int(minute - int(minute)) * 60
-                date = (date[0], date[1], day, int(hour), int(minute), second)
-
-        object_coordinates = SkyCoord(ra=str(object_ra), dec=str(object_dec), unit='deg')
-        equinox_time = Time(datetime.datetime(*date), scale='utc', location=self.location, format='datetime')
-        ra_jnow = object_coordinates.transform_to(FK5(equinox=equinox_time)).ra
-
-        # Get the local sidereal time
-        time_scale = load.timescale()
-        utc_time = time_scale.utc(*date)
-        local_sidereal_time = utc_time.gast * 15 + self.location.lon.degree
-
-        return round(local_sidereal_time - ra_jnow.degree, 6)  # Return the calculated hour angle
+        hour_angle = self._hour_angles(np.array([object_ra], dtype=float), np.array([object_dec], dtype=float),
+                                       [self.date_tuple(date)])
+        return round(hour_angle[0], 6)  # Return the calculated hour angle
 
     def hour_angle_to_ra(self, object_ha: float, object_dec: float, date=None):
         """
@@ -109,30 +148,134 @@ class Calculations(QtCore.QObject):
         Returns:
             The current right ascension of the object in J2000
         """
-        # Get the local sidereal time
-        if date is None:
-            date = self.current_time()  # Get the current time and date as needed
+        right_ascension = self._right_ascensions(np.array([object_ha], dtype=float),
+                                                 np.array([object_dec], dtype=float), [self.date_tuple(date)])
+        return round(right_ascension[0], 6)
+
+    def hour_angle_array(self, object_ra, object_dec, dates=None):
+        """
+        Vectorized version of `hour_angle`. All the coordinates are converted with a single astropy transformation and
+        a single sidereal time calculation.
+
+        Args:
+            object_ra: Array of right ascensions in J2000 (degrees)
+            object_dec: Array of declinations in J2000 (degrees)
+            dates: Either one date tuple used for all the coordinates, or a sequence of date tuples (one per
+                coordinate). Default is the current time.
+
+        Returns:
+            np.ndarray: The calculated hour angles in degrees
+        """
+        object_ra, object_dec, dates = self._batch_arguments(object_ra, object_dec, dates)
+        return np.round(self._hour_angles(object_ra, object_dec, dates), 6)
+
+    def hour_angle_to_ra_array(self, object_ha, object_dec, dates=None):
+        """
+        Vectorized version of `hour_angle_to_ra`. All the coordinates are converted with a single astropy
+        transformation and a single sidereal time calculation.
+
+        Args:
+            object_ha: Array of hour angles (degrees)
+            object_dec: Array of declinations (degrees)
+            dates: Either one date tuple used for all the coordinates, or a sequence of date tuples (one per
+                coordinate). Default is the current time.
+
+        Returns:
+            np.ndarray: The right ascensions of the coordinates in J2000 (degrees)
+        """
+        object_ha, object_dec, dates = self._batch_arguments(object_ha, object_dec, dates)
+        return np.round(self._right_ascensions(object_ha, object_dec, dates), 6)
+
+    def _batch_arguments(self, coord_1, coord_2, dates):
+        """
+        Bring the arguments of the vectorized conversions to the form expected by the calculation methods.
+
+        Args:
+            coord_1: First coordinate (RA or HA), scalar or array like
+            coord_2: Declination, scalar or array like
+            dates: None, a single date tuple or a sequence of date tuples
+
+        Returns:
+            tuple: Flat coordinate arrays of equal size and the list of full date tuples
+        """
+        coord_1, coord_2 = np.broadcast_arrays(np.atleast_1d(np.asarray(coord_1, dtype=float)),
+                                               np.atleast_1d(np.asarray(coord_2, dtype=float)))
+        if dates is None or np.isscalar(dates[0]):
+            dates = [self.date_tuple(dates)]  # One date for all the points
         else:
-            if len(date) == 3:
-                day = int(date[2])
-                hour = (date[2] - day)*24
-                minute = (hour - int(hour))*60
-                second = int(minute - int(minute))*60
-                date = (date[0], date[1], day, int(hour), int(minute), second)
-
-        # Calculate the desired right ascension
-        time_scale = load.timescale()
-        utc_time = time_scale.utc(*date)
-        local_sidereal_time = utc_time.gast * 15 + self.location.lon.degree
+            dates = [self.date_tuple(date) for date in dates]
+            if len(dates) != coord_1.size:
+                raise ValueError("Expected %d dates but %d were given" % (coord_1.size, len(dates)))
+        return coord_1.ravel(), coord_2.ravel(), dates
+
+    def _sidereal_and_epochs(self, dates: list, size: int):
+        """
+        Calculate the local sidereal time and the Julian dates of the provided dates. Scan points share a lot of
+        dates, so the expensive calculations are done only for the unique ones. Dates covered by the sidereal time
+        table are interpolated, the rest are calculated exactly with skyfield.
+
+        Args:
+            dates (list): Full date tuples. A single date is shared by all the coordinates.
+            size (int): Number of coordinates
+
+        Returns:
+            tuple: Local sidereal time in degrees per coordinate, the UTC Julian dates (two parts) of the unique dates
+            and the index of the unique date for each coordinate
+        """
+        if len(dates) == 1:
+            unique_dates, date_index = np.array(dates, dtype=float), np.zeros(size, dtype=int)
+        else:
+            unique_dates, date_index = np.unique(np.array(dates, dtype=float), axis=0, return_inverse=True)
+            date_index = date_index.ravel()
+        components = unique_dates.T
+        jd_1, jd_2 = erfa.dtf2d(b'UTC', *components[:5].astype(int), components[5])  # Same as astropy's conversion
+
+        gast = self.context.sidereal.lookup(jd_1, jd_2)  # Interpolated sidereal time for dates around now
+        if gast is None:
+            gast = self.context.timescale.utc(*components[:5].astype(int), components[5]).gast  # Exact calculation
+        local_sidereal_time = np.atleast_1d(gast)[date_index] * 15 + self.context.longitude
+        return local_sidereal_time, jd_1, jd_2, date_index
+
+    def _hour_angles(self, object_ra, object_dec, dates: list):
+        """
+        Unrounded hour angles for arrays of J2000 coordinates.
+        """
+        local_sidereal_time, jd_1, jd_2, date_index = self._sidereal_and_epochs(dates, object_ra.size)
+        matrices = self.context.precession.to_jnow(jd_1, jd_2)  # Precession to the equinox of date
+        vectors = np.einsum('nij,nj->ni', matrices[date_index], radec_to_vectors(object_ra, object_dec))
+        ra_jnow = vectors_to_radec(vectors)[0]
+        return local_sidereal_time - ra_jnow
+
+    def _right_ascensions(self, object_ha, object_dec, dates: list):
+        """
+        Unrounded J2000 right ascensions for arrays of hour angles.
+        """
+        local_sidereal_time, jd_1, jd_2, date_index = self._sidereal_and_epochs(dates, object_ha.size)
         calculated_ra = local_sidereal_time - object_ha  # Calculate the right ascension in JNOW
+        matrices = self.context.precession.to_j2000(jd_1, jd_2)  # Precession back to J2000
+        vectors = np.einsum('nij,nj->ni', matrices[date_index], radec_to_vectors(calculated_ra, object_dec))
+        return vectors_to_radec(vectors)[0]
+
+    def date_tuple(self, date=None):
+        """
+        Convert the provided date to the full date tuple used by the conversions. If no date is given, then the current
+        time is used.
 
-        # Calculate the right ascension of the provided object in J2000
-        equinox_time = Time(datetime.datetime(*date), scale='utc', location=self.location, format='datetime')
-        object_coordinates = SkyCoord(ra=str(calculated_ra), dec=str(object_dec), unit='deg',
-                                      frame=FK5, equinox=equinox_time)
-        ra_j2000 = object_coordinates.transform_to(FK5(equinox='J2000.0')).ra
+        Args:
+            date (tuple): Either (year, month, decimal day) or (year, month, day, hour, minute, second)
 
-        return round(ra_j2000.degree, 6)
+        Returns:
+            tuple: The date as (year, month, day, hour, minute, second)
+        """
+        if date is None:
+            date = self.current_time()
+        elif len(date) == 3:
+            day = int(date[2])
+            hour = (date[2] - day) * 24
+            minute = (hour - int(hour)) * 60
+            second = int(minute - int(minute)) * 60
+            date = (date[0], date[1], day, int(hour), int(minute), second)
+        return date
 
     @staticmethod
     def current_time(decimal_day=False, dummy_time=None):
@@ -177,7 +320,6 @@ class Calculations(QtCore.QObject):
         cur_ha = self.hour_angle(obj_ra, obj_dec, cur_time)  # Get the current object hour angle
         step_distance_ra = abs(stp_to_home_ra + cur_ha * MOTOR_RA_STEPS_PER_DEGREE)
         step_distance_dec = abs(stp_to_home_dec + obj_dec * MOTOR_DEC_STEPS_PER_DEGREE)
-        print(step_distance_ra, step_distance_dec)
 
         max_distance = max(step_distance_ra, step_distance_dec)  # Calculate the maximum distance, to calculate max time
         max_move_time = max_distance / MAX_STEP_FREQUENCY  # Maximum time required for any motor, calculated in seconds
@@ -186,6 +328,35 @@ class Calculations(QtCore.QObject):
 
         return [target_ha, obj_dec]
 
+    def transit_array(self, obj_ra, obj_dec, stp_to_home_ra, stp_to_home_dec, transit_time: int, date=None):
+        """
+        Array version of `transit`. The current time is taken once for all the points.
+
+        Args:
+            obj_ra: Array of the objects right ascension in degrees
+            obj_dec: Array of the objects declination in degrees
+            stp_to_home_ra: Array of the steps away from home position for the right ascension motor
+            stp_to_home_dec: Array of the steps away from home position for the declination motor
+            transit_time (int): Time to transit position, provided in seconds
+            date (tuple): The current time. Default is the system time.
+
+        Returns:
+            list: Arrays of the hour angles at the target locations and of the declinations
+        """
+        cur_time = self.current_time() if date is None else date
+        obj_ra = np.asarray(obj_ra, dtype=float)
+        obj_dec = np.asarray(obj_dec, dtype=float)
+        cur_ha = self.hour_angle_array(obj_ra, obj_dec, cur_time)
+        step_distance_ra = np.abs(np.asarray(stp_to_home_ra) + cur_ha * MOTOR_RA_STEPS_PER_DEGREE)
+        step_distance_dec = np.abs(np.asarray(stp_to_home_dec) + obj_dec * MOTOR_DEC_STEPS_PER_DEGREE)
+
+        max_move_time = np.maximum(step_distance_ra, step_distance_dec) / MAX_STEP_FREQUENCY
+        target_days = cur_time[2] + (max_move_time + transit_time) * SEC_TO_DAY
+        target_times = [(cur_time[0], cur_time[1], day,) for day in target_days.tolist()]
+        target_ha = self.hour_angle_array(obj_ra, obj_dec, target_times)
+
+        return [target_ha, obj_dec]
+
     def transit_planetary(self, objec, stp_to_home_ra: int, stp_to_home_dec: int, transit_time: int):
         """
         Calculate object's position when the dish arrives at position.
@@ -194,7 +365,7 @@ class Calculations(QtCore.QObject):
         calculated for a planetary object.
 
         Args:
-            objec: pyephem object type, which is the object of interest (e.g. ephem.Jupiter())
+            objec: Name of the object of interest (e.g. "Jupiter") or a pyephem body object
             stp_to_home_ra (int): Number of steps from home position for the right ascension motor
             stp_to_home_dec (int): Number of steps from home position for the declination motor
             transit_time (int): Time to transit position, provided in seconds
@@ -202,24 +373,13 @@ class Calculations(QtCore.QObject):
         Returns:
             A list containing the object's coordinates at the antenna's requested position
         """
-        if objec == "Sun":
-            objec = ephem.Sun()  # Select the Sun object #noqa pylint: disable=no-member
-        elif objec == "Jupiter":
-            objec = ephem.Jupiter()  # Select Jupiter as object
-        elif objec == "Mars":
-            objec = ephem.Mars()  # Select Mars as the object
-        elif objec == "Venus":
-            objec = ephem.Venus()  # Select Venus as the object
-        elif objec == "Moon":
-            objec = ephem.Moon()  # Select moon as the object
-
         cur_time = self.current_time()  # Get the current time in tuple
         date = "%.0f/%.0f/%.6f" % (cur_time[0], cur_time[1], cur_time[2])  # Get the current date
-        objec.compute(cur_time, epoch=date)  # Compute the object's coordinates
+        position = self.planetary_position(objec, cur_time, date)  # Compute the object's coordinates
 
         # Get the current coordinates for the planetary body
-        obj_ra = float(objec.a_ra) * RAD_TO_DEG
-        obj_dec = float(objec.a_dec) * RAD_TO_DEG
+        obj_ra = position[0] * RAD_TO_DEG
+        obj_dec = position[1] * RAD_TO_DEG
 
         cur_ha = self.hour_angle(obj_ra, obj_dec, cur_time)  # Get the current object hour angle
         step_distance_ra = abs(stp_to_home_ra + cur_ha * MOTOR_RA_STEPS_PER_DEGREE)
@@ -230,13 +390,31 @@ class Calculations(QtCore.QObject):
         target_time = (cur_time[0], cur_time[1], cur_time[2] + (max_move_time + transit_time) * SEC_TO_DAY)
 
         # Recalculate the coordinates for the new time
-        objec.compute(cur_time, epoch=date)
-        obj_ra = float(objec.a_ra) * RAD_TO_DEG
-        obj_dec = float(objec.a_dec) * RAD_TO_DEG
+        position = self.planetary_position(objec, cur_time, date)
+        obj_ra = position[0] * RAD_TO_DEG
+        obj_dec = position[1] * RAD_TO_DEG
         target_ha = self.hour_angle(obj_ra, obj_dec, target_time)  # Calculate the hour angle at the target location
 
         return [target_ha, obj_dec]
 
+    def planetary_position(self, objec, date, epoch):
+        """
+        Compute the astrometric position of a planetary body. Named bodies are taken from the ephemeris pool, so the
+        body objects are reused and repeated calculations within the same second are not performed again.
+
+        Args:
+            objec: Name of the body (e.g. "Jupiter") or a pyephem body object
+            date: The date of the calculation, in any form accepted by pyephem
+            epoch: The epoch of the coordinates, in any form accepted by pyephem
+
+        Returns:
+            tuple: Right ascension and declination in radians
+        """
+        if isinstance(objec, str):
+            return self.ephemeris.position(objec, date, epoch)
+        objec.compute(date, epoch=epoch)
+        return float(objec.a_ra), float(objec.a_dec)
+
     def tracking_planetary(self, objec, stp_to_home_ra: int, stp_to_home_dec: int):
         """
         Calculate the rate of change for the coordinates of different planetary bodies. The main calculations performed
@@ -244,51 +422,34 @@ class Calculations(QtCore.QObject):
         position.
 
         Args:
-            objec: pyephem object type, which is the object of interest (e.g. ephem.Jupiter())
+            objec: Name of the object of interest (e.g. "Jupiter") or a pyephem body object
             stp_to_home_ra (int): Number of steps from home position for the right ascension motor
             stp_to_home_dec (int): Number of steps from home position for the declination motor
 
         Returns:
             list: Contains the object's coordinates on transit and the rate of change for the coordinates
         """
-        sum_ra = sum_dec = 0.0  # Variable to hold the sum for averaging
-        prev_ra = prev_dec = 0.0  # Initialize the variables
-        count = 0  # Counting variable used in the loop and averaging
         transit_coords = self.transit_planetary(objec, stp_to_home_ra, stp_to_home_dec, 0)  # Calculate transit first
+        rates = self.planetary_rates(objec)  # Degrees per second for both coordinates
 
-        # Get the right object
-        if objec == "Sun":
-            objec = ephem.Sun()  # Select the Sun object
-        elif objec == "Jupiter":
-            objec = ephem.Jupiter()  # Select Jupiter as object
-        elif objec == "Mars":
-            objec = ephem.Mars()  # Select Mars as the object
-        elif objec == "Venus":
-            objec = ephem.Venus()  # Select Venus as the object
-        elif objec == "Moon":
-            objec = ephem.Moon()  # Select moon as the object
-
-        cur_time = self.current_time()  # Get the current time in tuple
-        epoch_date = "%.0f/%.0f/%.6f" % (cur_time[0], cur_time[1], cur_time[2])  # Get the current date
-        comp_date = epoch_date  # Set the dates to equal at first
-
-        # Iterate for 24 hours to get enough points
-        for count in range(0, 24):
-            objec.compute(comp_date, epoch=epoch_date)
-            cur_ra = float(objec.a_ra)
-            cur_dec = float(objec.a_dec)
+        return [transit_coords[0], transit_coords[1], rates.ra_rate, rates.dec_rate]
 
-            if count > 0:
-                sum_ra += (cur_ra - prev_ra)
-                sum_dec += (cur_dec - prev_dec)
-            prev_ra = cur_ra
-            prev_dec = cur_dec
-            comp_date = "%.0f/%.0f/%.6f" % (cur_time[0], cur_time[1], cur_time[2] + 0.04166666667)  # One hour increment
+    def planetary_rates(self, objec, date=None, acceleration=False):
+        """
+        Estimate the rate of change of a planetary body's coordinates, by fitting its positions over the next hour.
 
-        roc_ra = ((sum_ra/count) * RAD_TO_DEG) / 3600.0  # Return degrees per second for the RA
-        roc_dec = ((sum_dec/count) * RAD_TO_DEG) / 3600.0  # Return degrees per second for the DEC
+        Args:
+            objec: Name of the object of interest (e.g. "Jupiter") or a pyephem body object
+            date (tuple): Start date of the estimation. Default is the current time.
+            acceleration (bool): Also fit the accelerations of the coordinates
 
-        return [transit_coords[0], transit_coords[1], roc_ra, roc_dec]
+        Returns:
+            RateEstimate: Coordinates in degrees, rates in degrees per second, accelerations and fit residuals
+        """
+        cur_time = self.date_tuple(date)
+        epoch_date = "%.0f/%.0f/%.6f" % (cur_time[0], cur_time[1], cur_time[2])  # Epoch is the start of the day
+        return self.rate_estimator.estimate(partial(self.planetary_position, objec), cur_time, epoch_date,
+                                            acceleration)
 
     def scanning_map_generator(self, points: tuple, step_size: tuple, direction: str):
         """
@@ -303,115 +464,28 @@ class Calculations(QtCore.QObject):
         Returns:
             list: Map points in celestial coordinates
         """
-        epoch = points[5]  # Get the epoch provided
-        coord_system = points[4]  # Get the coordinate system of the provided coordinates
-
-        direct = direction.split(": ")[1]  # Get the direction string
-        second_axis = False
-        if direct == "R-Down":
-            initial_point = points[0]
-            second_point = points[1]
-            third_point = points[2]
-            # fourth_point = points[3]
-        elif direct == "R-Up":
-            initial_point = points[3]
-            second_point = points[2]
-            third_point = points[1]
-            # fourth_point = points[0]
-        elif direct == "L-Down":
-            initial_point = points[1]
-            second_point = points[0]
-            third_point = points[3]
-            # fourth_point = points[2]
-        elif direct == "L-Up":
-            initial_point = points[2]
-            second_point = points[3]
-            third_point = points[0]
-            # fourth_point = points[1]
-        elif direct == "Up-R":
-            initial_point = points[3]
-            second_point = points[0]
-            third_point = points[1]
-            # fourth_point = points[2]
-            second_axis = True
-        elif direct == "Up-L":
-            initial_point = points[2]
-            second_point = points[1]
-            third_point = points[0]
-            # fourth_point = points[3]
-            second_axis = True
-        elif direct == "Down-R":
-            initial_point = points[0]
-            second_point = points[3]
-            third_point = points[2]
-            # fourth_point = points[1]
-            second_axis = True
-        elif direct == "Down-L":
-            initial_point = points[1]
-            second_point = points[2]
-            third_point = points[3]
-            # fourth_point = points[0]
-            second_axis = True
-        # TODO implement a fix to include the last box without overlap
-        num_boxes_x = math.floor(abs(second_point[0] - initial_point[0])/step_size[0])
-        num_boxes_y = math.floor(abs(second_point[1] - third_point[1])/step_size[1])
-
-        # Generate the point map in the Equatorial coordinate system
-        x_point = initial_point[0]  # Get the first coordinate before the loop
-        y_point = initial_point[1]
-        raw_points = ((x_point, y_point), )
-        transformed = self.coordinate_transform((x_point, y_point,), (coord_system, epoch,))
-        map_points = ((round(transformed[0], 6), round(transformed[1], 6)),)
-
-        if not second_axis:
-            if second_point[0] - initial_point[0] < 0:
-                fill_reverse = False  # Indicate reverse direction filling of the tuple with points (inverse logic)
-            else:
-                fill_reverse = True
-
-            for i in range(0, int(num_boxes_y)):
-                if i != 0:
-                    y_point -= step_size[1]  # Don't deduct the step on the first point
-                fill_reverse = not fill_reverse  # Negate the direction of point filling
-
-                for j in range(0, int(num_boxes_x)):
-                    if not (j == 0 and i != 0):
-                        if fill_reverse is True:
-                            x_point -= step_size[0]
-                        else:
-                            x_point += step_size[0]
-                    raw_points += ((round(x_point, 6), round(y_point, 6)),)
-
-                    transformed = self.coordinate_transform((x_point, y_point,), (coord_system, epoch,))
-                    map_points += ((round(transformed[0], 6), round(transformed[1], 6)),)
-        else:
-            if second_point[1] - initial_point[1] < 0:
-                fill_reverse = False  # Indicate reverse direction filling of the tuple with points (inverse logic)
-            else:
-                fill_reverse = True
-
-            for i in range(0, int(num_boxes_x)):
-                if i != 0:
-                    x_point -= step_size[0]  # Don't deduct the step on the first point
-                fill_reverse = not fill_reverse  # Negate the direction of point filling
-
-                for j in range(0, int(num_boxes_y)):
-                    if not (j == 0 and i != 0):
-                        if fill_reverse is True:
-                            y_point -= step_size[1]
-                        else:
-                            y_point += step_size[1]
-                    raw_points += ((round(x_point, 6), round(y_point, 6)),)
-
-                    transformed = self.coordinate_transform((x_point, y_point,), (coord_system, epoch,))
-                    map_points += ((round(transformed[0], 6), round(transformed[1], 6)),)
-        # TODO Remove print statement
-        print("Raw points:")
-        print(raw_points)
-        print("Mapped points")
-        print(map_points)
-
-        return [map_points, raw_points]
+        return self.scanning_map(points, step_size, direction).to_tuples()
+
+    def scanning_map(self, points: tuple, step_size: tuple, direction: str):
+        """
+        Array based version of `scanning_map_generator`. The whole grid is generated at once and transformed to
+        celestial coordinates with a single batched call.
+
+        Args:
+            points (tuple): Initial box points at four corners. Coordinate system and epoch should be included
+            step_size (tuple): Stepping size for each axis (a tuple)
+            direction (str): Direction of scanning with respect to the first point
+
+        Returns:
+            ScanMap: Map points in celestial coordinates and raw points, as arrays of shape (N, 2)
+        """
+        x_points, y_points = scan_grid(points, step_size, direction.split(": ")[1])
+        converted_ra, converted_dec = self.coordinate_transform_array(x_points, y_points, (points[4], points[5],))
+
+        raw_points = np.stack((x_points, y_points), axis=-1)
+        raw_points[1:] = np.round(raw_points[1:], 6)  # The initial point is kept as provided
+        map_points = np.round(np.stack((converted_ra, converted_dec), axis=-1), 6)
+        return ScanMap(map_points, raw_points)
 
     def scanning_point_calculator(self, map_points: tuple, init_steps: tuple, step_size: tuple,
                                   int_time=0.0, objec=None):
@@ -428,100 +502,251 @@ class Calculations(QtCore.QObject):
         Returns:
             list: The calculated position of the points for scanning
         """
+        first_point, rates, chunks = self.scanning_point_stream(map_points, init_steps, step_size, int_time, objec)
+        calc_points = "%f_%f" % (first_point[0], first_point[1])
+        for chunk in chunks:
+            calc_points += "_" + self.format_scan_points(chunk)  # Save the points as a string
+
+        return [calc_points, rates]
+
+    def scanning_point_stream(self, map_points, init_steps: tuple, step_size: tuple, int_time=0.0, objec=None,
+                              chunk_size=SCAN_CHUNK_SIZE, workers=1):
+        """
+        Streaming version of `scanning_point_calculator`. Only the first point is calculated immediately, so that the
+        scan can start without waiting for the whole map. The rest of the points are calculated lazily by the returned
+        generator, one chunk at a time.
+
+        Large maps are split across worker processes, when more than one worker is allowed. The chunks are still
+        returned in the order of the map.
+
+        Args:
+            map_points: Map points generated from the `scanning_map_generator` or `scanning_map`
+            init_steps: Initial steps from home in RA and DEC axis
+            step_size: Motor step size
+            int_time: Integration time for the signal reception
+            objec: Planetary object passing. Default is none.
+            chunk_size (int): Maximum number of points in each chunk
+            workers (int): Maximum number of worker processes
+
+        Returns:
+            list: The first point, the rates of change and a generator of (N, 2) arrays with the next points
+        """
         if objec is None:
             first_point = self.transit(map_points[0][0], map_points[0][1], init_steps[0], init_steps[1], 0)
-            roc_ra = roc_dec = 0  # Not rate of change for the non-planetary bodies
+            rates = (0, 0, )  # Not rate of change for the non-planetary bodies
         else:
             first_point = self.tracking_planetary(objec, init_steps[0], init_steps[1])  # Get also the rate of change
-            roc_ra = first_point[2]  # Get the rate of change for RA as returned from the tracking calculation
-            roc_dec = first_point[3]  # Get the rate of change for DEC as returned from the tracking calculation
-        calc_points = "%f_%f" % (first_point[0], first_point[1])
+            rates = (first_point[2], first_point[3], )
+        tr_time = int(int_time * 60.0)
+        min_points = PARALLEL_SCAN_MIN_POINTS if objec is None else PARALLEL_SCAN_MIN_PLANETARY_POINTS
+        if workers > 1 and len(map_points) >= min_points and isinstance(objec, (str, type(None))):
+            chunks = self._parallel_scan_point_chunks(map_points, init_steps, step_size, tr_time, objec, chunk_size,
+                                                      workers)
+        else:
+            chunks = self._scan_point_chunks(map_points, init_steps, step_size, tr_time, objec, chunk_size)
+
+        return [(first_point[0], first_point[1], ), rates, chunks]
+
+    @staticmethod
+    def scan_step_increments(map_points, init_steps: tuple, step_size: tuple):
+        """
+        Motor steps of the scanning points after the first one. The steps are accumulated from the initial steps,
+        adding a step on each axis when the next map point changes on that axis.
+
+        Args:
+            map_points: Map points generated from the `scanning_map_generator` or `scanning_map`
+            init_steps: Initial steps from home in RA and DEC axis
+            step_size: Motor step size
+
+        Returns:
+            numpy.ndarray: (N - 1, 2) array with the RA and DEC steps of each point after the first
+        """
+        points = np.asarray(map_points, dtype=float)
+        step_per_point = np.array((step_size[0] * MOTOR_RA_STEPS_PER_DEGREE, step_size[1] * MOTOR_DEC_STEPS_PER_DEGREE))
+        changes = np.zeros((max(len(points) - 1, 0), 2))
+        changes[:-1] = points[1:-1] != points[2:]  # The last map point has no next point
+        return np.asarray(init_steps, dtype=float) + np.cumsum(changes * step_per_point, axis=0)
+
+    def scan_chunk_points(self, points, increments, tr_time: int, objec):
+        """
+        Calculate a chunk of scanning points.
+
+        Args:
+            points: (N, 2) array of map points
+            increments: (N, 2) array of the motor steps at each point
+            tr_time (int): Time to transit position, provided in seconds
+            objec: Planetary object passing, or None
+
+        Returns:
+            numpy.ndarray: (N, 2) array of the hour angle and the declination of each point
+        """
+        if objec is None:
+            transit_points = self.transit_array(points[:, 0], points[:, 1], increments[:, 0], increments[:, 1], tr_time)
+            return np.stack(transit_points, axis=-1)
+        return np.array([self.transit_planetary(objec, incr[0], incr[1], tr_time)[:2] for incr in increments.tolist()])
 
-        # Initialize the variable with the initial steps from home
-        step_incr_dec = init_steps[1]
-        step_incr_ra = init_steps[0]
-        for i in range(1, len(map_points)):  # Exclude first point
-            try:
-                if map_points[i][1] != map_points[i + 1][1]:
-                    step_incr_dec += step_size[1] * MOTOR_DEC_STEPS_PER_DEGREE
-                if map_points[i][0] != map_points[i + 1][0]:
-                    step_incr_ra += step_size[0] * MOTOR_RA_STEPS_PER_DEGREE
-            except IndexError:
-                pass
-            step_incr = (step_incr_ra, step_incr_dec, )
-
-            if int(int_time * 60.0) != 0:
-                tr_time = int(int_time * 60.0)
-            else:
-                tr_time = 0
-
-            # Account for planetary object coordinates
-            # TODO Test how the planetary selection is functioning
-            if objec is None:
-                transit_point = self.transit(map_points[i][0], map_points[i][1], step_incr[0], step_incr[1], tr_time)
-            else:
-                transit_point = self.transit_planetary(objec, step_incr[0], step_incr[1], tr_time)
-            calc_points += "_%f_%f" % (transit_point[0], transit_point[1])  # Save the points as a string
-
-        return [calc_points, (roc_ra, roc_dec, )]
+    def _scan_point_chunks(self, map_points, init_steps: tuple, step_size: tuple, tr_time: int, objec,
+                           chunk_size: int):
+        """
+        Generator of the scanning points after the first one, calculated one chunk at a time.
+        """
+        points = np.asarray(map_points, dtype=float)[1:]
+        increments = self.scan_step_increments(map_points, init_steps, step_size)
+        for start in range(0, len(points), chunk_size):
+            yield self.scan_chunk_points(points[start:start + chunk_size], increments[start:start + chunk_size],
+                                         tr_time, objec)
+
+    def _parallel_scan_point_chunks(self, map_points, init_steps: tuple, step_size: tuple, tr_time: int, objec,
+                                    chunk_size: int, workers: int):
+        """
+        Generator of the scanning points after the first one, calculated by worker processes. The motor steps are
+        accumulated for the whole map before it is split, so each chunk is independent of the previous ones.
+        """
+        points = np.asarray(map_points, dtype=float)[1:]
+        increments = self.scan_step_increments(map_points, init_steps, step_size)
+        starts = range(0, len(points), chunk_size)
+        self.cfg_data.flush()  # The workers read the settings from the file
+
+        # The workers are spawned, since forking the threads of the application is not safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_scan_worker,
+                                 initargs=(os.path.abspath(self.cfg_data.filename),)) as executor:
+            self.logger.info("Scanning points calculated by %d worker processes", workers)
+            yield from executor.map(_scan_worker_chunk, (points[start:start + chunk_size] for start in starts),
+                                    (increments[start:start + chunk_size] for start in starts),
+                                    [tr_time] * len(starts), [objec] * len(starts))
+
+    @staticmethod
+    def format_scan_points(points):
+        """
+        Format scanning points to the string sent to the RPi.
+
+        Args:
+            points: Sequence of (HA, DEC) points
+
+        Returns:
+            str: The points as "HA_DEC_HA_DEC..."
+        """
+        return "_".join("%f_%f" % (point[0], point[1]) for point in points)
 
     def coordinate_transform(self, coordinates: tuple, system_and_date: tuple):
         """
         Transform coordinates from other systems to celestial coordinates
 
         Args:
-            coordinates (tuple):
-            system_and_date (tuple):
+            coordinates (tuple): Latitude (or altitude) and longitude (or azimuth) in degrees
+            system_and_date (tuple): Coordinate system and epoch of the coordinates
 
         Returns:
+            tuple: Right ascension and declination in degrees
         """
-        position = np.radians(coordinates)  # Convert coordinates from degrees to radians
-        if system_and_date[1] == "Now":
-            epoch = self.current_time()  # Get the current time and date as the epoch
-        else:
-            epoch = system_and_date[1]
-        self.observer.date = epoch
-
-        if system_and_date[0] == "Horizontal":
-            converted_ra, converted_dec = np.degrees(self.observer.radec_of(position[1], position[0]))
-        elif system_and_date[0] == "Galactic":
-            galactic_posit = ephem.Galactic(position[1], position[0], epoch=epoch)
-            converted_ra, converted_dec = np.degrees(galactic_posit.to_radec())  # Convert from Galactic
-        elif system_and_date[0] == "Ecliptic":
-            ecliptic_position = ephem.Ecliptic(position[1], position[0], epoch=epoch)
-            converted_ra, converted_dec = np.degrees(ecliptic_position.to_radec())  # Convert from Ecliptic coordinates
-        else:
-            converted_ra, converted_dec = coordinates
+        if system_and_date[0] not in ("Horizontal", "Galactic", "Ecliptic"):
+            return coordinates[0], coordinates[1]
 
-        return converted_ra, converted_dec  # Return the coordinate tuple
+        converted = self.coordinate_transform_array(coordinates[0], coordinates[1], system_and_date)
+        return float(converted[0][0]), float(converted[1][0])  # Return the coordinate tuple
 
-    def geo_sat_position(self, satellite: str):
+    def coordinate_transform_array(self, coord_1, coord_2, system_and_date: tuple):
         """
+        Transform arrays of coordinates from other systems to celestial coordinates. The epoch is resolved once, so
+        that all the points share it.
 
+        Galactic and ecliptic coordinates are rotated with a matrix, cached per coordinate system and epoch. Horizontal
+        coordinates depend also on the refraction, so they are converted point by point with an observer created for
+        the call. No shared state is modified, so the method can be called from any thread.
 
         Args:
-            satellite (str): Name of the satellite
+            coord_1: Array of the latitude (or altitude) in degrees
+            coord_2: Array of the longitude (or azimuth) in degrees
+            system_and_date (tuple): Coordinate system and epoch of the coordinates
 
         Returns:
-            np.array: Array containing the ra and dec of the satellite
+            tuple: Arrays of the right ascension and declination in degrees
         """
-        # TODO improve the function
-        try:
-            # Get the filename
-            url = self.cfg_data.get_tle_url()  # Get the URL from the settings file
-            file_dir = os.path.abspath("TLE/" + url.split("/")[-1])  # Directory for the saved file
+        coord_1 = np.atleast_1d(np.asarray(coord_1, dtype=float))
+        coord_2 = np.atleast_1d(np.asarray(coord_2, dtype=float))
+        system = system_and_date[0]
+        if system not in ("Horizontal", "Galactic", "Ecliptic"):
+            return coord_1.copy(), coord_2.copy()  # Already in celestial coordinates
+
+        epoch = ephem.Date(self.current_time() if system_and_date[1] == "Now" else system_and_date[1])
+        if system == "Horizontal":
+            observer = self.local_observer(epoch)
+            converted = np.array([observer.radec_of(azimuth, altitude) for altitude, azimuth
+                                  in zip(np.radians(coord_1).tolist(), np.radians(coord_2).tolist())], dtype=float)
+            converted = np.degrees(converted.reshape(-1, 2))
+            return converted[:, 0], converted[:, 1]
+
+        matrix = self.context.frames.get((system, float(epoch)), partial(self._frame_matrix, system, epoch))
+        return vectors_to_radec(radec_to_vectors(coord_2, coord_1).dot(matrix.T))
+
+    @staticmethod
+    def _frame_matrix(system: str, epoch):
+        """
+        Calculate the rotation matrix from galactic or ecliptic to equatorial coordinates of the epoch. The columns of
+        the matrix are the equatorial vectors of the basis vectors, as converted by pyephem.
+
+        Args:
+            system (str): Either "Galactic" or "Ecliptic"
+            epoch: The epoch of the equatorial coordinates
+
+        Returns:
+            np.ndarray: The 3x3 rotation matrix
+        """
+        frame = ephem.Galactic if system == "Galactic" else ephem.Ecliptic
+        basis = [frame(lon, lat, epoch=epoch).to_radec() for lon, lat in ((0.0, 0.0), (math.pi / 2, 0.0),
+                                                                          (0.0, math.pi / 2))]
+        right_ascension, declination = np.degrees(np.array(basis, dtype=float)).T
+        return radec_to_vectors(right_ascension, declination).T
+
+    def rank_calibration_satellites(self, span=86400.0, step=900.0, min_altitude=10.0):
+        """
+        Rank all the satellites of the TLE file as calibration targets, with the most stable first.
+
+        Args:
+            span (float): Checked time span in seconds, starting now
+            step (float): Seconds between the checked times
+            min_altitude (float): Minimum altitude in degrees during the whole span
+
+        Returns:
+            list: `CalibrationCandidate` objects of the visible satellites
+        """
+        return self.satellites.rank_geostationary(self.tle_catalog.entries(), span, step, min_altitude)
+
+    def local_observer(self, date=None):
+        """
+        Create a pyephem observer at the location of the context. A new observer is used for each calculation, because
+        its date is changed by the calculations.
 
-            tle_data = tlefile.read(satellite, file_dir)
+        Args:
+            date: The date of the observer, in any form accepted by pyephem. Default is the current time.
+
+        Returns:
+            ephem.Observer: The observer object
+        """
+        location = self.context.observer  # Read once, so all the values belong to the same location
+        observer = ephem.Observer()
+        observer.lat = math.radians(location.latitude)
+        observer.lon = math.radians(location.longitude)
+        observer.elevation = location.altitude  # Altitude in meters
+        observer.date = ephem.Date(self.current_time() if date is None else date)
+        return observer
 
-            sat = ephem.readtle(tle_data.platform, tle_data.line1, tle_data.line2)
-            self.observer.date = self.current_time()
-            sat.compute(self.observer)
+    def geo_sat_position(self, satellite: str):
+        """
+        Calculate the current position of a satellite of the TLE file. The position is interpolated from the cached
+        trajectory of the satellite, which is propagated again only when it expires or the TLE file changes.
 
-            c_time = self.current_time()  # Get the current time
-            ha_sat = np.round(self.hour_angle(math.degrees(sat.ra), math.degrees(sat.dec), c_time), 4)  # Get the hour
-            # angle of the satellite
+        Args:
+            satellite (str): Name or NORAD ID of the satellite
+
+        Returns:
+            list: Altitude and azimuth, and hour angle and declination of the satellite in degrees
+        """
+        try:
+            position = self.trajectories.position(self.tle_catalog.get(satellite))  # Indexed lookup, without parsing
 
-            return np.array([np.round(np.degrees((sat.alt, sat.az,)), 4),
-                             np.round((ha_sat, np.degrees(sat.dec),), 4)]).tolist()
+            return np.round([[position.altitude, position.azimuth],
+                             [position.hour_angle, position.declination]], 4).tolist()
         except KeyError:
             self.logger.exception("No satellite found. See traceback.")
@@ -0,0 +1,174 @@
+import os
+import logging
+import threading
+from collections import namedtuple
+from astropy.coordinates import EarthLocation, FK5, ICRS
+from skyfield.api import Loader
+from Core.Astronomy.MatrixCache import MatrixCache, PrecessionCache
+from Core.Astronomy.SiderealTable import SiderealTimeTable
+
+
+# Files used by skyfield for the leap seconds and the delta-T. Their modification time tells us when to refresh.
+TIME_DATA_FILES = ("deltat.data", "deltat.preds", "Leap_Second.dat", "finals2000A.all")
+
+# Location of the observer. The angles are in degrees and the altitude in meters.
+ObserverLocation = namedtuple("ObserverLocation", ["location", "latitude", "longitude", "altitude"])
+
+
+class AstronomyContext:
+    """
+    Long lived holder of the objects that are expensive to create, so that they are not rebuilt on every conversion.
+    The skyfield timescale is shared by every context of the process and is loaded lazily on first use. The astropy
+    location and the fixed frames are created once per context.
+
+    The timescale depends on the leap second and delta-T data. It is loaded from the files of the data directory when
+    they exist, else from the data bundled with skyfield. When the files change, the timescale has to be reloaded
+    explicitly by calling `refresh` or `refresh_if_changed`.
+    """
+    _timescale = None  # Timescale shared by the whole process
+    _data_stamp = None  # Modification times of the time data files, when the timescale was loaded
+    _lock = threading.Lock()  # Guard the timescale loading, since the context is shared between threads
+
+    def __init__(self, latitude, longitude, altitude=0.0, data_dir=None, precession_tolerance=60.0,
+                 builtin_timescale=None):
+        """
+        Create the context for the provided observer location.
+
+        Args:
+            latitude: Latitude of the observer in degrees (float or string)
+            longitude: Longitude of the observer in degrees (float or string)
+            altitude: Altitude of the observer in meters
+            data_dir (str): Directory containing the skyfield time data files. Default is the current directory.
+            precession_tolerance (float): Seconds within which the dates share the same precession matrix
+            builtin_timescale (bool): Use the time data bundled with skyfield (True) or the files in the data
+                directory (False). Default is the files, if they exist.
+        """
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.data_dir = data_dir if data_dir is not None else os.path.abspath(".")
+        self.builtin_timescale = builtin_timescale
+        self.icrs_frame = ICRS()  # Frame of the catalogue coordinates
+        self.j2000_frame = FK5(equinox='J2000.0')  # The J2000 frame never changes, so create it only once
+        self.precession = PrecessionCache(tolerance=precession_tolerance)  # J2000 to JNow matrices
+        self.frames = MatrixCache(max_size=64)  # Galactic and ecliptic to equatorial matrices, per epoch
+        self.sidereal = SiderealTimeTable(self)  # Interpolated sidereal time for the dates around now
+        self.set_location(latitude, longitude, altitude)
+
+    def set_location(self, latitude, longitude, altitude=0.0):
+        """
+        Update the observer location of the context. The new location is built first and then replaces the old one
+        with a single assignment, so the calculations of the other threads never see half of the change. A calculation
+        using more than one of the values should read `observer` once.
+
+        Args:
+            latitude: Latitude of the observer in degrees (float or string)
+            longitude: Longitude of the observer in degrees (float or string)
+            altitude: Altitude of the observer in meters
+        """
+        location = EarthLocation(lat=latitude, lon=longitude)  # Astropy location object
+        self.observer = ObserverLocation(location, location.lat.degree, location.lon.degree, float(altitude))
+
+    @property
+    def location(self):
+        """
+        Returns:
+            EarthLocation: The astropy location of the observer
+        """
+        return self.observer.location
+
+    @property
+    def latitude(self):
+        """
+        Returns:
+            float: The latitude of the observer in degrees
+        """
+        return self.observer.latitude
+
+    @property
+    def longitude(self):
+        """
+        Returns:
+            float: The longitude of the observer in degrees, used for the local sidereal time
+        """
+        return self.observer.longitude
+
+    @property
+    def altitude(self):
+        """
+        Returns:
+            float: The altitude of the observer in meters
+        """
+        return self.observer.altitude
+
+    @property
+    def timescale(self):
+        """
+        The skyfield timescale of the process. It is loaded on the first access.
+
+        Returns:
+            skyfield.timelib.Timescale: The shared timescale object
+        """
+        timescale = AstronomyContext._timescale
+        if timescale is None:
+            with AstronomyContext._lock:
+                if AstronomyContext._timescale is None:
+                    self._load_timescale()
+                timescale = AstronomyContext._timescale
+        return timescale
+
+    def refresh(self):
+        """
+        Reload the timescale unconditionally. Call this after the leap second or delta-T data was updated.
+        """
+        with AstronomyContext._lock:
+            self._load_timescale()
+        self.sidereal.invalidate()  # The table was calculated with the old timescale
+
+    def refresh_if_changed(self):
+        """
+        Reload the timescale only if the time data files changed since the last load.
+
+        Returns:
+            bool: True if the timescale was reloaded
+        """
+        if self.builtin_timescale is True and AstronomyContext._timescale is not None:
+            return False  # The bundled data never changes, so the files are not watched
+        if self._data_files_stamp() == AstronomyContext._data_stamp and AstronomyContext._timescale is not None:
+            return False
+        self.refresh()
+        return True
+
+    def _load_timescale(self):
+        """
+        Load the timescale from the data directory. The caller is responsible for holding the lock.
+        """
+        builtin = self._use_builtin_timescale()
+        AstronomyContext._timescale = Loader(self.data_dir, verbose=False).timescale(builtin=builtin)
+        AstronomyContext._data_stamp = self._data_files_stamp()
+        self.logger.debug("Skyfield timescale loaded from %s", "the bundled data" if builtin else self.data_dir)
+
+    def _use_builtin_timescale(self):
+        """
+        Returns:
+            bool: True if the timescale is loaded from the data bundled with skyfield, because it was requested or
+            because the data directory does not contain the time data files
+        """
+        if self.builtin_timescale is not None:
+            return self.builtin_timescale
+        stamp = dict(zip(TIME_DATA_FILES, self._data_files_stamp()))
+        legacy_files = stamp["deltat.data"] and stamp["deltat.preds"] and stamp["Leap_Second.dat"]
+        return not (legacy_files or stamp["finals2000A.all"])
+
+    def _data_files_stamp(self):
+        """
+        Get the modification times of the time data files, or None for the ones that do not exist.
+
+        Returns:
+            tuple: Modification time of each of the data files
+        """
+        stamp = ()
+        for data_file in TIME_DATA_FILES:
+            try:
+                stamp += (os.path.getmtime(os.path.join(self.data_dir, data_file)),)
+            except OSError:
+                stamp += (None,)
+        return stamp
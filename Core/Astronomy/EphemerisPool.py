@@ -0,0 +1,129 @@
+import logging
+import threading
+from collections import OrderedDict
+import ephem
+
+
+SECONDS_PER_DAY = 86400.0
+
+# Planetary bodies known by name. pylint does not see the classes of the C extension.
+PLANETARY_BODIES = {
+    "Sun": ephem.Sun,  # pylint: disable=no-member
+    "Moon": ephem.Moon,  # pylint: disable=no-member
+    "Mercury": ephem.Mercury,  # pylint: disable=no-member
+    "Venus": ephem.Venus,  # pylint: disable=no-member
+    "Mars": ephem.Mars,  # pylint: disable=no-member
+    "Jupiter": ephem.Jupiter,  # pylint: disable=no-member
+    "Saturn": ephem.Saturn,  # pylint: disable=no-member
+    "Uranus": ephem.Uranus,  # pylint: disable=no-member
+    "Neptune": ephem.Neptune,  # pylint: disable=no-member
+}
+
+
+class EphemerisPool:
+    """
+    Registry of named planetary bodies. Each body object is created once and reused, and the results of `compute`
+    are memoised per body, time bucket and epoch. The dates within half a bucket from its center share the result,
+    which is calculated at the center of the bucket.
+    """
+    def __init__(self, time_bucket=1.0, max_size=1024):
+        """
+        Args:
+            time_bucket (float): Size of the time bucket in seconds
+            max_size (int): Maximum number of memoised results. The least recently used are evicted first.
+        """
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.time_bucket = time_bucket
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._factories = dict(PLANETARY_BODIES)
+        self._bodies = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()  # Body objects are mutated by compute, so they are not shared unguarded
+
+    def register(self, name: str, factory):
+        """
+        Register a new body, or replace an existing one.
+
+        Args:
+            name (str): The name of the body
+            factory: Callable without arguments, returning a new pyephem body
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._bodies.pop(name, None)
+            for key in [key for key in self._results if key[0] == name]:
+                del self._results[key]
+
+    def names(self):
+        """
+        Returns:
+            list: The names of all the registered bodies
+        """
+        return list(self._factories)
+
+    def body(self, name: str):
+        """
+        Get the pooled body object of the provided name.
+
+        Args:
+            name (str): The name of the body (e.g. "Jupiter")
+
+        Returns:
+            The pyephem body object
+        """
+        with self._lock:
+            return self._get_body(name)
+
+    def position(self, name: str, date, epoch):
+        """
+        Get the astrometric position of the body, as calculated by pyephem's `compute`.
+
+        Args:
+            name (str): The name of the body
+            date: The date of the calculation, in any form accepted by pyephem
+            epoch: The epoch of the coordinates, in any form accepted by pyephem
+
+        Returns:
+            tuple: Right ascension and declination in radians
+        """
+        bucket = int(round(float(ephem.Date(date)) * SECONDS_PER_DAY / self.time_bucket))
+        key = (name, bucket, float(ephem.Date(epoch)))
+
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+
+            body = self._get_body(name)
+            body.compute(ephem.Date(bucket * self.time_bucket / SECONDS_PER_DAY), epoch=key[2])
+            result = (float(body.a_ra), float(body.a_dec))
+            self.misses += 1
+            self._results[key] = result
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)  # Evict the least recently used
+        return result
+
+    def statistics(self):
+        """
+        Returns:
+            dict: The number of hits, misses and currently memoised results
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._results)}
+
+    def _get_body(self, name: str):
+        """
+        Get or create the body. The caller is responsible for holding the lock.
+        """
+        body = self._bodies.get(name)
+        if body is None:
+            try:
+                body = self._factories[name]()
+            except KeyError:
+                raise ValueError("Unknown planetary body: %s" % name) from None
+            self._bodies[name] = body
+        return body
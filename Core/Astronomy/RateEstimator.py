@@ -0,0 +1,59 @@
+from collections import namedtuple
+import ephem
+import numpy as np
+
+
+SECONDS_PER_DAY = 86400.0
+
+# Coordinates in degrees, rates in degrees per second, accelerations in degrees per second squared and residuals as
+# the RMS of the fit in degrees
+RateEstimate = namedtuple("RateEstimate", ["ra", "dec", "ra_rate", "dec_rate", "ra_acceleration", "dec_acceleration",
+                                           "ra_residual", "dec_residual"])
+
+
+class RateEstimator:
+    """
+    Estimate the rate of change of a moving object's coordinates. The object is sampled on a time grid, starting at
+    the provided date, and the rates (and optionally the accelerations) are fitted with least squares. With the
+    accelerations fitted, the rates are the instantaneous ones at the start. Otherwise they are the average rates over
+    the sampled span.
+    """
+    def __init__(self, span=3600.0, samples=13):
+        """
+        Args:
+            span (float): Sampled time span in seconds
+            samples (int): Number of samples in the span
+        """
+        self.span = span
+        self.samples = samples
+
+    def estimate(self, position, date, epoch, acceleration=False):
+        """
+        Fit the coordinates of the object over the time grid.
+
+        Args:
+            position: Callable taking a pyephem date and the epoch and returning the RA and DEC in radians
+            date: Start date of the grid, in any form accepted by pyephem
+            epoch: The epoch of the coordinates, in any form accepted by pyephem
+            acceleration (bool): Also fit the accelerations of the coordinates
+
+        Returns:
+            RateEstimate: The fitted coordinates at the start date, the rates, the accelerations and the residuals
+        """
+        offsets = np.linspace(0.0, self.span, self.samples)  # Seconds from the start date
+        start = float(ephem.Date(date))
+        epoch = ephem.Date(epoch)
+        coordinates = np.degrees([position(ephem.Date(start + offset / SECONDS_PER_DAY), epoch)
+                                  for offset in offsets])
+        coordinates[:, 0] = np.degrees(np.unwrap(np.radians(coordinates[:, 0])))  # Avoid the jump of RA at 360
+
+        columns = [np.ones_like(offsets), offsets]
+        if acceleration:
+            columns.append(0.5 * offsets ** 2)
+        design = np.stack(columns, axis=-1)
+        solution = np.linalg.lstsq(design, coordinates, rcond=None)[0]
+        residuals = np.sqrt(np.mean((coordinates - design.dot(solution)) ** 2, axis=0))
+        accelerations = solution[2] if acceleration else (0.0, 0.0)
+
+        return RateEstimate(solution[0][0] % 360.0, solution[0][1], solution[1][0], solution[1][1],
+                            accelerations[0], accelerations[1], residuals[0], residuals[1])
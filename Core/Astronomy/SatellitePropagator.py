@@ -0,0 +1,145 @@
+import time
+import logging
+import threading
+from collections import namedtuple
+import erfa
+import numpy as np
+from sgp4.api import Satrec, SatrecArray
+from skyfield.api import wgs84
+from skyfield.sgp4lib import theta_GMST1982
+
+
+SECONDS_PER_DAY = 86400.0
+
+# Arrays of shape (satellites, times) in degrees, except for the range in km. Points where the propagation failed are
+# NaN. The dates are the UTC Julian dates (two parts) of the time grid.
+SatelliteTrack = namedtuple("SatelliteTrack", ["names", "jd_1", "jd_2", "altitude", "azimuth", "hour_angle",
+                                               "declination", "range"])
+
+# Ranked calibration candidate, with its mean position over the time grid and the drift (the largest distance from
+# the mean position) in degrees
+CalibrationCandidate = namedtuple("CalibrationCandidate", ["name", "norad_id", "altitude", "azimuth", "hour_angle",
+                                                           "declination", "drift"])
+
+
+class SatellitePropagator:
+    """
+    Propagate many satellites over a grid of times in one vectorized SGP4 pass. The positions are rotated from the
+    TEME frame of SGP4 to the Earth fixed frame, where the topocentric vector gives directly the horizontal coordinates
+    and the hour angle and declination of the dish. Polar motion is ignored, which is well below the beam width.
+    """
+    def __init__(self, context, max_cached=4096):
+        """
+        Args:
+            context: The `AstronomyContext` providing the location and the timescale
+            max_cached (int): Maximum number of parsed element sets kept
+        """
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.context = context
+        self.max_cached = max_cached
+        self._satrecs = {}  # Parsed elements, keyed by the two lines
+        self._lock = threading.Lock()
+
+    def propagate(self, entries, offsets=(0.0,), start=None):
+        """
+        Calculate the positions of the satellites at the times of the grid.
+
+        Args:
+            entries: Sequence of `TLEEntry` objects
+            offsets: Seconds from the start, for each time of the grid
+            start (tuple): Start of the grid as (year, month, day, hour, minute, second). Default is the current time.
+
+        Returns:
+            SatelliteTrack: The positions of all the satellites at all the times
+        """
+        start = tuple(start) if start is not None else time.gmtime()[:6]
+        offsets = np.atleast_1d(np.asarray(offsets, dtype=float))
+        jd_1, jd_2 = erfa.dtf2d(b'UTC', *[int(component) for component in start[:5]], float(start[5]))
+        jd_1 = np.full(offsets.shape, jd_1)
+        jd_2 = jd_2 + offsets / SECONDS_PER_DAY  # UTC dates, as expected by SGP4 for the TLE epochs
+
+        times = self.context.timescale.utc(*[int(component) for component in start[:5]], start[5] + offsets)
+        theta = theta_GMST1982(times.whole, times.ut1_fraction)[0]  # Sidereal angle of the TEME frame
+
+        names = [entry.name for entry in entries]
+        if not names:
+            empty = np.empty((0, offsets.size))
+            return SatelliteTrack(names, jd_1, jd_2, empty, empty, empty, empty, empty)
+
+        errors, position = self._satrec_array(entries).sgp4(jd_1, jd_2)[:2]
+        position[errors != 0] = np.nan
+
+        # Rotate from TEME to the Earth fixed frame and get the vector from the observer
+        cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+        earth_fixed = np.stack((cos_theta * position[..., 0] + sin_theta * position[..., 1],
+                                -sin_theta * position[..., 0] + cos_theta * position[..., 1],
+                                position[..., 2]), axis=-1)
+        location = self.context.observer  # Read once, so all the values belong to the same location
+        observer = wgs84.latlon(location.latitude, location.longitude, location.altitude)
+        topocentric = earth_fixed - observer.itrs_xyz.km
+        distance = np.linalg.norm(topocentric, axis=-1)
+
+        latitude, longitude = np.radians(location.latitude), np.radians(location.longitude)
+        east = np.array((-np.sin(longitude), np.cos(longitude), 0.0))
+        north = np.array((-np.sin(latitude) * np.cos(longitude), -np.sin(latitude) * np.sin(longitude),
+                          np.cos(latitude)))
+        up = np.array((np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude)))
+        altitude = np.degrees(np.arcsin(topocentric.dot(up) / distance))
+        azimuth = np.degrees(np.arctan2(topocentric.dot(east), topocentric.dot(north))) % 360.0
+
+        # Hour angle is measured from the local meridian, positive to the west
+        meridian_x = topocentric[..., 0] * np.cos(longitude) + topocentric[..., 1] * np.sin(longitude)
+        meridian_y = -topocentric[..., 0] * np.sin(longitude) + topocentric[..., 1] * np.cos(longitude)
+        hour_angle = np.degrees(np.arctan2(-meridian_y, meridian_x))
+        declination = np.degrees(np.arctan2(topocentric[..., 2], np.hypot(meridian_x, meridian_y)))
+
+        return SatelliteTrack(names, jd_1, jd_2, altitude, azimuth, hour_angle, declination, distance)
+
+    def rank_geostationary(self, entries, span=SECONDS_PER_DAY, step=900.0, min_altitude=10.0, start=None):
+        """
+        Rank the satellites as calibration targets. A good target stays above the minimum altitude during the whole
+        span and moves as little as possible in hour angle and declination, so the dish does not need to track it.
+
+        Args:
+            entries: Sequence of `TLEEntry` objects, for example the whole TLE catalog
+            span (float): Checked time span in seconds
+            step (float): Seconds between the checked times
+            min_altitude (float): Minimum altitude in degrees
+            start (tuple): Start of the span. Default is the current time.
+
+        Returns:
+            list: `CalibrationCandidate` objects, with the most stable first
+        """
+        entries = list(entries)
+        track = self.propagate(entries, np.arange(0.0, span + step / 2.0, step), start)
+
+        with np.errstate(invalid='ignore'):
+            visible = np.all(track.altitude >= min_altitude, axis=1)  # NaN positions are not visible
+        mean_ha = np.degrees(np.angle(np.mean(np.exp(1j * np.radians(track.hour_angle)), axis=1)))
+        mean_dec = np.mean(track.declination, axis=1)
+        ha_offset = (track.hour_angle - mean_ha[:, np.newaxis] + 180.0) % 360.0 - 180.0
+        drift = np.max(np.hypot(ha_offset * np.cos(np.radians(track.declination)),
+                                track.declination - mean_dec[:, np.newaxis]), axis=1)
+
+        candidates = [CalibrationCandidate(entries[i].name, entries[i].norad_id, float(np.mean(track.altitude[i])),
+                                           float(track.azimuth[i][0]), float(mean_ha[i]), float(mean_dec[i]),
+                                           float(drift[i]))
+                      for i in np.flatnonzero(visible)]
+        candidates.sort(key=lambda candidate: (candidate.drift, -candidate.altitude))
+        return candidates
+
+    def _satrec_array(self, entries):
+        """
+        Get the vectorized SGP4 object for the satellites. The parsed elements are reused between the calls.
+        """
+        with self._lock:
+            if len(self._satrecs) > self.max_cached:
+                self._satrecs.clear()
+            satrecs = []
+            for entry in entries:
+                key = (entry.line1, entry.line2)
+                satrec = self._satrecs.get(key)
+                if satrec is None:
+                    satrec = self._satrecs[key] = Satrec.twoline2rv(entry.line1, entry.line2)
+                satrecs.append(satrec)
+        return SatrecArray(satrecs)
@@ -0,0 +1,95 @@
+import math
+from collections import namedtuple
+import numpy as np
+
+
+# Corners used for each scanning direction. The tuple contains the indices of the initial, the second and the third
+# point of the box, and whether the rows of the scan run along the second coordinate.
+SCAN_DIRECTIONS = {
+    "R-Down": (0, 1, 2, False),
+    "R-Up": (3, 2, 1, False),
+    "L-Down": (1, 0, 3, False),
+    "L-Up": (2, 3, 0, False),
+    "Up-R": (3, 0, 1, True),
+    "Up-L": (2, 1, 0, True),
+    "Down-R": (0, 3, 2, True),
+    "Down-L": (1, 2, 3, True),
+}
+
+
+class ScanMap(namedtuple("ScanMap", ["map_points", "raw_points"])):
+    """
+    Array backed sky scanning map. Both fields are arrays of shape (N, 2), holding the celestial (mapped) points and
+    the points in the coordinate system of the user.
+    """
+    __slots__ = ()
+
+    @property
+    def size(self):
+        """
+        Returns:
+            int: Number of points in the map
+        """
+        return self.map_points.shape[0]
+
+    def to_tuples(self):
+        """
+        Convert the map to the tuple form returned by `scanning_map_generator`.
+
+        Returns:
+            list: Map points and raw points, as tuples of coordinate tuples
+        """
+        return [tuple(map(tuple, self.map_points.tolist())), tuple(map(tuple, self.raw_points.tolist()))]
+
+
+def scan_grid(points: tuple, step_size: tuple, direction: str):
+    """
+    Generate the boustrophedon grid of a scanning box. The first row starts from the initial point and moves towards
+    the second point, then every next row is one step further towards the third point and runs the opposite way.
+
+    The coordinates are accumulated from the steps in the same order as when walking the grid point by point, so the
+    result is identical to the point by point calculation.
+
+    Args:
+        points (tuple): The four corner points of the box
+        step_size (tuple): Stepping size for each axis
+        direction (str): Direction of scanning, one of `SCAN_DIRECTIONS`
+
+    Returns:
+        tuple: Arrays of the first and of the second coordinate of the points
+    """
+    initial, second, third, second_axis = SCAN_DIRECTIONS[direction]
+    initial_point, second_point, third_point = points[initial], points[second], points[third]
+    # TODO implement a fix to include the last box without overlap
+    num_boxes_x = int(math.floor(abs(second_point[0] - initial_point[0]) / step_size[0]))
+    num_boxes_y = int(math.floor(abs(second_point[1] - third_point[1]) / step_size[1]))
+
+    if not second_axis:
+        forward = second_point[0] - initial_point[0] >= 0  # Direction of the first row
+        row_steps, col_steps = _row_steps(num_boxes_y, num_boxes_x, step_size[1], step_size[0], forward)
+        x_steps, y_steps = col_steps, row_steps
+    else:
+        forward = second_point[1] - initial_point[1] >= 0
+        row_steps, col_steps = _row_steps(num_boxes_x, num_boxes_y, step_size[0], step_size[1], forward)
+        x_steps, y_steps = row_steps, col_steps
+
+    x_points = np.cumsum(np.concatenate(([float(initial_point[0])], x_steps)))
+    y_points = np.cumsum(np.concatenate(([float(initial_point[1])], y_steps)))
+    return x_points, y_points
+
+
+def _row_steps(num_rows: int, num_cols: int, row_step: float, col_step: float, forward: bool):
+    """
+    Calculate the step taken to reach each point of the grid, after the initial one. Each row starts with a step to
+    the next row (except for the first) and continues with the steps along the row, alternating the direction.
+
+    Returns:
+        tuple: Arrays of the steps across the rows and along the rows
+    """
+    sign = np.where(np.arange(num_rows) % 2 == 0, 1.0, -1.0) * (1.0 if forward else -1.0)
+    col_steps = np.repeat((sign * col_step)[:, np.newaxis], num_cols, axis=1)
+    row_steps = np.zeros((num_rows, num_cols))
+    if num_rows > 1 and num_cols > 0:
+        col_steps[1:, 0] = 0.0  # The first point of the next rows is only a step across
+        row_steps[1:, 0] = -row_step
+    return row_steps.ravel(), col_steps.ravel()
@@ -0,0 +1,103 @@
+import time
+import logging
+import threading
+from collections import namedtuple
+import numpy as np
+
+
+MIN_SAMPLES_PER_ORBIT = 1000  # Fast satellites are sampled densely enough for the linear interpolation
+
+# Interpolated position of a satellite in degrees
+SatellitePosition = namedtuple("SatellitePosition", ["altitude", "azimuth", "hour_angle", "declination"])
+
+
+class TrajectoryCache:
+    """
+    Precomputed trajectories of satellites. The position of each requested satellite is propagated once for the next
+    hours and the following requests are interpolated from the samples. A trajectory is calculated again when the time
+    leaves its span or when the elements of the satellite change, for example after a TLE file update.
+
+    Geostationary satellites barely move, so with the default sampling the interpolation error is far below 1e-4
+    degrees. Faster satellites are sampled more densely, based on their mean motion.
+    """
+    def __init__(self, propagator, span=6 * 3600.0, step=60.0, max_size=64):
+        """
+        Args:
+            propagator: The `SatellitePropagator` used to calculate the trajectories
+            span (float): Time span of each trajectory in seconds
+            step (float): Maximum time between the samples in seconds
+            max_size (int): Maximum number of trajectories kept
+        """
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.propagator = propagator
+        self.span = span
+        self.step = step
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._trajectories = {}  # Name of the satellite to (elements, start time, step, samples)
+        self._lock = threading.Lock()
+
+    def position(self, entry, now=None):
+        """
+        Get the interpolated position of the satellite.
+
+        Args:
+            entry: The `TLEEntry` of the satellite
+            now (float): Unix time of the position. Default is the current time.
+
+        Returns:
+            SatellitePosition: Altitude, azimuth, hour angle and declination in degrees
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            trajectory = self._trajectories.get(entry.name)
+            if trajectory is None or trajectory[0] != (entry.line1, entry.line2) or \
+                    not trajectory[1] <= now <= trajectory[1] + self.span:
+                trajectory = self._calculate(entry, now)
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        elements, start, step, samples = trajectory
+        index = min(int((now - start) // step), samples.shape[1] - 2)
+        fraction = (now - start) / step - index
+        altitude, azimuth, hour_angle, declination = samples[:, index] * (1.0 - fraction) + \
+            samples[:, index + 1] * fraction
+        return SatellitePosition(altitude, azimuth % 360.0, (hour_angle + 180.0) % 360.0 - 180.0, declination)
+
+    def invalidate(self):
+        """
+        Remove all the trajectories.
+        """
+        with self._lock:
+            self._trajectories.clear()
+
+    def statistics(self):
+        """
+        Returns:
+            dict: The number of hits, misses and currently kept trajectories
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._trajectories)}
+
+    def _calculate(self, entry, now: float):
+        """
+        Propagate the trajectory of the satellite, starting at the current second. The caller is responsible for
+        holding the lock.
+        """
+        period = 86400.0 / float(entry.line2[52:63])  # Orbital period in seconds, from the mean motion
+        step = min(self.step, period / MIN_SAMPLES_PER_ORBIT)
+        start = float(int(now))
+        offsets = np.arange(0.0, self.span + step, step)
+        track = self.propagator.propagate([entry], offsets, time.gmtime(start)[:6])
+
+        # The angles are unwrapped, so that the interpolation does not jump at the wrapping points
+        samples = np.array([track.altitude[0], np.degrees(np.unwrap(np.radians(track.azimuth[0]))),
+                            np.degrees(np.unwrap(np.radians(track.hour_angle[0]))), track.declination[0]])
+        if len(self._trajectories) >= self.max_size:
+            self._trajectories.pop(next(iter(self._trajectories)))  # Remove the oldest
+        trajectory = ((entry.line1, entry.line2), start, step, samples)
+        self._trajectories[entry.name] = trajectory
+        self.logger.debug("Trajectory of %s calculated with %d samples", entry.name, offsets.size)
+        return trajectory
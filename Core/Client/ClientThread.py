@@ -1,5 +1,7 @@
 import logging
+import numpy as np
 from PyQt5 import QtCore, QtNetwork
+from Core.Utilities import BinaryProtocol
 
 
 class ClientThread(QtCore.QObject):
@@ -7,13 +9,33 @@ class ClientThread(QtCore.QObject):
     conStatSigC = QtCore.pyqtSignal(str, name='conClientStat')  # Connection indication signal
     dataRcvSigC = QtCore.pyqtSignal(str, name='dataClientRX')  # Send the received data out
     sendData = QtCore.pyqtSignal(str, name='sendDataClient')  # Data to be sent to the server
+    sendCommand = QtCore.pyqtSignal(int, object, name='sendCommandClient')  # Message type and values to be sent
+    # Message type, values, position of the values in the command, total values and send window of a long command part
+    sendCommandPart = QtCore.pyqtSignal(int, object, int, int, object, name='sendCommandPartClient')
     reConnectSigC = QtCore.pyqtSignal(name='reConnectClient')  # A reconnection signal originating from a button press
     newConInitComms = QtCore.pyqtSignal(name='sendNewConCommands')  # Send the initial commands on each new connection
+    PART_HIGH_WATER_BYTES = 64 * 1024  # Bytes of the socket buffer, above which the parts in flight are held back
 
     def __init__(self, cfg_data, parent=None):
         super(ClientThread, self).__init__(parent)  # Get the parent of the class
         self.cfg_data = cfg_data  # Create a variable for the cfg file
         self.logger = logging.getLogger(__name__)  # Create the logger
+        self.binary_enabled = False  # Ask the server for the binary framing on each new connection
+        self.binary = False  # Binary framing was accepted by the server on the current connection
+        self.scan_streaming_enabled = False  # Ask the server for the streaming of the scanning map on each connection
+        self.scan_streaming = False  # Streaming of the scanning map was accepted by the server
+        self._unreleased_parts = []  # Send windows of the parts written while the socket buffer was above the limit
+        self._open_part = None  # Type, next position and total values of a long command not yet complete
+        self.read_settings()  # Keep the connection settings, which are updated when they change
+        cfg_data.subscribe(self.read_settings, (("TCP", "host"), ("TCP", "port"), ("TCP", "binary"),
+                                                ("TCP", "scan_stream")))
+
+    def read_settings(self, changed=None):
+        # Called by the settings, whenever the address of the server or the requested protocol changes
+        self.settings = (self.cfg_data.get_tcp_client_host(), self.cfg_data.get_value("TCP", "port"))
+        # Only requested if enabled, since older servers may not ignore the unknown negotiation lines
+        self.binary_enabled = self.cfg_data.get_value("TCP", "binary") == "yes"
+        self.scan_streaming_enabled = self.cfg_data.get_value("TCP", "scan_stream") == "yes"
 
     def start(self):
         mutex = QtCore.QMutex()  # Create a QMutex object
@@ -21,6 +43,7 @@ class ClientThread(QtCore.QObject):
         self.logger.info("Client thread started")  # Indicate thread start
         self.sock = QtNetwork.QTcpSocket()  # Create the TCP socket
         self.reConnectSigC.connect(self.connect_client)  # Do the reconnect signal connection
+        self.sendCommandPart.connect(self.send_command_part)  # Parts are dropped but accounted for, when disconnected
         self.connect_client()  # Start a connection
         mutex.unlock()  # Unlock the thread, since it has started successfully
 
@@ -29,18 +52,17 @@ class ClientThread(QtCore.QObject):
     def connect_client(self):
         self.logger.debug("Client connection initializer called")
         if self.sock.state() != QtNetwork.QAbstractSocket.ConnectedState:
-            # Get the host and port from the settings file for the client connection
-            host = self.cfg_data.get_tcp_client_host()
-            port = self.cfg_data.get_tcp_client_port()
+            host, port = self.settings  # Latest host and port of the settings
 
             self.sock = QtNetwork.QTcpSocket()  # Create the TCP socket
             self.sock.readyRead.connect(self._receive)  # Data que signal
             self.sock.connected.connect(self._host_connected)  # What to do when we have connected
             self.sock.error.connect(self._error)  # Log any error occurred and also perform the necessary actions
             self.sock.disconnected.connect(self._disconnected)  # If there is state change then call the function
+            self.sock.bytesWritten.connect(self._bytes_written)  # Give back the places of the written parts
 
             self.conStatSigC.emit("Connecting")  # Indicate that we are attempting a connection
-            self.sock.connectToHost(QtNetwork.QHostAddress(host), int(port))  # Attempt to connect to the server
+            self.sock.connectToHost(QtNetwork.QHostAddress(host), port)  # Attempt to connect to the server
 
             if not self.sock.waitForConnected(msecs=1000):  # Wait a until connected (the function is waiting for 1 sec)
                 self.conStatSigC.emit("Disconnected")  # Indicate that we are not connected
@@ -49,22 +71,122 @@ class ClientThread(QtCore.QObject):
     @QtCore.pyqtSlot(str, name='sendDataClient')
     def send_c(self, data: str):
         if self.sock.state() == QtNetwork.QAbstractSocket.ConnectedState:
+            self._close_open_part()
             self.sock.write(data.encode('utf-8'))  # Send the data to the server
             self.logger.debug("Data sent to RPi server: %s", data)
 
+    @QtCore.pyqtSlot(int, object, name='sendCommandClient')
+    def send_command(self, msg_type: int, values):
+        """
+        Send a command with numeric values. It is packed to a binary frame if the server accepted the binary framing,
+        else it is sent as the equivalent text command.
+
+        Args:
+            msg_type (int): The `MessageType` of the command
+            values: The values of the command, or an array of points
+        """
+        if self.sock.state() == QtNetwork.QAbstractSocket.ConnectedState:
+            self._close_open_part()
+            if self.binary:
+                self.sock.write(BinaryProtocol.encode_frame(msg_type, values))  # No text formatting needed
+            else:
+                # Servers without the scan streaming expect the old format of the scan commands
+                text = BinaryProtocol.encode_text(msg_type, values, legacy=not self.scan_streaming)
+                self.sock.write(text.encode('utf-8'))
+            self.logger.debug("Command %d sent to RPi server", msg_type)
+
+    @QtCore.pyqtSlot(int, object, int, int, object, name='sendCommandPartClient')
+    def send_command_part(self, msg_type: int, values, position: int, total: int, window):
+        """
+        Send a part of a long command, like the scanning map, as soon as it is calculated. The parts of a command must
+        be sent in order. Each part took a place of its send window, which is given back once the part is handed to
+        the socket and the socket buffer is below the high water mark.
+
+        Args:
+            msg_type (int): The `MessageType` of the command
+            values: The values of the part
+            position (int): Number of values of the command before this part
+            total (int): Number of values of the whole command
+            window: The `SendWindow` of the producer of the parts
+        """
+        # A part whose command was not started on this connection is dropped, for example after a reconnection
+        if self.sock.state() == QtNetwork.QAbstractSocket.ConnectedState and (
+                position == 0 or self._open_part == (msg_type, position, total)):
+            if position == 0:
+                self._close_open_part()
+            if self.binary:
+                self.sock.write(BinaryProtocol.encode_frame_part(msg_type, values, position, total))
+            else:
+                text = BinaryProtocol.encode_text_part(msg_type, values, position, total, not self.scan_streaming)
+                self.sock.write(text.encode('utf-8'))
+            end = position + int(np.size(values))
+            self._open_part = (msg_type, end, total) if end < total else None
+        self._unreleased_parts.append(window)
+        self._release_parts()
+
+    def _close_open_part(self):
+        """
+        Complete a long command whose remaining parts will not be sent, because it was cancelled, so that the next
+        command is not taken as part of it. The missing values of a binary frame are sent as NaN.
+        """
+        if self._open_part is None:
+            return
+        msg_type, position, total = self._open_part
+        self._open_part = None
+        self.logger.warning("Command %d was interrupted after %d of its %d values", msg_type, position, total)
+        if self.binary:
+            self.sock.write(BinaryProtocol.encode_frame_part(msg_type, np.full(total - position, np.nan), position,
+                                                             total))
+        else:
+            self.sock.write(BinaryProtocol.encode_text_part(msg_type, (), position, position,
+                                                            legacy=not self.scan_streaming).encode('utf-8'))
+
+    def _release_parts(self):
+        """
+        Give back the places of the written parts, unless the socket is backed up.
+        """
+        if self._unreleased_parts and (self.sock.bytesToWrite() <= self.PART_HIGH_WATER_BYTES or
+                                       self.sock.state() != QtNetwork.QAbstractSocket.ConnectedState):
+            for window in self._unreleased_parts:
+                window.release()
+            self._unreleased_parts = []
+
+    def _bytes_written(self, count: int):
+        self._release_parts()  # The socket buffer drained, so more parts can be calculated
+
     def _receive(self):
         while self.sock.bytesAvailable() > 0:  # Read all data in que
             string = self.sock.readLine().data().decode('utf-8').rstrip('\n')  # Get the data as a string
+            if string == BinaryProtocol.PROTOCOL_ACCEPT:
+                self.binary = True  # The following commands are sent in binary frames
+                self.logger.info("Binary framing accepted by the server")
+                continue
+            if string == BinaryProtocol.SCAN_STREAM_ACCEPT:
+                self.scan_streaming = True  # The scanning map can be sent in parts
+                self.logger.info("Streaming of the scanning map accepted by the server")
+                continue
             self.dataRcvSigC.emit(string)  # Decode the data to a string
             self.logger.debug("Client received: %s", string)
 
     def _disconnected(self):
         self.conStatSigC.emit("Disconnected")  # Indicate disconnection on the GUI
         self.sendData.disconnect()  # Detach the data sending signal to avoid accidental firing
+        self.sendCommand.disconnect()
+        self.binary = False  # Negotiated again on the next connection
+        self.scan_streaming = False
+        self._open_part = None
+        self._release_parts()  # The parts not yet written are lost with the connection
         self.logger.warning("Client disconnected from server or connection broken")
 
     def _host_connected(self):
         self.sendData.connect(self.send_c)  # Send the data to the server when this signal is fired
+        self.sendCommand.connect(self.send_command)
+        self.binary = False  # Text is used until the server accepts the binary framing
+        self.scan_streaming = False  # The whole map is sent at once, until the server accepts the streaming
+        if self.binary_enabled:
+            self.sendData.emit(BinaryProtocol.PROTOCOL_REQUEST)  # Text stays in use without an answer
+        if self.scan_streaming_enabled:
+            self.sendData.emit(BinaryProtocol.SCAN_STREAM_REQUEST)  # The old scan commands stay in use without one
         self.sendData.emit("CONNECT_CLIENT\n")  # Tell the RPi to connect the client
         self.sendData.emit("SEND_POS_UPDATE\n")  # Send the position report request
         self.sendData.emit("REPORT_MOTOR_STATUS\n")  # Send the status of the motors
@@ -81,10 +203,12 @@ class ClientThread(QtCore.QObject):
         self.sock.disconnected.disconnect()  # Disconnect this signal first to avoid getting in the function
         if self.sock.state() == QtNetwork.QAbstractSocket.ConnectedState:
             self.sendData.disconnect()  # Disconnect the data send signal, since the thread is closing
+            self.sendCommand.disconnect()
             self.sock.disconnectFromHost()  # Disconnect from the host
             # self.sock.waitForDisconnected(msecs=1000)  # And wait until disconnected or timeout (default 3 seconds)
         else:
             self.sock.close()  # Close the socket before exiting
         self.reConnectSigC.disconnect()  # Thread is closing so it will not be needed any more
+        self.sendCommandPart.disconnect()
         self.conStatSigC.emit("Disconnected")  # Indicate a disconnected state on the GUI
         self.logger.info("Client thread closed")
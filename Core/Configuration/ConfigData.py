@@ -1,56 +1,294 @@
 import xml.etree.ElementTree as etree
+import os
 import logging
+import tempfile
+import threading
+import contextlib
 
 
 class ConfData:
+    """
+    Settings of the application, kept in the parsed XML tree. Changes are made in memory and marked as dirty. They are
+    written to the file in batches, after `FLUSH_DELAY` seconds without a flush or when `flush` is called at shutdown,
+    so frequent updates like the steps from home do not rewrite the file each time.
+
+    Objects which keep a copy of some settings subscribe to them with `subscribe`, and they are told which settings
+    changed, instead of reading them again each time.
+    """
+    FLUSH_DELAY = 2.0  # Seconds between the first unsaved change and the write to the file
+    # Types of the numeric settings, by (element, setting). The other settings are kept as text.
+    VALUE_TYPES = {("location", "latitude"): float, ("location", "longitude"): float, ("location", "altitude"): float,
+                   ("TCP", "port"): int, ("TCPStell", "port"): int, ("TCPRPiServ", "port"): int,
+                   ("TCPStell", "update_rate"): float, ("TLE", "updt_interval"): int, ("object", "RA"): float,
+                   ("object", "DEC"): float, ("Steps", "ra_to_home"): int, ("Steps", "dec_to_home"): int}
+
     # Class constructor
     def __init__(self, filename):
         self.filename = filename  # Create a variable with the given filename
         self.logger = logging.getLogger(__name__)  # Create the logger for this module
+        self.dirty = set()  # (element, setting) of the changes not yet written to the file
+        self.statistics = {"changes": 0, "writes": 0}
+        self._lock = threading.RLock()  # Settings are changed from several threads and written from the timer
+        self._timer = None  # Pending delayed flush
+        self._index = {}  # Text of each setting, by (element, child tag or attribute name)
+        self._values = {}  # Converted value of each setting, by (element, child tag or attribute name)
+        self._subscribers = []  # (callback, settings) of each subscription
+        self._changed = set()  # Settings changed and not yet notified to the subscribers
+        self._batch = threading.local()  # Changes staged by the `changes` block of each thread
         try:
             self.tree = etree.parse(self.filename)  # Try to parse the given file
             self.root = self.tree.getroot()  # Get the root from the XML file
+            self._build_index()
         except Exception:
             self.logger.exception("There is an issue with the XML settings file. See traceback below.")
 
     def parse(self):
+        self.flush()  # Keep the unsaved changes, before reading the file again
         try:
-            self.tree = etree.parse(self.filename)  # Try to parse the given file
-            self.root = self.tree.getroot()  # Get the root from the XML file
+            with self._lock:
+                previous = self._index
+                self.tree = etree.parse(self.filename)  # Try to parse the given file
+                self.root = self.tree.getroot()  # Get the root from the XML file
+                self._build_index()
+                self._changed.update(key for key in previous.keys() | self._index.keys()
+                                     if previous.get(key) != self._index.get(key))  # Settings edited in the file
         except Exception:
             self.logger.exception("There is an issue with the XML settings file. See traceback below.")
+        self._notify()
 
     def get_config(self, child, sub_child):
-        children = list(self.root.find(child))
-        for item in children:
-            if item.tag == sub_child:
-                return item.text
-        return ""
+        return self._index.get((child, sub_child), "")
+
+    def get_attribute(self, element, attribute):
+        """
+        Args:
+            element (str): Tag of the element
+            attribute (str): Name of the attribute
+
+        Returns:
+            str: The value of the attribute, or None if it is not set
+        """
+        return self._index.get((element, attribute))
+
+    def get_value(self, element, setting):
+        """
+        Get a setting, converted to its type. Numeric settings are converted once, when the file is parsed or when the
+        setting is changed.
+
+        Args:
+            element (str): Tag of the element
+            setting (str): Tag of the child element or name of the attribute
+
+        Returns:
+            The value of the setting, or None if it is not set or it is not a valid number
+        """
+        return self._values.get((element, setting))
 
     def set_config(self, element, child, value):
+        self._apply(self._set_config, element, child, value)
+
+    def set_attribute(self, element, attribute, value):
+        """
+        Set an attribute of an element of the settings.
+
+        Args:
+            element (str): Tag of the element
+            attribute (str): Name of the attribute
+            value (str): The new value
+        """
+        self._apply(self._set_attribute, element, attribute, value)
+
+    def subscribe(self, callback, settings=None):
+        """
+        Get notified of the changes of the settings. The callback is called in the thread which made the change, with
+        the set of the changed (element, setting) keys.
+
+        Args:
+            callback: Called with the set of the changed settings
+            settings: The (element, setting) keys of interest. None notifies the changes of all the settings.
+
+        Returns:
+            The subscription, to be passed to `unsubscribe`
+        """
+        subscription = (callback, frozenset(settings) if settings is not None else None)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stop the notifications of a subscription.
+
+        Args:
+            subscription: The subscription returned by `subscribe`
+        """
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    @contextlib.contextmanager
+    def changes(self):
+        """
+        Group several changes, so the subscribers are notified once, after all of them are made. For example the
+        latitude and the longitude are changed together. The changes are staged while the block runs, without holding
+        the lock, and they are applied together when it exits. Settings read inside the block still have their
+        previous values, and the staged changes are dropped if the block raises an exception.
+        """
+        if getattr(self._batch, "staged", None) is not None:
+            yield  # Nested block, applied with the outermost one
+            return
+
+        self._batch.staged = staged = []
+        try:
+            yield
+        finally:
+            self._batch.staged = None
+        with self._lock:
+            for change, args in staged:
+                change(*args)
+        self._notify()
+
+    def flush(self):
+        """
+        Write the unsaved changes to the file. The file is replaced atomically, so it is never left half written.
+
+        Returns:
+            bool: False if writing the file failed
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.dirty:
+                return True
+
+            directory = os.path.dirname(os.path.abspath(self.filename))
+            file_descriptor, temp_name = tempfile.mkstemp(dir=directory, prefix=".settings_", suffix=".part")
+            try:
+                with os.fdopen(file_descriptor, "wb") as temp_file:
+                    self.tree.write(temp_file)
+                if os.path.exists(self.filename):
+                    os.chmod(temp_name, os.stat(self.filename).st_mode & 0o777)  # Keep the permissions of the file
+                os.replace(temp_name, self.filename)
+            except Exception:
+                self.logger.exception("The settings could not be written to the file. See traceback.")
+                if os.path.exists(temp_name):
+                    os.remove(temp_name)
+                return False
+            self.dirty.clear()
+            self.statistics["writes"] += 1
+        return True
+
+    def _build_index(self):
+        """
+        Index the text and the converted value of all the settings. The caller is responsible for holding the lock.
+        """
+        self._index = {}
+        self._values = {}
+        for element in self.root:
+            for attribute, value in element.attrib.items():
+                self._index_setting(element.tag, attribute, value)
+            for child in element:
+                self._index_setting(element.tag, child.tag, child.text)
+
+    def _index_setting(self, element, setting, text):
+        """
+        Index the text of a setting and its converted value.
+        """
+        key = (element, setting)
+        self._index[key] = text
+        value_type = self.VALUE_TYPES.get(key)
+        if value_type is None:
+            self._values[key] = text
+            return
+        try:
+            self._values[key] = value_type(text)
+        except (TypeError, ValueError):
+            self._values[key] = None
+
+    def _apply(self, change, *args):
+        """
+        Make a change at once, or stage it if the thread is in a `changes` block.
+
+        Args:
+            change: Method which makes the change, while the lock is held
+            args: Arguments of the change
+        """
+        staged = getattr(self._batch, "staged", None)
+        if staged is not None:
+            staged.append((change, args))
+            return
+        with self._lock:
+            change(*args)
+        self._notify()
+
+    def _set_config(self, element, child, value):
+        """
+        Set the text of a child of an element. The caller is responsible for holding the lock.
+        """
         elm = self.root.find(element)  # Get the required element from the tree
         children = list(elm)  # List the children of the element
         for item in children:
             if item.tag == child:
-                item.text = value
-                self.tree.write(self.filename)
+                if item.text != value:
+                    item.text = value
+                    self._index_setting(element, child, value)
+                    self._mark_dirty(element, child)
                 break
             else:
                 continue
 
+    def _set_attribute(self, element, attribute, value):
+        """
+        Set an attribute of an element. The caller is responsible for holding the lock.
+        """
+        elm = self.root.find(element)
+        if elm.get(attribute) != value:
+            elm.set(attribute, value)
+            self._index_setting(element, attribute, value)
+            self._mark_dirty(element, attribute)
+
+    def _notify(self):
+        """
+        Notify the subscribers of the changed settings.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            changed, self._changed = self._changed, set()
+            subscribers = list(self._subscribers)
+
+        for callback, settings in subscribers:  # Called without the lock, so the callbacks can use the settings
+            relevant = changed if settings is None else changed & settings
+            if relevant:
+                try:
+                    callback(relevant)
+                except Exception:
+                    self.logger.exception("A subscriber of the settings failed. See traceback.")
+
+    def _mark_dirty(self, element, setting):
+        """
+        Mark a setting as changed and schedule the write of the file. The caller is responsible for holding the lock.
+        """
+        self.dirty.add((element, setting))
+        self._changed.add((element, setting))
+        self.statistics["changes"] += 1
+        if self._timer is None:
+            self._timer = threading.Timer(self.FLUSH_DELAY, self.flush)
+            self._timer.daemon = True  # Pending changes are written by the flush at shutdown
+            self._timer.start()
+
     def get_maps_selection(self):
-        return self.root.find("location").get("gmaps")
+        return self.get_attribute("location", "gmaps")
 
     def set_maps_selection(self, stat):
-        self.root.find("location").set("gmaps", stat)
-        self.tree.write(self.filename)
+        self.set_attribute("location", "gmaps", stat)
 
     def get_server_remote(self, element):
-        return self.root.find(element).get("remote")
+        return self.get_attribute(element, "remote")
 
     def set_server_remote(self, element, status):
-        self.root.find(element).set("remote", status)
-        self.tree.write(self.filename)
+        self.set_attribute(element, "remote", status)
 
     def get_lat_lon(self):
         lat = self.get_config("location", "latitude")
@@ -58,8 +296,9 @@ class ConfData:
         return [lat, lon]
 
     def set_lat_lon(self, location):
-        self.set_config("location", "latitude", str(location[0]))
-        self.set_config("location", "longitude", str(location[1]))
+        with self.changes():
+            self.set_config("location", "latitude", str(location[0]))
+            self.set_config("location", "longitude", str(location[1]))
 
     def get_altitude(self):
         return self.get_config("location", "altitude")
@@ -81,15 +320,13 @@ class ConfData:
         self.set_config("TCP", "port", str(port))
 
     def get_tcp_client_auto_conn_status(self):
-        return self.root.find("TCP").get("autoconnect")
+        return self.get_attribute("TCP", "autoconnect")
 
     def tcp_client_auto_conn_enable(self):
-        self.root.find("TCP").set("autoconnect", "yes")
-        self.tree.write(self.filename)
+        self.set_attribute("TCP", "autoconnect", "yes")
 
     def tcp_client_auto_conn_disable(self):
-        self.root.find("TCP").set("autoconnect", "no")
-        self.tree.write(self.filename)
+        self.set_attribute("TCP", "autoconnect", "no")
 
     # TCP Stellarium server data
     def get_stell_host(self):
@@ -105,15 +342,24 @@ class ConfData:
         self.set_config("TCPStell", "port", str(port))
 
     def get_tcp_stell_auto_conn_status(self):
-        return self.root.find("TCPStell").get("autoconnect")
+        return self.get_attribute("TCPStell", "autoconnect")
+
+    def get_position_update_rate(self):
+        """
+        Returns:
+            float: Maximum dish position updates per second sent to Stellarium and the GUI. Default is 10.
+        """
+        rate = self.get_value("TCPStell", "update_rate")
+        return rate if rate is not None else 10.0
+
+    def set_position_update_rate(self, rate):
+        self.set_attribute("TCPStell", "update_rate", str(rate))
 
     def tcp_stell_auto_conn_enable(self):
-        self.root.find("TCPStell").set("autoconnect", "yes")
-        self.tree.write(self.filename)
+        self.set_attribute("TCPStell", "autoconnect", "yes")
 
     def tcp_stell_auto_conn_disable(self):
-        self.root.find("TCPStell").set("autoconnect", "no")
-        self.tree.write(self.filename)
+        self.set_attribute("TCPStell", "autoconnect", "no")
 
     # TCP RPi server data (Auto-connection is dependant on the client)
     def get_rpi_host(self):
@@ -130,7 +376,7 @@ class ConfData:
 
     # Get the currently saved object
     def get_object(self):
-        stat_obj = self.root.find("object").get("stationary")
+        stat_obj = self.get_attribute("object", "stationary")
         if stat_obj == "no":
             return [self.get_config("object", "name"), -1]
         name = self.get_config("object", "name")
@@ -139,26 +385,27 @@ class ConfData:
         return [name, object_ra, object_dec]
 
     def set_object(self, name, object_ra=-1, object_dec=-1):
-        if (object_ra == -1) or (object_dec == -1):
-            self.root.find("object").set("stationary", "no")
-            self.set_config("object", "name", name)
-            self.set_config("object", "RA", str(-1))
-            self.set_config("object", "DEC", str(-1))
-        else:
-            self.root.find("object").set("stationary", "yes")
-            self.set_config("object", "name", name)
-            self.set_config("object", "RA", str(object_ra))
-            self.set_config("object", "DEC", str(object_dec))
+        with self.changes():
+            if (object_ra == -1) or (object_dec == -1):
+                self.set_attribute("object", "stationary", "no")
+                self.set_config("object", "name", name)
+                self.set_config("object", "RA", str(-1))
+                self.set_config("object", "DEC", str(-1))
+            else:
+                self.set_attribute("object", "stationary", "yes")
+                self.set_config("object", "name", name)
+                self.set_config("object", "RA", str(object_ra))
+                self.set_config("object", "DEC", str(object_dec))
 
     def get_home_steps(self):
-        ra_steps = self.root.find("Steps").get("ra_to_home")
-        dec_steps = self.root.find("Steps").get("dec_to_home")
+        ra_steps = self.get_attribute("Steps", "ra_to_home")
+        dec_steps = self.get_attribute("Steps", "dec_to_home")
         return [ra_steps, dec_steps]
 
     def set_home_steps(self, ra_steps, dec_steps):
-        self.root.find("Steps").set("ra_to_home", str(ra_steps))
-        self.root.find("Steps").set("dec_to_home", str(dec_steps))
-        self.tree.write(self.filename)
+        with self.changes():
+            self.set_attribute("Steps", "ra_to_home", str(ra_steps))
+            self.set_attribute("Steps", "dec_to_home", str(dec_steps))
 
     def get_tle_url(self):
         url = self.get_config("TLE", "url")
@@ -168,14 +415,14 @@ class ConfData:
         self.set_config("TLE", "url", url)
 
     def get_tle_auto_update(self):
-        return self.root.find("TLE").get("autoupdate")
+        return self.get_attribute("TLE", "autoupdate")
 
     def set_tle_auto_update(self, status: bool):
         if status is True:
             val = "yes"
         else:
             val = "no"
-        self.root.find("TLE").set("autoupdate", val)
+        self.set_attribute("TLE", "autoupdate", val)
 
     def get_tle_update_interval(self):
         return self.get_config("TLE", "updt_interval")
@@ -54,11 +54,11 @@ SETTINGS_XML_DEFAULT = """<settings>
         <latitude>40.6306</latitude>
         <longitude>22.9589</longitude>
     </location>
-    <TCP autoconnect="yes" remote="no">
+    <TCP autoconnect="yes" remote="no" binary="no" scan_stream="no">
         <host>127.0.0.1</host>
         <port>10001</port>
     </TCP>
-    <TCPStell autoconnect="yes" remote="no">
+    <TCPStell autoconnect="yes" remote="no" update_rate="10">
         <host>127.0.0.1</host>
         <port>10002</port>
     </TCPStell>
@@ -0,0 +1,130 @@
+import logging
+import threading
+from concurrent.futures import CancelledError, TimeoutError
+from PyQt5 import QtCore
+
+
+class AstronomyJob(QtCore.QRunnable):
+    """
+    Astronomy calculation on a thread of the global thread pool, and the future-like handle of its result. The result
+    is delivered through the signals of the `AstronomyJobPool` which submitted the job.
+
+    A streaming job runs a function returning an iterator, and each item is delivered as soon as it is calculated. The
+    cancellation is checked between the items, so a long scan stops at the next chunk.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_id: int, pool, function, args, stream=False):
+        """
+        Args:
+            job_id (int): Identifier of the job in the pool
+            pool: The `AstronomyJobPool` whose signals deliver the results
+            function: The calculation to run
+            args: Arguments of the calculation
+            stream (bool): The function returns an iterator, whose items are delivered one by one
+        """
+        super(AstronomyJob, self).__init__()
+        self.setAutoDelete(False)  # The job is also the handle of the result, so it is owned by Python
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.job_id = job_id
+        self.pool = pool
+        self.function = function
+        self.args = args
+        self.stream = stream
+        self.state = self.PENDING
+        self.on_item = None  # Called with each item of a streaming job
+        self.on_result = None  # Called with the result
+        self.on_error = None  # Called with the exception, if the calculation failed
+        self._result = None
+        self._error = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def run(self):
+        if self._cancel.is_set():
+            self._finish(self.CANCELLED)
+            return
+
+        self.state = self.RUNNING
+        try:
+            if self.stream:
+                for item in self.function(*self.args):
+                    if self._cancel.is_set():
+                        self._finish(self.CANCELLED)
+                        return
+                    self.pool.jobProgress.emit(self.job_id, item)
+            else:
+                self._result = self.function(*self.args)
+        except Exception as error:
+            self.logger.exception("Astronomy job %d failed. See traceback.", self.job_id)
+            self._error = error
+            self._finish(self.FAILED)
+            return
+        self._finish(self.CANCELLED if self._cancel.is_set() else self.FINISHED)
+
+    def cancel(self):
+        """
+        Request the cancellation of the job. A pending job does not run, a streaming job stops at its next item and the
+        result of a running calculation is dropped.
+
+        Returns:
+            bool: False if the job was already done
+        """
+        if self._done.is_set():
+            return False
+        self._cancel.set()
+        return True
+
+    def cancelled(self):
+        """
+        Returns:
+            bool: True if the cancellation of the job was requested
+        """
+        return self._cancel.is_set()
+
+    def done(self):
+        """
+        Returns:
+            bool: True if the job has finished, failed or was cancelled
+        """
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the result of the job.
+
+        Args:
+            timeout (float): Maximum seconds to wait. None waits until the job is done.
+
+        Returns:
+            The result of the calculation. None for a streaming job.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError("Astronomy job %d did not finish in time" % self.job_id)
+        if self.state == self.CANCELLED:
+            raise CancelledError()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def exception(self):
+        """
+        Returns:
+            Exception: The error of a failed job, or None
+        """
+        return self._error
+
+    def _finish(self, state: str):
+        """
+        Set the final state and report it to the pool.
+        """
+        self.state = state
+        self._done.set()
+        if state == self.FAILED:
+            self.pool.jobFailed.emit(self.job_id, repr(self._error))
+        else:
+            self.pool.jobFinished.emit(self.job_id, self._result)
@@ -0,0 +1,109 @@
+import logging
+import itertools
+from PyQt5 import QtCore
+from Core.Handlers.AstronomyJob import AstronomyJob
+
+
+class AstronomyJobPool(QtCore.QObject):
+    """
+    Run the astronomy calculations on the global thread pool, so the thread of the operations handler stays free to
+    handle the messages of the links. The jobs report back through the signals of the pool, which are delivered in the
+    thread of the pool, so the result callbacks can use the objects of that thread without locking.
+
+    Results of cancelled jobs are dropped, even if they were already queued for delivery.
+    """
+    jobProgress = QtCore.pyqtSignal(int, object, name='astronomyJobProgress')  # Item of a streaming job
+    jobFinished = QtCore.pyqtSignal(int, object, name='astronomyJobFinished')  # Result of a job
+    jobFailed = QtCore.pyqtSignal(int, str, name='astronomyJobFailed')  # Error of a job
+
+    def __init__(self, thread_pool=None, parent=None):
+        """
+        Args:
+            thread_pool: The `QThreadPool` running the jobs. Default is the global thread pool.
+            parent: Parent object, so the pool moves to the thread of its parent
+        """
+        super(AstronomyJobPool, self).__init__(parent)
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.thread_pool = thread_pool if thread_pool is not None else QtCore.QThreadPool.globalInstance()
+        self.jobs = {}  # Jobs not yet delivered, by identifier
+        self.statistics = {"submitted": 0, "finished": 0, "failed": 0, "cancelled": 0}
+        self._ids = itertools.count(1)
+
+        self.jobProgress.connect(self._job_progress)
+        self.jobFinished.connect(self._job_finished)
+        self.jobFailed.connect(self._job_failed)
+
+    def submit(self, function, *args, on_result=None, on_error=None):
+        """
+        Submit a calculation.
+
+        Args:
+            function: The calculation to run
+            *args: Arguments of the calculation
+            on_result: Called with the result, in the thread of the pool
+            on_error: Called with the exception, in the thread of the pool
+
+        Returns:
+            AstronomyJob: The handle of the job
+        """
+        return self._start(AstronomyJob(next(self._ids), self, function, args), None, on_result, on_error)
+
+    def submit_stream(self, function, *args, on_item=None, on_result=None, on_error=None):
+        """
+        Submit a calculation which returns an iterator. Each item is delivered as soon as it is calculated.
+
+        Args:
+            function: The calculation to run, returning an iterator
+            *args: Arguments of the calculation
+            on_item: Called with each item, in the thread of the pool
+            on_result: Called with None after the last item, in the thread of the pool
+            on_error: Called with the exception, in the thread of the pool
+
+        Returns:
+            AstronomyJob: The handle of the job
+        """
+        job = AstronomyJob(next(self._ids), self, function, args, stream=True)
+        return self._start(job, on_item, on_result, on_error)
+
+    def cancel_all(self):
+        """
+        Cancel all the jobs not yet delivered.
+        """
+        for job in self.jobs.values():
+            job.cancel()
+
+    def _start(self, job: AstronomyJob, on_item, on_result, on_error):
+        job.on_item = on_item
+        job.on_result = on_result
+        job.on_error = on_error
+        self.jobs[job.job_id] = job
+        self.statistics["submitted"] += 1
+        self.thread_pool.start(job)
+        return job
+
+    @QtCore.pyqtSlot(int, object, name='astronomyJobProgress')
+    def _job_progress(self, job_id: int, item):
+        job = self.jobs.get(job_id)
+        if job is not None and not job.cancelled() and job.on_item is not None:
+            job.on_item(item)
+
+    @QtCore.pyqtSlot(int, object, name='astronomyJobFinished')
+    def _job_finished(self, job_id: int, result):
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        if job.cancelled():
+            self.statistics["cancelled"] += 1
+            return
+        self.statistics["finished"] += 1
+        if job.on_result is not None:
+            job.on_result(result)
+
+    @QtCore.pyqtSlot(int, str, name='astronomyJobFailed')
+    def _job_failed(self, job_id: int, error: str):
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        self.statistics["failed"] += 1
+        if job.on_error is not None and not job.cancelled():
+            job.on_error(job.exception())
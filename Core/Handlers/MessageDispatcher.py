@@ -0,0 +1,137 @@
+import time
+import bisect
+import logging
+from collections import namedtuple
+
+
+# Typed messages of the RPi link
+MotorStatus = namedtuple("MotorStatus", ["status"])  # ENABLED or DISABLED
+StepsFromHome = namedtuple("StepsFromHome", ["ra_steps", "dec_steps"])
+MaxStepsToDo = namedtuple("MaxStepsToDo", ["axis", "steps"])  # Axis is RA or DEC
+PositionUpdate = namedtuple("PositionUpdate", ["hour_angle", "declination"])  # HA in hours, DEC in degrees
+DishPosition = namedtuple("DishPosition", ["hour_angle", "declination", "ra_steps", "dec_steps"])
+
+
+class MessageDispatcher:
+    """
+    Dispatch table of the line protocol. Each message type is registered once with its parser, which is built at
+    registration from the positions and the types of its fields, so dispatching a line is a dictionary lookup on the
+    first field followed by the parser and the handler. Messages already decoded from binary frames are dispatched
+    through the same table.
+
+    The number of messages, the parse errors and a latency histogram are kept for each message type.
+    """
+    HISTOGRAM_BOUNDS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)  # Upper bounds of the bins in us
+
+    def __init__(self, name: str, separator="_"):
+        """
+        Args:
+            name (str): Name of the link, used in the log
+            separator (str): Separator of the fields of a line
+        """
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.name = name
+        self.separator = separator
+        self.unknown = 0  # Lines without a registered message type
+        self._table = {}  # First field of the line to the message entry
+        self._binary_table = {}  # Binary message type to the message entry
+
+    def register(self, prefix: str, message_type, fields, handler, binary_type=None):
+        """
+        Register a message type.
+
+        Args:
+            prefix (str): The first field of the line, which identifies the message
+            message_type: The namedtuple class of the message
+            fields: (index, converter) of each field of the message, where the index is the position in the line
+            handler: Called with the typed message
+            binary_type (int): The `MessageType` of the equivalent binary message, whose values are in the order of
+                the fields
+        """
+        fields = tuple(fields)
+
+        def parse_line(parts):
+            return message_type._make([converter(parts[index]) for index, converter in fields])
+
+        def parse_values(values):
+            return message_type._make([converter(value) for (_, converter), value in zip(fields, values)])
+
+        entry = {"name": prefix, "parse_line": parse_line, "parse_values": parse_values, "handler": handler,
+                 "count": 0, "errors": 0, "parse_time": 0.0, "handle_time": 0.0,
+                 "histogram": [0] * (len(self.HISTOGRAM_BOUNDS) + 1)}
+        self._table[prefix] = entry
+        if binary_type is not None:
+            self._binary_table[binary_type] = entry
+
+    def dispatch(self, line: str):
+        """
+        Parse a line and call the handler of its message type.
+
+        Args:
+            line (str): The received line, without the new line
+
+        Returns:
+            bool: False if the message type is not registered
+        """
+        start = time.perf_counter()
+        parts = line.split(self.separator)
+        entry = self._table.get(parts[0])
+        if entry is None:
+            self.unknown += 1
+            return False
+        return self._handle(entry, entry["parse_line"], parts, start)
+
+    def dispatch_values(self, binary_type: int, values):
+        """
+        Call the handler of a message decoded from a binary frame.
+
+        Args:
+            binary_type (int): The `MessageType` of the message
+            values: The decoded values
+
+        Returns:
+            bool: False if the message type is not registered
+        """
+        start = time.perf_counter()
+        entry = self._binary_table.get(binary_type)
+        if entry is None:
+            self.unknown += 1
+            return False
+        return self._handle(entry, entry["parse_values"], values, start)
+
+    def statistics(self):
+        """
+        Returns:
+            dict: For each message type the number of messages, the parse errors, the mean parse and handling time in
+            us and the latency histogram, as counts per upper bound in us
+        """
+        labels = ["<=%d" % bound for bound in self.HISTOGRAM_BOUNDS] + [">%d" % self.HISTOGRAM_BOUNDS[-1]]
+        statistics = {"unknown": self.unknown}
+        for name, entry in self._table.items():
+            count = max(entry["count"], 1)
+            statistics[name] = {"count": entry["count"], "errors": entry["errors"],
+                                "mean_parse_us": entry["parse_time"] / count * 1e6,
+                                "mean_handle_us": entry["handle_time"] / count * 1e6,
+                                "histogram": dict(zip(labels, entry["histogram"]))}
+        return statistics
+
+    def _handle(self, entry: dict, parser, data, start: float):
+        """
+        Parse the data with the parser of the entry, call the handler and record the timing.
+        """
+        try:
+            message = parser(data)
+        except (IndexError, ValueError, TypeError):
+            entry["errors"] += 1
+            self.logger.warning("Malformed %s message on the %s link: %s", entry["name"], self.name, data)
+            return True
+        parsed = time.perf_counter()
+
+        entry["handler"](message)
+        handled = time.perf_counter()
+
+        entry["count"] += 1
+        entry["parse_time"] += parsed - start
+        entry["handle_time"] += handled - parsed
+        entry["histogram"][bisect.bisect_left(self.HISTOGRAM_BOUNDS, (handled - start) * 1e6)] += 1
+        return True
@@ -1,9 +1,18 @@
+import os
 import logging
 from functools import partial
+from itertools import chain
+import numpy as np
 from PyQt5 import QtCore, QtNetwork
 from Core.Astronomy import Astronomy
+from Core.Handlers.AstronomyJobPool import AstronomyJobPool
 from Core.Handlers import SimulationHandler
 from Core.Handlers import TLEHandler
+from Core.Handlers.MessageDispatcher import MessageDispatcher, MotorStatus, StepsFromHome, MaxStepsToDo, \
+    PositionUpdate, DishPosition
+from Core.Handlers.PositionPublisher import PositionPublisher
+from Core.Utilities.BinaryProtocol import MessageType
+from Core.Utilities.SendWindow import SendWindow
 
 
 class OpHandler(QtCore.QObject):
@@ -37,15 +46,27 @@ class OpHandler(QtCore.QObject):
         self.ui = ui  # User interface handling object
         self.cfg_data = cfg_data
         self.logger = logging.getLogger(__name__)  # Data logger object
-        self.astronomy = Astronomy.Calculations(cfg_data=cfg_data)  # Astronomy calculations object
         self.prev_pos = ["", ""]  # The dish position is saved for change comparison
         self.motors_enabled = False  # Keep the motor status
 
         self.max_steps_to_target_ra = 0
         self.max_steps_to_target_dec = 0
         self.sim_started = False
+        self.scan_workers = os.cpu_count() or 1  # Worker processes for the points of large scanning maps
+        self.scan_job = None  # Job calculating the scanning points still to be sent
+        self.scan_window = None  # Parts of the scanning map calculated and not yet sent
+        self.command_job = None  # Job calculating the latest motion command
 
         self.tle_operations = TLEHandler.TLEHandler(cfg_data)  # Create the TLE handling object
+        # Rate limited dish position for Stellarium and the GUI. As a child, it moves to the thread of the handler.
+        self.position_publisher = PositionPublisher(cfg_data.get_position_update_rate(), self)
+        cfg_data.subscribe(self.position_rate_changed, (("TCPStell", "update_rate"),))
+        self.client_dispatcher = MessageDispatcher("client")  # Messages received by the RPi client
+        self.server_dispatcher = MessageDispatcher("server")  # Messages received by the RPi server
+        self.register_messages()
+        self.astronomy = Astronomy.Calculations(cfg_data=cfg_data, tle_catalog=self.tle_operations.catalog)
+        # Astronomy calculations run on the global thread pool. As a child, the results arrive in this thread.
+        self.astronomy_jobs = AstronomyJobPool(parent=self)
 
         # Simulation thread operations
         self.sim_thread = QtCore.QThread()
@@ -84,35 +105,15 @@ class OpHandler(QtCore.QObject):
         """
         self.logger.info("Operations handler thread started")
         self.signal_connections()  # Make all the necessary signal connections
+        self.position_publisher.start()  # Start the timer in the thread of the handler
 
         autocon_stell = self.cfg_data.get_tcp_stell_auto_conn_status()  # See if auto-connection at startup is enabled
         autocon_rpi = self.cfg_data.get_tcp_client_auto_conn_status()  # Auto-connection preference for the RPi
         # server and client
 
-        # Try to get a new TLE, if the one we have is outdated
-        tle_expiry = self.tle_operations.tle_expiry_checker()  # Check the validity of the file
-
-        if (tle_expiry[0] is True and tle_expiry[1] is True) or (
-                tle_expiry[0] is False and tle_expiry[2] == "File not found"):
-            self.ui.tleStatusInfoSig.emit("")  # Just initialize the widget
-            tle_result = self.tle_operations.tle_retriever()  # Get the new TLE file
-
-            if tle_result[0] is True:
-                tle_status_msg = "Success^TLE file(s) updated"
-            else:
-                tle_status_msg = "Error^There was a problem getting TLE file(s).^"
-                tle_status_msg += tle_result[1]
-        elif tle_expiry[0] is False:
-            self.ui.tleStatusInfoSig.emit("")  # Just initialize the widget
-            tle_status_msg = "Error^There was a problem checking TLE file(s).^"
-            tle_status_msg += tle_expiry[2]
-        else:
-            tle_status_msg = ""
-
-        if tle_status_msg != "":
-            self.ui.tle_status_info_sig.emit(tle_status_msg)
-            while not self.ui.tle_info_msg_boxnfoMsgBox.clickedButton():
-                continue
+        # Try to get a new TLE, if the one we have is outdated. It runs in the background, so the connections do not
+        # wait for the network and the status is shown whenever it is available.
+        self.tle_operations.refresh_in_background()
 
         # If auto-connection is selected for thr TCP section, then do as requested
         if autocon_stell == "yes":
@@ -121,6 +122,16 @@ class OpHandler(QtCore.QObject):
             self.tcp_client_thread.start()  # Start the client thread, since auto start is enabled
             self.tcp_server_thread.start()  # Start the RPi server thread, since auto start is enabled
 
+    def position_rate_changed(self, changed=None):
+        """
+        Called by the settings, whenever the position update rate changes. The change can come from any thread, so the
+        new rate is sent with a signal, which the publisher handles in its own thread.
+
+        :param changed: The changed settings
+        :return: Nothing
+        """
+        self.position_publisher.rateChange.emit(self.cfg_data.get_position_update_rate())
+
     # Client connection button handling method
     def connect_button_client(self):
         if self.tcp_client_thread.isRunning() and (
@@ -173,6 +184,22 @@ class OpHandler(QtCore.QObject):
         self.tcp_client.sendData.emit("SEND_HOME_STEPS\n")  # Get the steps from home for each motor
         self.tcp_client.sendData.emit("REPORT_MOTOR_STATUS\n")  # Get the current status of the motors
 
+    def register_messages(self):
+        """
+        Register the messages of the RPi links with their parsers and handlers.
+
+        :return: Nothing
+        """
+        self.client_dispatcher.register("MOTORS", MotorStatus, [(1, str)], self.motor_status)
+        self.client_dispatcher.register("STEPS-FROM-HOME", StepsFromHome, [(1, int), (2, int)], self.steps_from_home)
+        self.client_dispatcher.register("MAX-STEPS-TO-DO", MaxStepsToDo, [(1, str), (2, int)], self.max_steps_to_do)
+
+        # TODO Remove the degree conversion for the RA, since MPU will send in degrees and not hours
+        self.server_dispatcher.register("POSUPDATE", PositionUpdate, [(2, float), (4, float)], self.position_update,
+                                        MessageType.POSITION_UPDATE)
+        self.server_dispatcher.register("DISHPOS", DishPosition, [(2, float), (4, float), (7, int), (9, int)],
+                                        self.dish_position, MessageType.DISH_POSITION)
+
     # Dta received from the client connected to the RPi server
     @QtCore.pyqtSlot(str, name='dataClientRX')
     def client_data_receive(self, data: str):
@@ -183,28 +210,28 @@ class OpHandler(QtCore.QObject):
         :param data: Data received from the client
         :return:
         """
-        if data == "MOTORS_ENABLED":
+        if not self.client_dispatcher.dispatch(data):
+            self.logger.debug("Data received from client (Connected to remote RPi server): %s", data)
+        self.ui.setGUIFromClientSig.emit(data)  # Send the command to the GUI as well
+
+    def motor_status(self, message: MotorStatus):
+        if message.status == "ENABLED":
             self.motors_enabled = True
-        elif data == "MOTORS_DISABLED":
+        elif message.status == "DISABLED":
             self.motors_enabled = False
-        else:
-            split_str = data.split("_")  # Try to split the string, and if it splits then a command is sent
-            if len(split_str) > 1:
-                if split_str[0] == "STEPS-FROM-HOME":
-                    self.cfg_data.set_home_steps(split_str[1], split_str[2])  # Set the current steps
-                    self.ui.setManContStepsSig.emit("RA", split_str[1])
-                    self.ui.setManContStepsSig.emit("DEC", split_str[2])
-                elif split_str[0] == "MAX-STEPS-TO-DO":
-                    if split_str[1] == "RA":
-                        self.max_steps_to_target_ra = int(split_str[2])
-                        self.max_steps_to_target_dec = 0
-                    elif split_str[1] == "DEC":
-                        self.max_steps_to_target_dec = int(split_str[2])
-                        self.max_steps_to_target_ra = 0
-            else:
-                self.logger.debug("Data received from client (Connected to remote RPi server): %s", data)
-        if isinstance(data, str):
-            self.ui.setGUIFromClientSig.emit(data)  # If it is not split yet, send the command
+
+    def steps_from_home(self, message: StepsFromHome):
+        self.cfg_data.set_home_steps(message.ra_steps, message.dec_steps)  # Set the current steps
+        self.ui.setManContStepsSig.emit("RA", str(message.ra_steps))
+        self.ui.setManContStepsSig.emit("DEC", str(message.dec_steps))
+
+    def max_steps_to_do(self, message: MaxStepsToDo):
+        if message.axis == "RA":
+            self.max_steps_to_target_ra = message.steps
+            self.max_steps_to_target_dec = 0
+        elif message.axis == "DEC":
+            self.max_steps_to_target_dec = message.steps
+            self.max_steps_to_target_ra = 0
 
     @QtCore.pyqtSlot(list, name='clientCommandSendStell')
     def stell_command_send(self, ra_dec: list):
@@ -217,19 +244,52 @@ class OpHandler(QtCore.QObject):
         if not self.motors_enabled:
             self.ui.motorsDisabledSig.emit()
         else:
-            home_steps = self.cfg_data.get_home_steps()  # Return a list with the steps way from home position
+            home_steps = (self.cfg_data.get_value("Steps", "ra_to_home"),  # Steps away from home position
+                          self.cfg_data.get_value("Steps", "dec_to_home"),)
             tr_time = int(self.ui.main_widget.transitTimeValue.text())
             if self.ui.main_widget.stellariumOperationSelect.currentText() == "Transit":
                 ra_degrees = ra_dec[0] * 15.0  # Stellarium returns right ascension is hours, so we convert to degrees
-                transit_coords = self.astronomy.transit(ra_degrees, ra_dec[1], -int(home_steps[0]), -int(home_steps[1]),
-                                                        tr_time)
-                command = "TRNST_RA_%.5f_DEC_%.5f\n" % (transit_coords[0], transit_coords[1])
-                self.tcp_client.sendData.emit(command)  # Send the transit command to the RPi
+                # Send the transit command to the RPi
+                self.send_calculated(self.astronomy.transit, ra_degrees, ra_dec[1], -home_steps[0],
+                                     -home_steps[1], tr_time,
+                                     command=lambda coords: (MessageType.TRANSIT, (coords[0], coords[1])))
             elif self.ui.main_widget.stellariumOperationSelect.currentText() == "Aim and track":
                 ra_degrees = ra_dec[0] * 15.0  # Stellarium returns right ascension is hours, so we convert to degrees
-                trk_coords = self.astronomy.transit(ra_degrees, ra_dec[1], -int(home_steps[0]), -int(home_steps[1]), 0)
-                command = "TRK_RA_%.5f_DEC_%.5f_RA-SPEEDD_%.5f_DEC-SPEED_%.5f\n" % (trk_coords[0], trk_coords[1], 0, 0)
-                self.tcp_client.sendData.emit(command)  # Send the tracking command to the RPi
+                # Send the tracking command to the RPi
+                self.send_calculated(self.astronomy.transit, ra_degrees, ra_dec[1], -home_steps[0],
+                                     -home_steps[1], 0,
+                                     command=lambda coords: "TRK_RA_%.5f_DEC_%.5f_RA-SPEEDD_%.5f_DEC-SPEED_%.5f\n" % (
+                                         coords[0], coords[1], 0, 0))
+
+    def send_calculated(self, function, *args, command=None):
+        """
+        Run an astronomy calculation on the job pool and send the command made from its result to the RPi. A new
+        command supersedes the previous one, if it is still being calculated.
+
+        :param function: The astronomy calculation
+        :param args: Arguments of the calculation
+        :param command: Makes the command from the result, either as a (message type, values) tuple or as text
+        :return: The job of the calculation
+        """
+        if self.command_job is not None:
+            self.command_job.cancel()  # Only the latest command is sent
+        self.command_job = self.astronomy_jobs.submit(function, *args,
+                                                      on_result=lambda result: self.send_command(command(result)))
+        return self.command_job
+
+    def send_command(self, command):
+        """
+        Send a command to the RPi.
+
+        :param command: Either a (message type, values) tuple, sent as a binary message, or a text command
+        :return: Nothing
+        """
+        if isinstance(command, tuple) and len(command) == 5:
+            self.tcp_client.sendCommandPart.emit(*command)  # Part of a long command, with its position and size
+        elif isinstance(command, tuple):
+            self.tcp_client.sendCommand.emit(*command)
+        elif command != "":
+            self.tcp_client.sendData.emit(command)
 
     # Received data from the server that the RPi is connected as a client. Signal is (dataRxFromServ)
     @QtCore.pyqtSlot(str, name='rpiServDataRx')
@@ -241,40 +301,61 @@ class OpHandler(QtCore.QObject):
         :param data: Data received from the TCP connection
         :return: Nothing
         """
-        # TODO Remove the degree conversion for the RA, since MPU will send in degrees and not hours
-        split_data = data.split("_")  # Split the string with the set delimiter
-        if split_data[0] == "POSUPDATE":
-            dec_degrees = split_data[4]  # Get the DEC from the received position
-            ra_degrees = self.astronomy.hour_angle_to_ra(float(split_data[2]) * 15.0, float(dec_degrees))
-            if not (self.prev_pos[0] == ra_degrees and self.prev_pos[1] == dec_degrees
-                    and split_data[0] != "POSUPDATE"):
-                # Send the position to Stellarium
-                self.tcp_stellarium.sendDataStell.emit(float(ra_degrees) / 15.0, float(dec_degrees))
-
-                # Send the updated values if they are different
-                self.posDataShow.emit(float(ra_degrees) / 15.0, float(dec_degrees))
-            self.prev_pos = [ra_degrees, dec_degrees]  # Save the values for later comparison
-        elif split_data[0] == "DISHPOS":
-            dec_degrees = split_data[4]  # Get the DEC from the received position
-            ra_degrees = self.astronomy.hour_angle_to_ra(float(split_data[2]) * 15.0, float(dec_degrees))
-            ra_steps = split_data[7]
-            dec_steps = split_data[9]
-            self.ui.setManContStepsSig.emit("RA", ra_steps)  # Update the manual control window
-            self.ui.setManContStepsSig.emit("DEC", dec_steps)
-            self.tcp_stellarium.sendDataStell.emit(float(ra_degrees) / 15.0, float(dec_degrees))
-            self.posDataShow.emit(float(ra_degrees) / 15.0, float(dec_degrees))
-
-            # Update the progress bar
-            if self.max_steps_to_target_ra != 0:
-                ratio = int(ra_steps) / self.max_steps_to_target_ra
-                self.ui.main_widget.onTargetProgress.setValue(ratio)
-            elif self.max_steps_to_target_dec != 0:
-                ratio = int(dec_steps) / self.max_steps_to_target_dec
-                self.ui.main_widget.onTargetProgress.setValue(ratio)
+        self.server_dispatcher.dispatch(data)
+
+    # Binary message received from the RPi client. Signal is (commandRxFromServ)
+    @QtCore.pyqtSlot(int, list, name='rpiServCommandRx')
+    def rpi_server_rx_command(self, msg_type: int, values: list):
+        """
+        Get a binary message sent from the RPi client. The values are already decoded, so no parsing is needed.
+
+        :param msg_type: The type of the message
+        :param values: The values of the message
+        :return: Nothing
+        """
+        if not self.server_dispatcher.dispatch_values(msg_type, values):
+            self.logger.warning("Unknown binary message type received from the RPi: %d", msg_type)
+
+    def position_update(self, message: PositionUpdate):
+        """
+        Show the dish position and send it to Stellarium.
+
+        :param message: The position of the dish, with the hour angle in hours
+        :return: Nothing
+        """
+        ra_degrees = self.astronomy.hour_angle_to_ra(message.hour_angle * 15.0, message.declination)
+        self.position_publisher.update(float(ra_degrees) / 15.0, message.declination)  # Sent on the next tick
+        self.prev_pos = [ra_degrees, message.declination]  # Save the values for later comparison
+
+    def dish_position(self, message: DishPosition):
+        """
+        Show the dish position while it moves to a target, together with the motor steps and the progress.
+
+        :param message: The position of the dish, with the hour angle in hours, and the steps of the motors
+        :return: Nothing
+        """
+        ra_degrees = self.astronomy.hour_angle_to_ra(message.hour_angle * 15.0, message.declination)
+        self.ui.setManContStepsSig.emit("RA", str(message.ra_steps))  # Update the manual control window
+        self.ui.setManContStepsSig.emit("DEC", str(message.dec_steps))
+
+        # Update the progress bar
+        ratio = None
+        if self.max_steps_to_target_ra != 0:
+            ratio = message.ra_steps / self.max_steps_to_target_ra
+            self.ui.main_widget.onTargetProgress.setValue(ratio)
+        elif self.max_steps_to_target_dec != 0:
+            ratio = message.dec_steps / self.max_steps_to_target_dec
+            self.ui.main_widget.onTargetProgress.setValue(ratio)
+
+        if ratio is not None and ratio >= 1.0:
+            self.position_publisher.publish_now(float(ra_degrees) / 15.0, message.declination)  # Arrived at the target
+        else:
+            self.position_publisher.update(float(ra_degrees) / 15.0, message.declination)  # Sent on the next tick
 
     # Command to stop any motion of the radio telescope dish
     @QtCore.pyqtSlot(name='stopRadioTele')
     def stop_moving_telescope(self):
+        self.cancel_scan()  # Stop sending the rest of the scanning map
         # TODO change the command to the appropriate one
         self.tcp_client.sendData.emit("STOP\n")  # Send the request to stop moving to the RPi server
         self.logger.warning("A dish motion halt was requested")
@@ -469,8 +550,9 @@ class OpHandler(QtCore.QObject):
     def save_location_settings(self):
         coords = [self.ui.location_widget.latEntry.text(), self.ui.location_widget.lonEntry.text()]
         altitude = self.ui.location_widget.altEntry.text()
-        self.cfg_data.set_lat_lon(coords)
-        self.cfg_data.set_altitude(altitude)
+        with self.cfg_data.changes():  # The astronomy context is updated once, with the whole location
+            self.cfg_data.set_lat_lon(coords)
+            self.cfg_data.set_altitude(altitude)
 
         if self.ui.location_widget.locationTypeChoose.currentText() == "Google Maps":
             self.cfg_data.set_maps_selection("yes")
@@ -495,23 +577,25 @@ class OpHandler(QtCore.QObject):
         if not self.motors_enabled:
             self.ui.motorsDisabledSig.emit()
         else:
-            home_steps = self.cfg_data.get_home_steps()
+            home_steps = (self.cfg_data.get_value("Steps", "ra_to_home"),  # Steps away from home position
+                          self.cfg_data.get_value("Steps", "dec_to_home"),)
             if self.ui.plan_obj_win.planObjectTransitGroupBox.isChecked():
                 objec = self.ui.plan_obj_win.objectSelectionComboBox.currentText()
                 tr_time = self.ui.plan_obj_win.transitTimeBox.value()
-                transit_coords = self.astronomy.transit_planetary(objec, -int(home_steps[0]), -int(home_steps[1]),
-                                                                  int(tr_time))
 
-                command = "TRNST_RA_%.5f_DEC_%.5f\n" % (transit_coords[0], transit_coords[1])
-                self.tcp_client.sendData.emit(command)  # Send the transit command to the RPi
+                # Send the transit command to the RPi
+                self.send_calculated(self.astronomy.transit_planetary, objec, -home_steps[0],
+                                     -home_steps[1], int(tr_time),
+                                     command=lambda coords: (MessageType.TRANSIT, (coords[0], coords[1])))
             elif self.ui.plan_obj_win.planObjectTrackingGroupBox.isChecked():
                 objec = self.ui.plan_obj_win.objectSelectionComboBox.currentText()
                 track_time = self.ui.plan_obj_win.trackingtTimeBox.value()
-                tracking_info = self.astronomy.tracking_planetary(objec, -int(home_steps[0]), -int(home_steps[1]))
 
-                command = "TRK_RA_%.5f_DEC_%.5f_RA-SPEED_%.5f_DEC-SPEED_%.5f_TIME_%.2f\n" \
-                          % (tracking_info[0], tracking_info[1], tracking_info[2], tracking_info[3], track_time)
-                self.tcp_client.sendData.emit(command)  # Send the tracking command to the RPi
+                # Send the tracking command to the RPi
+                self.send_calculated(self.astronomy.tracking_planetary, objec, -home_steps[0],
+                                     -home_steps[1],
+                                     command=lambda info: (MessageType.TRACK, (info[0], info[1], info[2], info[3],
+                                                                               track_time)))
 
     def coordinate_formatter(self, num: float, degree: bool):
         if degree:
@@ -548,8 +632,8 @@ class OpHandler(QtCore.QObject):
             point_4 = (float(point_4[0]), float(point_4[1]),)
 
             points = (point_1, point_2, point_3, point_4, coord_system, epoch,)
-            map_points = self.astronomy.scanning_map_generator(points, step_size, direction)
-            num_of_points = len(map_points[0])  # Number of points to be scanned
+            scan_map = self.astronomy.scanning_map(points, step_size, direction)
+            num_of_points = scan_map.size  # Number of points to be scanned
 
             if self.ui.sky_scan_win.integrationEnabler.isChecked():
                 total_int_time = num_of_points * self.ui.sky_scan_win.integrationTimeEntry.value() * 60.0
@@ -559,20 +643,20 @@ class OpHandler(QtCore.QObject):
             if self.ui.sky_scan_win.simulateScanningChk.isChecked():
                 sim_speed = self.ui.sky_scan_win.simSpeedValue.value()
                 self.sim_handler.simStopSig.emit()  # First stop any ongoing simulation
-                self.sim_handler.simStartSig.emit(map_points[0], sim_speed)  # Then send the new points
+                self.sim_handler.simStartSig.emit(scan_map.to_tuples()[0], sim_speed)  # Then send the new points
 
-            return map_points[0]
+            return scan_map.map_points
         self.ui.sky_scan_win.pointOperationTabs.setCurrentIndex(0)
 
-        return ()
+        return None
 
     def sky_scan_start(self):
         # TODO Add a perform calculation warning to the user
         if not self.motors_enabled:  # TODO Set the condition to the correct one
             map_points = self.calc_scan_points()  # Get the mapping points
-            if map_points is not ():
-                home_steps = self.cfg_data.get_home_steps()
-                init_steps = (int(home_steps[0]), int(home_steps[1]),)
+            if map_points is not None:
+                init_steps = (self.cfg_data.get_value("Steps", "ra_to_home"),
+                              self.cfg_data.get_value("Steps", "dec_to_home"),)
 
                 step_x = self.ui.sky_scan_win.stepSizeBoxCoord1.value()
                 step_y = self.ui.sky_scan_win.stepSizeBoxCoord2.value()
@@ -588,26 +672,73 @@ class OpHandler(QtCore.QObject):
                 else:
                     objec = None
 
-                calc_points = self.astronomy.scanning_point_calculator(map_points, init_steps, step_size, int_time,
-                                                                       objec)
-                self.tcp_client.sendData.emit("SKY-SCAN_RA_%f_DEC_%f_RA-SPEED_%f_DEC-SPEED_%f_INT-TIME_%.2f"
-                                              % (float(calc_points[0].split("_")[0]),
-                                                 float(calc_points[0].split("_")[2]), float(calc_points[1][0]),
-                                                 float(calc_points[1][1]), int_time))
-                self.tcp_client.sendData.emit("SKY-SCAN-MAP_%s" % calc_points[0])
-                print(calc_points[0])  # TODO Remove the print statement
+                self.cancel_scan()  # A new scan replaces any scan still being sent
+                self.scan_window = SendWindow()
+                # The points are calculated on the job pool, and each message is sent as soon as it is ready
+                self.scan_job = self.astronomy_jobs.submit_stream(self.scan_commands, map_points, init_steps,
+                                                                  step_size, int_time, objec,
+                                                                  self.tcp_client.scan_streaming, self.scan_window,
+                                                                  on_item=self.send_command)
         else:
             self.ui.motorsDisabledSig.emit()
 
+    def scan_commands(self, map_points, init_steps: tuple, step_size: tuple, int_time: float, objec,
+                      streaming: bool, window: SendWindow):
+        """
+        Generator of the scanning commands, run on the astronomy job pool. With streaming, the first point is sent
+        right away, so that the dish starts moving, and the rest in batches. Without it, the batches are sent as parts
+        of the single map command of the old RPi software.
+
+        Each batch waits for a place in the send window, which the client gives back once the batch is sent, so the
+        points are calculated only as fast as they are sent and just a few batches are in memory at any time.
+
+        :param map_points: The points of the scanning map
+        :param init_steps: Initial steps from home in RA and DEC axis
+        :param step_size: Step size in each axis
+        :param int_time: Integration time
+        :param objec: Planetary object, or None
+        :param streaming: The RPi accepted the streaming of the scanning map, as read when the scan was started
+        :param window: The send window of the scan, closed when the scan is cancelled
+        :return: (message type, values) tuples and (message type, values, position, total values, window) parts
+        """
+        first_point, rates, chunks = self.astronomy.scanning_point_stream(map_points, init_steps, step_size,
+                                                                          int_time, objec, workers=self.scan_workers)
+        yield MessageType.SKY_SCAN, (first_point[0], first_point[1], float(rates[0]), float(rates[1]), int_time)
+
+        total = 2 * len(map_points)  # Values of the whole map
+        position = 0
+        for part in chain([np.reshape(first_point, (1, 2))], chunks):
+            if not window.acquire():
+                return  # The scan was cancelled
+            if streaming:
+                yield MessageType.SKY_SCAN_MAP_PART, part, 0, part.size, window  # Each part is a command of its own
+            else:
+                yield MessageType.SKY_SCAN_MAP, part, position, total, window
+            position += part.size
+        if streaming:
+            yield MessageType.SKY_SCAN_MAP_END, ()  # Tell the RPi that the map is complete
+
+    def cancel_scan(self):
+        """
+        Stop calculating and sending the scanning points, if a scan is still being sent.
+
+        :return: Nothing
+        """
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+            self.scan_job = None
+            self.scan_window.close()  # Wake up the job, if it waits for a place to send the next part
+
     def calibration_reposition(self):
         if self.motors_enabled:
             system = self.ui.calib_win.coordinatSystemcomboBox.currentText()
-            home_steps = self.cfg_data.get_home_steps()  # Return a list with the steps way from home position
+            home_steps = (self.cfg_data.get_value("Steps", "ra_to_home"),  # Steps away from home position
+                          self.cfg_data.get_value("Steps", "dec_to_home"),)
             if system == "Satellite" and self.ui.calib_win.calibCoord_1_Label.text() != "Satellite...":
                 coords = self.astronomy.geo_sat_position(self.ui.sat_sel_diag.satSelectionList.currentItem().text())
                 coord_1 = coords[1][0]  # Get the HA
                 coord_2 = coords[1][1]  # Get the DEC
-                command = "TRNST_RA_%.5f_DEC_%.5f\n" % (coord_1, coord_2)
+                command = (MessageType.TRANSIT, (coord_1, coord_2))
             elif system == "Motor steps":
                 try:
                     coord_1 = int(self.ui.calib_win.calibCoord_1_Text.text())
@@ -623,13 +754,14 @@ class OpHandler(QtCore.QObject):
                     sys_date_tuple = (system, "Now",)
 
                     final_coords = self.astronomy.coordinate_transform(coord_tuple, sys_date_tuple)
-                    transit_coords = self.astronomy.transit(final_coords[0], final_coords[1], -int(home_steps[0]),
-                                                            -int(home_steps[1]), 0)
-                    command = "TRNST_RA_%.5f_DEC_%.5f\n" % (transit_coords[0], transit_coords[1])
+                    # Send the transit command to set the calibration position, once it is calculated
+                    self.send_calculated(self.astronomy.transit, final_coords[0], final_coords[1],
+                                         -home_steps[0], -home_steps[1], 0,
+                                         command=lambda coords: (MessageType.TRANSIT, (coords[0], coords[1])))
+                    command = ""
                 except ValueError:
                     command = ""
-            if command != "":
-                self.tcp_client.sendData.emit(command)  # Send the transit command to set the calibration position
+            self.send_command(command)  # Send the satellite transit or the motor steps command
         else:
             self.ui.motorsDisabledSig.emit()
 
@@ -643,6 +775,7 @@ class OpHandler(QtCore.QObject):
 
     def save_tle_settings(self):
         self.cfg_data.set_tle_url(self.ui.tle_settings_widget.tleURL.text())
+        self.tle_operations.catalog.set_files(self.tle_operations.tle_files())  # Index the files of the new URLs
         self.cfg_data.set_tle_auto_update(self.ui.tle_settings_widget.autoUpdateSelection.isChecked())
         self.cfg_data.set_tle_update_interval(self.ui.tle_settings_widget.intervalValue.value())
 
@@ -660,15 +793,7 @@ class OpHandler(QtCore.QObject):
             self.save_tle_settings()
 
     def get_tle(self):
-        self.ui.tleStatusInfoSig.emit("")  # Just initialize the widget
-        tle_result = self.tle_operations.tle_retriever()  # Get the new TLE file
-
-        if tle_result[0] is True:
-            tle_status_msg = "Success^TLE file(s) updated"
-        else:
-            tle_status_msg = "Error^There was a problem getting TLE file(s).^"
-            tle_status_msg += tle_result[1]
-        self.ui.tleStatusInfoSig.emit(tle_status_msg)
+        self.tle_operations.refresh_in_background(force=True)  # Get the new TLE file, without blocking the thread
 
     # Make all the necessary signal connections
     def signal_connections(self):
@@ -683,11 +808,15 @@ class OpHandler(QtCore.QObject):
         self.tcp_client.newConInitComms.connect(self.initial_commands)
 
         self.tcp_server.dataRxFromServ.connect(self.rpi_server_rx_data)  # Receive data from the RPi server
+        self.tcp_server.commandRxFromServ.connect(self.rpi_server_rx_command)  # Binary messages from the RPi server
         self.tcp_server.clientNotice.connect(self.tcp_client.connect_client)  # Tell the client to reconnect
 
         self.ui.stopMovingRTSig.connect(self.stop_moving_telescope)  # Send a motion stop command
         self.ui.main_widget.stellPosUpdtBtn.clicked.connect(partial(self.tcp_client.sendData.emit, "SEND_POS_UPDATE\n"))
         self.posDataShow.connect(self.ui.pos_data_show)  # Show the dish position data, when available
+        # Send the dish position to Stellarium and show it, at the rate of the publisher
+        self.position_publisher.positionReady.connect(self.tcp_stellarium.sendDataStell)
+        self.position_publisher.positionReady.connect(self.posDataShow)
 
         self.ui.tcp_widget.conTestBtn.clicked.connect(self.test_conn_button)
 
@@ -724,6 +853,7 @@ class OpHandler(QtCore.QObject):
         self.ui.saveSettingsSig.connect(self.settings_saver)
         self.ui.tle_settings_widget.buttonBox.accepted.connect(partial(self.ui.saveWaringSig.emit, "TLE"))
         self.ui.main_widget.actionTLE_Settings.triggered.connect(self.show_tle_info)
+        self.tle_operations.tleStatusSig.connect(self.ui.tleStatusInfoSig)  # Show the status of the TLE refresh
         self.ui.tle_settings_widget.tleDownloadButton.clicked.connect(self.get_tle)  # Retrieve the TLE upon user
         # request
 
@@ -738,6 +868,8 @@ class OpHandler(QtCore.QObject):
 
         :return: Nothing
         """
+        self.position_publisher.stop()  # Stop the timer and send the last position, before the links are closed
+
         self.tcp_client_thread.quit()
         self.tcp_client_thread.wait()
         self.tcp_client.deleteLater()
@@ -761,3 +893,11 @@ class OpHandler(QtCore.QObject):
         self.sim_handler.deleteLater()
         self.sim_thread.deleteLater()
         self.logger.debug("Simulation handler thread is closed.")
+
+        self.logger.debug("RPi client message statistics: %s", self.client_dispatcher.statistics())
+        self.logger.debug("RPi server message statistics: %s", self.server_dispatcher.statistics())
+        self.logger.debug("Precession cache statistics: %s", self.astronomy.context.precession.statistics())
+        self.astronomy_jobs.cancel_all()  # Nothing more is sent, since the client thread is closed
+        self.logger.debug("Astronomy job statistics: %s", self.astronomy_jobs.statistics)
+        self.cfg_data.flush()  # Write the settings changed since the last delayed write
+        self.logger.debug("Settings statistics: %s", self.cfg_data.statistics)
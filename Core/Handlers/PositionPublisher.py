@@ -0,0 +1,94 @@
+import logging
+from PyQt5 import QtCore
+
+
+class PositionPublisher(QtCore.QObject):
+    """
+    Rate limited publisher of the dish position. Only the latest of the received positions is kept, and it is
+    published on each tick of a timer, so a fast reporting dish does not flood Stellarium and the GUI. Positions which
+    must be shown at once, like the final position of a motion, bypass the limit.
+
+    The rate can be changed from any thread through the `rateChange` signal, which is delivered in the thread of the
+    publisher, where its timer lives.
+    """
+    positionReady = QtCore.pyqtSignal(float, float, name='positionReady')  # RA in hours and DEC in degrees
+    rateChange = QtCore.pyqtSignal(float, name='positionRateChange')  # New maximum publications per second
+
+    def __init__(self, rate=10.0, parent=None):
+        """
+        Args:
+            rate (float): Maximum publications per second. Zero or less publishes each position at once.
+            parent: Parent object, so the publisher moves to the thread of its parent
+        """
+        super(PositionPublisher, self).__init__(parent)
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.rate = rate
+        self.pending = None  # Latest position not yet published
+        self.statistics = {"received": 0, "published": 0, "bypassed": 0}
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.flush)
+        self.rateChange.connect(self.set_rate)
+
+    def start(self):
+        """
+        Start publishing. Must be called from the thread of the publisher.
+        """
+        self.set_rate(self.rate)
+
+    def stop(self):
+        """
+        Stop the timer, after publishing any pending position.
+        """
+        self.timer.stop()
+        self.flush()
+        self.logger.debug("Position publisher statistics: %s", self.statistics)
+
+    @QtCore.pyqtSlot(float, name='positionRateChange')
+    def set_rate(self, rate: float):
+        """
+        Change the maximum publications per second. Must be called from the thread of the publisher.
+
+        Args:
+            rate (float): Maximum publications per second. Zero or less publishes each position at once.
+        """
+        self.rate = rate
+        if rate > 0:
+            self.timer.start(max(1, int(1000.0 / rate)))
+        else:
+            self.timer.stop()
+            self.flush()
+
+    def update(self, object_ra: float, object_dec: float):
+        """
+        Keep a new position, to be published on the next tick.
+
+        Args:
+            object_ra (float): Right ascension in hours
+            object_dec (float): Declination in degrees
+        """
+        self.statistics["received"] += 1
+        self.pending = (object_ra, object_dec)
+        if not self.timer.isActive():
+            self.flush()  # No rate limit
+
+    def publish_now(self, object_ra: float, object_dec: float):
+        """
+        Publish a position at once. Any older pending position is dropped.
+
+        Args:
+            object_ra (float): Right ascension in hours
+            object_dec (float): Declination in degrees
+        """
+        self.statistics["received"] += 1
+        self.statistics["bypassed"] += 1
+        self.pending = (object_ra, object_dec)
+        self.flush()
+
+    def flush(self):
+        """
+        Publish the pending position, if there is one.
+        """
+        if self.pending is not None:
+            position, self.pending = self.pending, None
+            self.statistics["published"] += 1
+            self.positionReady.emit(*position)
@@ -0,0 +1,176 @@
+import os
+import logging
+import threading
+from collections import namedtuple
+
+
+# Two line elements of a satellite. The name is as written in the file, without the trailing spaces.
+TLEEntry = namedtuple("TLEEntry", ["name", "norad_id", "line1", "line2"])
+
+
+class TLECatalog:
+    """
+    In memory index of the TLE files. The files are parsed once and the satellites are stored by their NORAD ID, with
+    the names as a secondary index, so each lookup is a dictionary access. Satellites sharing a name are all kept, and
+    the name lookup returns the last one. A satellite found in more than one file is taken from the last file. The
+    files are parsed again only when the modification time or the size of any of them changes.
+    """
+    def __init__(self, file_paths=None):
+        """
+        Args:
+            file_paths: Paths of the TLE files, or the path of a single file. They do not need to exist yet.
+        """
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.file_paths = self._path_list(file_paths)
+        self._by_id = {}  # All the entries, by NORAD ID
+        self._by_name = {}  # NORAD ID of the entries, by upper case name
+        self._stamp = None  # Modification time and size of each file, when they were parsed
+        self._lock = threading.Lock()
+
+    def set_files(self, file_paths):
+        """
+        Change the indexed files, for example when the TLE URLs change. The new files are parsed on the next lookup.
+
+        Args:
+            file_paths: Paths of the TLE files, or the path of a single file
+        """
+        file_paths = self._path_list(file_paths)
+        with self._lock:
+            if file_paths != self.file_paths:
+                self.file_paths = file_paths
+                self._by_id, self._by_name, self._stamp = {}, {}, None
+
+    def reload(self):
+        """
+        Parse the file again, even if it has not changed. Called after a new file is downloaded.
+
+        Returns:
+            int: The number of satellites in the catalog
+        """
+        with self._lock:
+            self._by_id, self._by_name, self._stamp = {}, {}, None
+            self._refresh()
+            return len(self._by_id)
+
+    def get(self, satellite):
+        """
+        Find a satellite by its name or its NORAD ID. Names are not case sensitive.
+
+        Args:
+            satellite: The name of the satellite, or its NORAD ID as an integer or a string
+
+        Returns:
+            TLEEntry: The two line elements of the satellite
+
+        Raises:
+            KeyError: If the satellite is not in the catalog
+        """
+        with self._lock:
+            self._refresh()
+            norad_id = self._by_name.get(str(satellite).strip().upper())
+            if norad_id is None and str(satellite).strip().isdigit():
+                norad_id = int(satellite)
+            entry = self._by_id.get(norad_id)
+            if entry is None:
+                raise KeyError("Satellite %s not found in %s" % (satellite, ", ".join(self.file_paths)))
+            return entry
+
+    def names(self):
+        """
+        Returns:
+            list: The names of all the satellites in the catalog, in the order of the files
+        """
+        with self._lock:
+            self._refresh()
+            return [entry.name for entry in self._by_id.values()]
+
+    def entries(self):
+        """
+        Returns:
+            list: All the `TLEEntry` objects of the catalog, in the order of the files
+        """
+        with self._lock:
+            self._refresh()
+            return list(self._by_id.values())
+
+    def __contains__(self, satellite):
+        try:
+            self.get(satellite)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._by_id)
+
+    @staticmethod
+    def _path_list(file_paths):
+        if file_paths is None:
+            return []
+        return [file_paths] if isinstance(file_paths, str) else list(file_paths)
+
+    def _refresh(self):
+        """
+        Parse the files if any of them changed since the last time. The caller is responsible for holding the lock.
+        """
+        stamp = []
+        for file_path in self.file_paths:
+            try:
+                stat = os.stat(file_path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)  # A missing file adds no satellites
+        stamp = tuple(stamp)
+
+        if stamp == self._stamp:
+            return
+        self._by_id, self._by_name = self._parse([file_path for file_path, file_stamp in zip(self.file_paths, stamp)
+                                                  if file_stamp is not None])
+        self._stamp = stamp
+
+    def _parse(self, file_paths: list):
+        """
+        Parse the TLE files, with or without a name line before each pair of element lines.
+
+        Returns:
+            tuple: The entries by NORAD ID, and their NORAD IDs by upper case name
+        """
+        by_id = {}
+        for file_path in file_paths:
+            with open(file_path, "r", errors="replace") as tle_file:
+                entries = self.parse_lines(tle_file)
+            by_id.update((entry.norad_id, entry) for entry in entries)
+            self.logger.debug("Parsed %d satellites from %s", len(entries), file_path)
+
+        by_name = {entry.name.upper(): entry.norad_id for entry in by_id.values()}
+        return by_id, by_name
+
+    def parse_lines(self, lines):
+        """
+        Parse the lines of a TLE file.
+
+        Returns:
+            list: The `TLEEntry` objects, in the order of the lines
+        """
+        lines = [line.rstrip() for line in lines if line.strip()]
+        entries = []
+        name = None
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if line.startswith("1 ") and i + 1 < len(lines) and lines[i + 1].startswith("2 "):
+                try:
+                    norad_id = int(line[2:7])
+                except ValueError:
+                    self.logger.warning("Invalid TLE line: %s", line)
+                    i += 2
+                    continue
+                entries.append(TLEEntry(name if name is not None else str(norad_id), norad_id, line, lines[i + 1]))
+                name = None
+                i += 2
+            else:
+                name = line[2:].strip() if line.startswith("0 ") else line.strip()  # Name line of a 3LE file
+                i += 1
+        return entries
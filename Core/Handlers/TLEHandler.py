@@ -1,24 +1,66 @@
 import logging
 import time
 import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import urllib3
 import certifi
 from PyQt5 import QtCore
+from Core.Handlers.TLECatalog import TLECatalog
+from Core.Handlers.TLERefreshTask import TLERefreshTask
 
 
 class TLEHandler(QtCore.QObject):
+    tleStatusSig = QtCore.pyqtSignal(str, name='tleRefreshStatusSignal')  # Status of a background refresh
+
     def __init__(self, cfg_data, parent=None):
         super(TLEHandler, self).__init__(parent)
         self.logger = logging.getLogger(__name__)  # Create the logger for the file
         self.cfg_data = cfg_data
+        self.catalog = TLECatalog(self.tle_files())  # Index of the satellites in the saved files
+        # Connections are kept alive and reused by all the downloads
+        self.http = urllib3.PoolManager(num_pools=4, maxsize=4, cert_reqs='CERT_REQUIRED', ca_certs=certifi.where(),
+                                        timeout=urllib3.Timeout(connect=10.0, read=30.0), retries=urllib3.Retry(2))
+        self._refreshing = threading.Lock()  # Held while a refresh is running
+
+    def tle_urls(self):
+        """
+        Get the TLE URLs from the settings. More than one URL can be given, separated by spaces.
+
+        Returns:
+            list: The URLs, in the order their files are indexed
+        """
+        return self.cfg_data.get_tle_url().split()
+
+    def tle_file(self, url: str):
+        """
+        Get the path of a saved TLE file, which is named after the file of its URL.
+
+        Args:
+            url (str): URL of the file
+
+        Returns:
+            str: Absolute path of the TLE file
+        """
+        return os.path.abspath("TLE/" + url.split("/")[-1])  # Directory for the saved file
+
+    def tle_files(self):
+        """
+        Returns:
+            list: Absolute paths of the saved files of all the TLE URLs of the settings
+        """
+        return [self.tle_file(url) for url in self.tle_urls()]
 
     def tle_expiry_checker(self):
         expiration = False  # Set the variable initially
         try:
-            url = self.cfg_data.get_tle_url()  # Get the URL from the settings file
-            file_dir = os.path.abspath("TLE/" + url.split("/")[-1])  # Directory for the saved file
+            files = self.tle_files()  # Saved files of all the URLs
+            if not files:
+                raise FileNotFoundError("No TLE URL is set")
 
-            tle_mod_date = os.path.getmtime(file_dir)  # Get the last modified time in seconds
+            tle_mod_date = min(os.path.getmtime(file_dir) for file_dir in files)  # The oldest file expires first
             cur_time = time.time()  # Get the current time in seconds
             delta_time = int((cur_time - tle_mod_date) / 86400)  # Get the time passed since last modification in days
 
@@ -38,24 +80,142 @@ class TLEHandler(QtCore.QObject):
 
         return [exit_code, expiration, error_details]
 
-    def tle_retriever(self):
-        # TODO improve the function
-        # TODO Add exception handling code in case of empty URL string
-        url = self.cfg_data.get_tle_url()  # Get the URL from the settings file
-        file_dir = os.path.abspath("TLE/" + url.split("/")[-1])  # Directory for the saved file
-        http = urllib3.PoolManager(cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())  # Create the HTTP pool manager
+    def refresh_in_background(self, force=False):
+        """
+        Start a refresh of the TLE files on the global thread pool and return immediately. The status of the refresh
+        is emitted with `tleStatusSig`, in the format of the TLE status indicator of the GUI.
+
+        Args:
+            force (bool): Download the files even if they have not expired
+
+        Returns:
+            bool: False if a refresh is already running
+        """
+        if self._refreshing.locked():
+            return False
+        QtCore.QThreadPool.globalInstance().start(TLERefreshTask(self, force))
+        return True
+
+    def refresh(self, force=False):
+        """
+        Check the expiry of the TLE files and download them if needed. An empty status is emitted before a download,
+        and the result after it.
+
+        Args:
+            force (bool): Download the files even if they have not expired
+
+        Returns:
+            str: The status message, empty if nothing had to be done
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return ""  # Another refresh is running
 
         try:
-            tle = http.request('GET', url)  # Try to retrieve the file
+            tle_expiry = [True, True, ""] if force else self.tle_expiry_checker()  # Check the validity of the file
 
-            with open(file_dir, 'wb') as tle_file:
-                tle_file.write(tle.data)  # Save the TLE file contents
-                tle_file.close()
-            error_details = ""
-            exit_code = True
+            if (tle_expiry[0] is True and tle_expiry[1] is True) or (
+                    tle_expiry[0] is False and tle_expiry[2] == "File not found"):
+                self.tleStatusSig.emit("")  # Just initialize the widget
+                tle_result = self.tle_retriever()  # Get the new TLE file
+
+                if tle_result[0] is True:
+                    tle_status_msg = "Success^TLE file(s) updated"
+                else:
+                    tle_status_msg = "Error^There was a problem getting TLE file(s).^"
+                    tle_status_msg += tle_result[1]
+            elif tle_expiry[0] is False:
+                self.tleStatusSig.emit("")  # Just initialize the widget
+                tle_status_msg = "Error^There was a problem checking TLE file(s).^"
+                tle_status_msg += tle_expiry[2]
+            else:
+                tle_status_msg = ""
+
+            if tle_status_msg != "":
+                self.tleStatusSig.emit(tle_status_msg)
+            return tle_status_msg
+        finally:
+            self._refreshing.release()
+
+    def tle_retriever(self, urls=None):
+        """
+        Download the TLE files of the settings. The files are fetched concurrently and each one is downloaded only if
+        it changed on the server since the last download.
+
+        Args:
+            urls (list): URLs to download. Default is the URLs of the settings.
+
+        Returns:
+            list: The exit code and the details of the errors
+        """
+        urls = self.tle_urls() if urls is None else urls
+        if not urls:
+            return [False, "No TLE URL is set"]
+
+        with ThreadPoolExecutor(max_workers=min(len(urls), 4)) as executor:
+            results = list(executor.map(self.download, urls, [self.tle_file(url) for url in urls]))
+
+        if any(result[0] and result[1] for result in results):
+            self.catalog.set_files(self.tle_files())
+            self.catalog.reload()  # Index the new files once, for all the following lookups
+        error_details = "\n".join(result[2] for result in results if not result[0])
+        return [not error_details, error_details]
+
+    def download(self, url: str, file_path: str):
+        """
+        Download a TLE file with a conditional request. The validators of the last download are kept next to the file,
+        so an unchanged file on the server is not transferred again. The body is streamed to a temporary file, which
+        replaces the saved file only after a complete download.
+
+        Args:
+            url (str): URL of the file
+            file_path (str): Path of the saved file
+
+        Returns:
+            list: The exit code, whether the file changed and the details of the error
+        """
+        meta_path = file_path + ".meta"  # Validators of the saved file
+        temp_path = None
+        try:
+            headers = {}
+            if os.path.exists(file_path):
+                try:
+                    with open(meta_path, "r") as meta_file:
+                        meta = json.load(meta_file)
+                    if meta.get("url") == url and meta.get("etag"):
+                        headers["If-None-Match"] = meta["etag"]
+                    if meta.get("url") == url and meta.get("last_modified"):
+                        headers["If-Modified-Since"] = meta["last_modified"]
+                except (OSError, ValueError):
+                    pass  # Without validators the whole file is downloaded
+
+            response = self.http.request('GET', url, headers=headers, preload_content=False)
+            try:
+                if response.status == 304:
+                    os.utime(file_path)  # The saved file is valid again for the expiry check
+                    self.logger.info("TLE file %s not modified", url)
+                    return [True, False, ""]
+                if response.status != 200:
+                    raise urllib3.exceptions.HTTPError("HTTP status %d for %s" % (response.status, url))
+
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".part")
+                with os.fdopen(temp_fd, 'wb') as tle_file:
+                    for chunk in response.stream(65536):
+                        tle_file.write(chunk)  # Save the TLE file contents
+                os.replace(temp_path, file_path)  # Atomic, so the catalog never reads a partial file
+                temp_path = None
+
+                meta = {"url": url, "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified")}
+                with open(meta_path, "w") as meta_file:
+                    json.dump(meta, meta_file)
+            finally:
+                response.release_conn()
+            self.logger.info("TLE file %s downloaded", url)
+            return [True, True, ""]
         except Exception as exception:
             self.logger.exception("Error occurred acquiring TLE file. See traceback.")
-            error_details = "%s" % exception
-            exit_code = False
-
-        return [exit_code, error_details]
+            return [False, False, "%s" % exception]
+        finally:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)  # Remove the partial download
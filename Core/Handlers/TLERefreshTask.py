@@ -0,0 +1,25 @@
+import logging
+from PyQt5 import QtCore
+
+
+class TLERefreshTask(QtCore.QRunnable):
+    """
+    Refresh of the TLE files on a thread of the global thread pool. The network access does not block the thread
+    which started it, and the result is reported through the status signal of the TLE handler.
+    """
+    def __init__(self, tle_handler, force=False):
+        """
+        Args:
+            tle_handler: The `TLEHandler` doing the refresh
+            force (bool): Download the files even if they have not expired
+        """
+        super(TLERefreshTask, self).__init__()
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.tle_handler = tle_handler
+        self.force = force
+
+    def run(self):
+        try:
+            self.tle_handler.refresh(self.force)
+        except Exception:
+            self.logger.exception("Error occurred refreshing the TLE files. See traceback.")
@@ -1,11 +1,14 @@
 import logging
 from PyQt5 import QtCore, QtNetwork
+from Core.Utilities.BinaryProtocol import FrameDecoder
+from Core.Utilities.OutboundQueue import OutboundQueue
 
 
 class RPiServerThread(QtCore.QObject):
     # Create the signals to be used for data handling
     conStatSigR = QtCore.pyqtSignal(str, name='conRPiStat')  # Raspberry pi connection indicator
     dataRxFromServ = QtCore.pyqtSignal(str, name='rpiServDataRx')  # Data received from the server of RPi
+    commandRxFromServ = QtCore.pyqtSignal(int, list, name='rpiServCommandRx')  # Binary message type and values
     reConnectSigR = QtCore.pyqtSignal(name='reConnectServer')  # A reconnection signal originating from a button press
     clientNotice = QtCore.pyqtSignal(name='clientNotice')  # Notify the client that we have a connection
     sendDataBack = QtCore.pyqtSignal(str, name='sendDtaBack')  # Send data to the RPi from the server
@@ -14,6 +17,15 @@ class RPiServerThread(QtCore.QObject):
         super(RPiServerThread, self).__init__(parent)  # Get the parent of the class
         self.cfg_data = cfg_data  # Create the configuration file object
         self.logger = logging.getLogger(__name__)  # Create the logger
+        self.decoder = FrameDecoder()  # Reassembles the text lines and the binary frames of the stream
+        self.read_settings()  # Keep the connection settings, which are updated when they change
+        cfg_data.subscribe(self.read_settings, (("TCPRPiServ", "host"), ("TCPRPiServ", "port"),
+                                                ("TCPRPiServ", "remote")))
+
+    def read_settings(self, changed=None):
+        # Called by the settings, whenever the address of the server changes
+        self.settings = (self.cfg_data.get_rpi_host(), self.cfg_data.get_value("TCPRPiServ", "port"),
+                         self.cfg_data.get_server_remote("TCPRPiServ"))
 
     # This method is called in every thread start and if the re-connect signal is fired
     def start(self):
@@ -21,16 +33,14 @@ class RPiServerThread(QtCore.QObject):
         mutex.lock()  # Lock the thread until it has started, to avoid any overlapping problems
         self.logger.info("Raspberry Pi connection server thread started")
         self.socket = None  # Create a variable to hold the socket
+        self.outbound = None  # Send queue of the socket
         self.reConnectSigR.connect(self.connect_server)
         self.connect_server()  # Start the server
         mutex.unlock()  # Unlock the thread, since it has started successfully
 
     @QtCore.pyqtSlot(name='reConnectServer')
     def connect_server(self):
-        # Get the saved data from the settings file
-        self.host = self.cfg_data.get_rpi_host()  # Get the TCP connection host
-        self.port = self.cfg_data.get_rpi_port()  # Get the TCP connection port
-        rem_stat = self.cfg_data.get_server_remote("TCPRPiServ")
+        self.host, self.port, rem_stat = self.settings  # Latest host, port and remote status of the settings
 
         if rem_stat == "no":
             self.host = QtNetwork.QHostAddress.LocalHost
@@ -46,7 +56,7 @@ class RPiServerThread(QtCore.QObject):
         self.tcp_server = QtNetwork.QTcpServer()  # Create a server object
         self.tcp_server.newConnection.connect(self._new_connection)  # Handler for a new connection
 
-        self.tcp_server.listen(self.host, int(self.port))  # Start listening for connections
+        self.tcp_server.listen(self.host, self.port)  # Start listening for connections
         self.conStatSigR.emit("Waiting")  # Indicate that the server is listening on the GUI
         self.logger.debug("RPI server connection initializer called")
 
@@ -57,6 +67,8 @@ class RPiServerThread(QtCore.QObject):
 
             if self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState:
                 self.tcp_server.close()  # Stop listening for other connections
+                self.decoder.reset()  # Drop any partial message of the previous connection
+                self.outbound = OutboundQueue(self.socket)  # Non blocking sending to the RPi
                 self.conStatSigR.emit("Connected")  # Indicate that the server has a connection on the GUI
                 self.clientNotice.emit()  # Tell the client that we are connected, so to attempt a connection
                 self.sendDataBack.connect(self.send_rpi)  # Connect the data sending signal
@@ -68,10 +80,13 @@ class RPiServerThread(QtCore.QObject):
     # Should we have data pending to be received, this method is called
     def _receive(self):
         try:
-            while self.socket.bytesAvailable() > 0:  # Read all data in que
-                received_data = self.socket.readLine().data().decode('utf-8').rstrip('\n')  # Get the data as a string
-                self.dataRxFromServ.emit(received_data)  # Send a signal to indicate that the server received some data
-                self.logger.debug("RPi server received: %s", received_data)
+            # Incomplete messages are kept in the decoder, until the rest of their bytes arrive
+            for received_data in self.decoder.feed(self.socket.readAll().data()):
+                if isinstance(received_data, str):
+                    self.dataRxFromServ.emit(received_data)  # Send a signal to indicate that the server received data
+                    self.logger.debug("RPi server received: %s", received_data)
+                else:
+                    self.commandRxFromServ.emit(*received_data)  # Binary message, already decoded
         except Exception:
             # If data is sent fast, then an exception will occur
             self.logger.exception("Some problem occurred while receiving server data. See traceback")
@@ -82,7 +97,9 @@ class RPiServerThread(QtCore.QObject):
         self.conStatSigR.emit("Waiting")  # Indicate that the server does not have a connection on the GUI
         self.socket.readyRead.disconnect()  # Disconnect the signal to avoid double firing
         self.sendDataBack.disconnect()  # Detach the signal to avoid any accidental firing
-        self.tcp_server.listen(self.host, int(self.port))  # Start listening again
+        self.outbound.clear()  # Nothing more can be sent on this connection
+        self.logger.debug("RPi server send queue statistics: %s", self.outbound.statistics)
+        self.tcp_server.listen(self.host, self.port)  # Start listening again
         self.logger.warning("The client disconnected from us")
 
     def _error(self):
@@ -92,8 +109,9 @@ class RPiServerThread(QtCore.QObject):
     @QtCore.pyqtSlot(str, name='sendDtaBack')
     def send_rpi(self, data: str):
         try:
-            self.socket.write(data.encode('utf-8'))  # Send data back to the client
-            self.socket.waitForBytesWritten()  # Wait for the data to be written
+            # Send data back to the client, without waiting. Commands are never dropped, so this is a safety net.
+            if not self.outbound.enqueue(data.encode('utf-8')):
+                self.logger.error("Command was not sent to the RPi, since the send queue is full: %s", data)
         except Exception:
             self.logger.exception("There was a problem sending the data. See traceback")
 
@@ -103,6 +121,8 @@ class RPiServerThread(QtCore.QObject):
             self.socket.disconnected.disconnect()  # Close the disconnect signal first to avoid firing
             if self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState:  # Check if socket is connected
                 self.sendDataBack.disconnect()  # Detach the signal to avoid any accidental firing
+                self.outbound.flush()  # Hand the queued data to the socket, before closing it
+                self.socket.flush()
             self.socket.close()  # Close the underlying TCP socket
         self.reConnectSigR.disconnect()  # Signal not used after thread exit (Reconnected at thread start)
         self.conStatSigR.emit("Disconnected")  # Indicate disconnection on the GUI
@@ -0,0 +1,58 @@
+# Stellarium protocol: https://free-astro.org/images/b/b7/Stellarium_telescope_protocol.txt
+
+import struct
+import logging
+
+
+class StellariumFrameReader:
+    """
+    Reassemble the messages of the Stellarium telescope protocol from the received byte stream. Each message starts
+    with its length, so messages split between reads or joined in one read are decoded correctly.
+    """
+    HEADER = struct.Struct("<Hh")  # Length of the message, including the header, and type of the message
+    GOTO = struct.Struct("<hhqIi")  # Length, type, time, RA and DEC of a goto message
+    GOTO_TYPE = 0
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.buffer = bytearray()
+        self.dropped_bytes = 0  # Bytes of invalid or unknown messages
+
+    def feed(self, data: bytes):
+        """
+        Add the received bytes and decode all the complete goto messages in one batch.
+
+        Args:
+            data (bytes): The received bytes
+
+        Returns:
+            list: [RA in hours, DEC in degrees] lists, in the order they were received
+        """
+        self.buffer += data
+        gotos = []
+        position = 0
+        while len(self.buffer) - position >= self.HEADER.size:
+            length, msg_type = self.HEADER.unpack_from(self.buffer, position)
+            if length < self.HEADER.size:
+                position += 1  # Not a valid message start, so search for the next one
+                self.dropped_bytes += 1
+                continue
+            if len(self.buffer) - position < length:
+                break  # Wait for the rest of the message
+
+            if length == self.GOTO.size and msg_type == self.GOTO_TYPE:
+                gotos.append(self.buffer[position:position + length])
+            else:
+                self.logger.warning("Unknown Stellarium message of type %d and %d bytes ignored", msg_type, length)
+                self.dropped_bytes += length
+            position += length
+        del self.buffer[:position]
+
+        return [[ra * (12.0 / 2147483648.0), dec * (90.0 / 1073741824.0)]
+                for _, _, _, ra, dec in self.GOTO.iter_unpack(b"".join(gotos))]
+
+    def reset(self):
+        """
+        Drop the buffered bytes, for example on a new connection.
+        """
+        self.buffer.clear()
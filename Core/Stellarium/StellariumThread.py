@@ -1,6 +1,8 @@
 import logging
 from PyQt5 import QtCore, QtNetwork
 from Core.Stellarium import StellariumDataHandling
+from Core.Stellarium.StellariumFrameReader import StellariumFrameReader
+from Core.Utilities.OutboundQueue import OutboundQueue
 
 
 class StellThread(QtCore.QObject):
@@ -15,6 +17,12 @@ class StellThread(QtCore.QObject):
         super(StellThread, self).__init__(parent)  # Get the parent of the class
         self.cfg_data = cfg_data  # Settings file object
         self.logger = logging.getLogger(__name__)  # Create the logger
+        self.read_settings()  # Keep the connection settings, which are updated when they change
+        cfg_data.subscribe(self.read_settings, (("TCPStell", "host"), ("TCPStell", "port")))
+
+    def read_settings(self, changed=None):
+        # Called by the settings, whenever the address of the server changes
+        self.settings = (self.cfg_data.get_stell_host(), self.cfg_data.get_value("TCPStell", "port"))
 
     # This method is called in every thread start
     def start(self):
@@ -22,16 +30,16 @@ class StellThread(QtCore.QObject):
         mutex.lock()  # Lock the thread until it has started, to avoid any overlapping problems
         self.logger.info("Stellarium server thread started")
         self.socket = None  # Create the instance os the socket variable to use it later
+        self.outbound = None  # Send queue of the socket
         self.data_handle = StellariumDataHandling.StellariumData()  # Data conversion object
+        self.reader = StellariumFrameReader()  # Reassembles the received messages
         self.reConnectSigS.connect(self.connect_stellarium)  # Connect the signal to the connection function
         self.connect_stellarium()  # Start the Stellarium server
         mutex.unlock()  # Unlock the thread, since it has started successfully
 
     @QtCore.pyqtSlot(name='reConnectStell')
     def connect_stellarium(self):
-        # Get the saved data from the settings file
-        self.host = self.cfg_data.get_stell_host()  # Get the TCP connection host
-        self.port = self.cfg_data.get_stell_port()  # Get the TCP connection port
+        self.host, self.port = self.settings  # Latest host and port of the settings
 
         if self.host == "localhost" or self.host == "127.0.0.1":
             self.host = QtNetwork.QHostAddress.LocalHost
@@ -46,7 +54,7 @@ class StellThread(QtCore.QObject):
         self.tcp_server = QtNetwork.QTcpServer()  # Create a server object
         self.tcp_server.newConnection.connect(self._new_connection)  # Handler for a new connection
 
-        self.tcp_server.listen(self.host, int(self.port))  # Start listening for connections
+        self.tcp_server.listen(self.host, self.port)  # Start listening for connections
         self.conStatSigS.emit("Waiting")  # Indicate that the server is listening on the GUI
         self.logger.debug("Stellarium server connection initializer called")
 
@@ -57,6 +65,8 @@ class StellThread(QtCore.QObject):
 
             if self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState:
                 self.tcp_server.close()  # Stop listening for other connections
+                self.reader.reset()  # Drop any partial message of the previous connection
+                self.outbound = OutboundQueue(self.socket, max_queued_bytes=64 * 1024)  # Non blocking sending
                 self.conStatSigS.emit("Connected")  # Indicate that the server has a connection on the GUI
                 self.sendDataStell.connect(self.send)  # Connect the signal trigger for data sending
                 self.socket.readyRead.connect(self._receive)  # If there is pending data get it
@@ -67,13 +77,11 @@ class StellThread(QtCore.QObject):
     # Should we have data pending to be received, this method is called
     def _receive(self):
         try:
-            while self.socket.bytesAvailable() > 0:
-                received_data = self.socket.read(20)  # Get the data as a binary array (we expect 20 bytes each time)
-                received_data = self.data_handle.decode(received_data)  # Decode the Stellarium data to get coordinates
+            # Partial messages stay in the reader until the rest of their bytes arrive
+            for received_data in self.reader.feed(self.socket.readAll().data()):
                 self.dataShowSigS.emit(received_data[0], received_data[1])  # Send the data to be shown on the GUI
                 self.sendClientConn.emit(received_data)  # Emit the signal to send the data to the raspberry pi
         except Exception:
-            # If data is sent fast, then an exception will occur
             self.logger.exception("An exception occurred at data reception. See traceback.")
 
     # If at any moment the connection state is changed, we call this method
@@ -82,7 +90,9 @@ class StellThread(QtCore.QObject):
         self.conStatSigS.emit("Waiting")  # Indicate that the server does not have a connection on the GUI
         self.socket.readyRead.disconnect()  # Close the signal since it not needed
         self.sendDataStell.disconnect()  # Detach the signal to avoid any accidental firing
-        self.tcp_server.listen(self.host, int(self.port))  # Start listening again
+        self.outbound.clear()  # Nothing more can be sent on this connection
+        self.logger.debug("Stellarium send queue statistics: %s", self.outbound.statistics)
+        self.tcp_server.listen(self.host, self.port)  # Start listening again
         self.logger.warning("Stellarium client disconnected")
 
     def _error(self):
@@ -94,9 +104,9 @@ class StellThread(QtCore.QObject):
     def send(self, object_ra: float, object_dec: float):
         try:
             if self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState:
-                self.socket.write(self.data_handle.encode(object_ra, object_dec))  # Send data back to Stellarium
-                self.socket.waitForBytesWritten()  # Wait for the data to be written
-                self.logger.debug("Data sent to Stellarium: RA=%.5f, DEC=%.5f", object_ra, object_dec)
+                # Only the latest position of a burst is sent, since Stellarium just shows the current one
+                if self.outbound.enqueue(self.data_handle.encode(object_ra, object_dec), key="position"):
+                    self.logger.debug("Data sent to Stellarium: RA=%.5f, DEC=%.5f", object_ra, object_dec)
         except Exception:
             self.logger.exception("Problem sending data to Stellarium. See traceback.")
 
@@ -106,6 +116,8 @@ class StellThread(QtCore.QObject):
             self.socket.disconnected.disconnect()  # Close the disconnect signal first to avoid firing
             if self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState:
                 self.sendDataStell.disconnect()  # Disconnect to avoid any accidental firing (Reconnected at start)
+                self.outbound.flush()  # Hand the queued data to the socket, before closing it
+                self.socket.flush()
             self.socket.close()  # Close the underlying TCP socket
         self.reConnectSigS.disconnect()  # Not needed any more since we are closing
         self.conStatSigS.emit("Disconnected")  # Indicate disconnection on the GUI
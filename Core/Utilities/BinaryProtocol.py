@@ -0,0 +1,180 @@
+import enum
+import struct
+import logging
+import numpy as np
+
+
+MAGIC = 0xA5  # First byte of each frame. It never starts a line of the text protocol, which is ASCII.
+HEADER = struct.Struct("<BIB")  # Magic byte, length of the message type and payload, message type
+MAX_FRAME_LENGTH = 1 << 24  # Longer frames are treated as corrupted data
+
+PROTOCOL_REQUEST = "PROTOCOL_BINARY_1\n"  # Sent in text by the client, to ask for the binary framing
+PROTOCOL_ACCEPT = "PROTOCOL_BINARY_OK"  # Answer of a server supporting the binary framing
+SCAN_STREAM_REQUEST = "SCAN_STREAM_1\n"  # Sent in text by the client, to ask for the streaming of the scanning map
+SCAN_STREAM_ACCEPT = "SCAN_STREAM_OK"  # Answer of a server supporting SKY-SCAN-MAP-PART and SKY-SCAN-MAP-END
+
+
+class MessageType(enum.IntEnum):
+    """
+    Types of the binary messages. The payload of each message is a sequence of little endian doubles.
+    """
+    TRANSIT = 1  # HA, DEC
+    TRACK = 2  # HA, DEC, HA speed, DEC speed, tracking time
+    SKY_SCAN = 3  # HA, DEC, HA speed, DEC speed, integration time
+    SKY_SCAN_MAP = 4  # HA, DEC pairs of the whole map
+    SKY_SCAN_MAP_PART = 5  # HA, DEC pairs of a part of the map
+    SKY_SCAN_MAP_END = 6  # No payload
+    POSITION_UPDATE = 16  # HA in hours, DEC
+    DISH_POSITION = 17  # HA in hours, DEC, RA steps, DEC steps
+
+
+# Equivalent commands of the text protocol. Messages with a variable number of values take them as one string.
+TEXT_FORMATS = {
+    MessageType.TRANSIT: "TRNST_RA_%.5f_DEC_%.5f\n",
+    MessageType.TRACK: "TRK_RA_%.5f_DEC_%.5f_RA-SPEED_%.5f_DEC-SPEED_%.5f_TIME_%.2f\n",
+    MessageType.SKY_SCAN: "SKY-SCAN_RA_%f_DEC_%f_RA-SPEED_%f_DEC-SPEED_%f_INT-TIME_%.2f\n",
+    MessageType.SKY_SCAN_MAP: "SKY-SCAN-MAP_%s\n",
+    MessageType.SKY_SCAN_MAP_PART: "SKY-SCAN-MAP-PART_%s\n",
+    MessageType.SKY_SCAN_MAP_END: "SKY-SCAN-MAP-END\n",
+}
+# Commands of the servers which do not support the streaming of the scanning map. They are not terminated by a new line.
+LEGACY_TEXT_FORMATS = {
+    MessageType.SKY_SCAN: "SKY-SCAN_RA_%f_DEC_%f_RA-SPEED_%f_DEC-SPEED_%f_INT-TIME_%.2f",
+    MessageType.SKY_SCAN_MAP: "SKY-SCAN-MAP_%s",
+}
+VARIABLE_LENGTH = (MessageType.SKY_SCAN_MAP, MessageType.SKY_SCAN_MAP_PART)
+
+
+def encode_frame(msg_type: int, values=()):
+    """
+    Pack a message to a binary frame.
+
+    Args:
+        msg_type (int): The `MessageType` of the message
+        values: The values of the message. Arrays of points are flattened.
+
+    Returns:
+        bytes: The frame
+    """
+    payload = np.ascontiguousarray(values, dtype='<f8').tobytes()
+    return HEADER.pack(MAGIC, len(payload) + 1, msg_type) + payload
+
+
+def encode_text(msg_type: int, values=(), legacy=False):
+    """
+    Format a message as a command of the text protocol.
+
+    Args:
+        msg_type (int): The `MessageType` of the message
+        values: The values of the message. Arrays of points are flattened.
+        legacy (bool): Use the format of the servers which do not support the streaming of the scanning map
+
+    Returns:
+        str: The command, with the trailing new line if the format has one
+    """
+    text_format = LEGACY_TEXT_FORMATS.get(msg_type, TEXT_FORMATS[msg_type]) if legacy else TEXT_FORMATS[msg_type]
+    if msg_type in VARIABLE_LENGTH:
+        return text_format % "_".join("%f" % value for value in np.ravel(values))
+    return text_format % tuple(np.ravel(values))
+
+
+def encode_frame_part(msg_type: int, values, position: int, total: int):
+    """
+    Pack a part of a long message, so that the message is sent while its values are calculated. The parts joined in
+    order are the same as the frame of the whole message.
+
+    Args:
+        msg_type (int): The `MessageType` of the message
+        values: The values of this part. Arrays of points are flattened.
+        position (int): Number of values of the message before this part
+        total (int): Number of values of the whole message
+
+    Returns:
+        bytes: The header, if this is the first part, and the values of the part
+    """
+    payload = np.ascontiguousarray(values, dtype='<f8').tobytes()
+    if position == 0:
+        return HEADER.pack(MAGIC, total * 8 + 1, msg_type) + payload
+    return payload
+
+
+def encode_text_part(msg_type: int, values, position: int, total: int, legacy=False):
+    """
+    Format a part of a long command, so that the command is sent while its values are calculated. The parts joined in
+    order are the same as the whole command.
+
+    Args:
+        msg_type (int): The `MessageType` of the message, one of the variable length ones
+        values: The values of this part. Arrays of points are flattened.
+        position (int): Number of values of the message before this part
+        total (int): Number of values of the whole message
+        legacy (bool): Use the format of the servers which do not support the streaming of the scanning map
+
+    Returns:
+        str: The text of the part, with the start of the command if this is the first part and its end if this is
+        the last one
+    """
+    text_format = LEGACY_TEXT_FORMATS.get(msg_type, TEXT_FORMATS[msg_type]) if legacy else TEXT_FORMATS[msg_type]
+    start, end = text_format.split("%s")
+    text = "_".join("%f" % value for value in np.ravel(values))
+    if position == 0:
+        text = start + text
+    elif text:
+        text = "_" + text  # Separator from the values of the previous part
+    if position + np.size(values) >= total:
+        text += end
+    return text
+
+
+class FrameDecoder:
+    """
+    Reassemble the received byte stream to messages. Binary frames and text lines may be mixed in the stream, so the
+    peer can switch to the binary framing at any time after the negotiation.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes):
+        """
+        Add the received bytes and decode all the complete messages. Incomplete messages stay in the buffer.
+
+        Args:
+            data (bytes): The received bytes
+
+        Returns:
+            list: Text lines as strings, without the new line, and binary messages as (type, values) tuples, in the
+            order they were received
+        """
+        self.buffer += data
+        messages = []
+        position = 0
+        while position < len(self.buffer):
+            if self.buffer[position] == MAGIC:
+                if len(self.buffer) - position < HEADER.size:
+                    break  # Incomplete header
+                length, msg_type = HEADER.unpack_from(self.buffer, position)[1:]
+                if not 1 <= length <= MAX_FRAME_LENGTH or (length - 1) % 8:
+                    self.logger.warning("Invalid binary frame header dropped")
+                    position += 1  # Skip the magic byte and search for the next message
+                    continue
+                end = position + HEADER.size - 1 + length
+                if end > len(self.buffer):
+                    break  # Incomplete payload
+                values = np.frombuffer(self.buffer[position + HEADER.size:end], dtype='<f8').tolist()
+                messages.append((msg_type, values))
+                position = end
+            else:
+                end = self.buffer.find(b"\n", position)
+                if end < 0:
+                    break  # Incomplete line
+                messages.append(self.buffer[position:end].decode('utf-8', errors='replace'))
+                position = end + 1
+        del self.buffer[:position]
+        return messages
+
+    def reset(self):
+        """
+        Drop the buffered bytes, for example on a new connection.
+        """
+        self.buffer.clear()
@@ -0,0 +1,107 @@
+import logging
+from collections import deque
+from PyQt5 import QtCore, QtNetwork
+
+
+class OutboundQueue:
+    """
+    Asynchronous send queue of a TCP socket. The messages queued during one pass of the event loop are coalesced to a
+    single write, and more data is handed to the socket only when its own buffer drains, as reported by the
+    `bytesWritten` signal. The thread never blocks waiting for the peer.
+
+    Messages with a key, like the position updates, replace the queued message with the same key, so only the latest
+    of a burst is sent. They are also the only messages that can be dropped: when a slow peer fills the queue, new keyed
+    messages are rejected and counted. Messages without a key are commands and they are always queued, even beyond the
+    limit, so that a command is never lost.
+    """
+    def __init__(self, socket, max_queued_bytes=256 * 1024, high_water_bytes=64 * 1024):
+        """
+        Args:
+            socket: The connected `QTcpSocket`
+            max_queued_bytes (int): Maximum bytes waiting in the queue, above which the keyed messages are dropped
+            high_water_bytes (int): Maximum bytes handed to the socket and not yet written
+        """
+        self.logger = logging.getLogger(__name__)  # Create the logger for the file
+        self.socket = socket
+        self.max_queued_bytes = max_queued_bytes
+        self.high_water_bytes = high_water_bytes
+        self.queued_bytes = 0
+        self.statistics = {"queued": 0, "replaced": 0, "dropped": 0, "dropped_bytes": 0, "writes": 0,
+                           "written_bytes": 0, "max_queued_bytes": 0}
+        self._queue = deque()  # [key, data] entries, in the sending order
+        self._keyed = {}  # Queued entries with a key
+        self._flush_scheduled = False
+        self.socket.bytesWritten.connect(self._bytes_written)
+
+    def enqueue(self, data: bytes, key=None):
+        """
+        Queue a message for sending. The message is written on the next pass of the event loop.
+
+        Args:
+            data (bytes): The message
+            key: Replace the queued message with the same key, instead of adding a new one. Only the messages with a
+                key are dropped when the queue is full.
+
+        Returns:
+            bool: False if the queue is full and the keyed message was dropped
+        """
+        entry = self._keyed.get(key) if key is not None else None
+        if entry is not None:
+            self.queued_bytes += len(data) - len(entry[1])
+            entry[1] = data  # Keep the position in the queue, but send only the latest data
+            self.statistics["replaced"] += 1
+        elif key is not None and self.queued_bytes + len(data) > self.max_queued_bytes:
+            self.statistics["dropped"] += 1
+            self.statistics["dropped_bytes"] += len(data)
+            if self.statistics["dropped"] == 1 or self.statistics["dropped"] % 1000 == 0:
+                self.logger.warning("Send queue is full, %d messages dropped so far", self.statistics["dropped"])
+            return False
+        else:
+            entry = [key, data]
+            self._queue.append(entry)
+            if key is not None:
+                self._keyed[key] = entry
+            self.queued_bytes += len(data)
+            self.statistics["queued"] += 1
+
+        self.statistics["max_queued_bytes"] = max(self.statistics["max_queued_bytes"], self.queued_bytes)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            QtCore.QTimer.singleShot(0, self.flush)  # Coalesce all the messages of this pass of the event loop
+        return True
+
+    def flush(self):
+        """
+        Hand the queued messages to the socket, up to the high water mark of its write buffer.
+        """
+        self._flush_scheduled = False
+        if not self._queue or self.socket.state() != QtNetwork.QAbstractSocket.ConnectedState:
+            return
+
+        room = self.high_water_bytes - self.socket.bytesToWrite()
+        parts = []
+        while self._queue and room > 0:
+            key, data = self._queue.popleft()
+            if key is not None:
+                self._keyed.pop(key, None)
+            parts.append(data)
+            room -= len(data)
+            self.queued_bytes -= len(data)
+
+        if parts:
+            chunk = b"".join(parts)
+            self.socket.write(chunk)  # Qt writes it asynchronously, when the socket is ready
+            self.statistics["writes"] += 1
+            self.statistics["written_bytes"] += len(chunk)
+
+    def clear(self):
+        """
+        Drop all the queued messages, for example when the connection is lost.
+        """
+        self._queue.clear()
+        self._keyed.clear()
+        self.queued_bytes = 0
+
+    def _bytes_written(self, count: int):
+        if self._queue and not self._flush_scheduled:
+            self.flush()  # The socket buffer drained, so send more
@@ -0,0 +1,59 @@
+import threading
+
+
+class SendWindow:
+    """
+    Limit of the messages in flight between a producer thread and a socket. The producer takes a place in the window
+    before it sends each message, and waits while the window is full. The thread of the socket gives the places back
+    once the messages are handed to a socket which is not backed up. A slow peer therefore slows down the producer,
+    instead of filling the event queues and the socket buffer.
+
+    A closed window, for example of a cancelled scan, stops the producer instead of making it wait.
+    """
+    def __init__(self, size=4):
+        """
+        Args:
+            size (int): Maximum messages in flight
+        """
+        self.size = size
+        self.in_flight = 0
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        Take a place for a message, waiting until there is one.
+
+        Args:
+            timeout (float): Maximum seconds to wait. None waits until a place is free or the window is closed.
+
+        Returns:
+            bool: False if the window is closed or the time ran out, so the message must not be sent
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.closed or self.in_flight < self.size, timeout):
+                return False
+            if self.closed:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, count=1):
+        """
+        Give back the places of messages that were sent.
+
+        Args:
+            count (int): Number of messages sent
+        """
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - count)
+            self._condition.notify_all()
+
+    def close(self):
+        """
+        Close the window, so that the producer stops, even if it is waiting.
+        """
+        with self._condition:
+            self.in_flight = 0
+            self.closed = True
+            self._condition.notify_all()
@@ -1,3 +1,6 @@
+import time
+
+
 # Strings of the default file settings are included here
 
 log_config_str = """Logging:
@@ -58,7 +61,7 @@ settings_xml_str = """<settings>
         <host>127.0.0.1</host>
         <port>10001</port>
     </TCP>
-    <TCPStell autoconnect="yes" remote="no">
+    <TCPStell autoconnect="yes" remote="no" update_rate="10">
         <host>127.0.0.1</host>
         <port>10002</port>
     </TCPStell>
@@ -77,4 +80,35 @@ settings_xml_str = """<settings>
     </object>
     <Steps dec_to_home="0" ra_to_home="0" />
 </settings>
-"""
\ No newline at end of file
+"""
+# Sample geostationary satellites as (name, NORAD id, international designator, inclination, RAAN, eccentricity,
+# argument of perigee, mean anomaly). The epoch is filled in when the TLE file is created, since pyephem refuses
+# elements far from their epoch.
+geo_tle_elements = (
+    ("EUTELSAT 7C", 44334, "19034A", 0.0612, 87.2101, 2000, 250.1, 187.3),
+    ("ASTRA 1KR", 29055, "06012A", 0.0451, 12.8032, 3100, 240.4, 120.0),
+    ("HOTBIRD 13E", 27460, "02038A", 0.0702, 95.1120, 4200, 200.2, 211.7),
+    ("INTELSAT 901", 26824, "01024A", 0.0117, 77.4433, 2500, 277.9, 45.2),
+    ("METEOSAT-11", 40732, "15034A", 0.8923, 21.3001, 1500, 110.6, 300.4),
+)
+
+
+def tle_checksum(line: str):
+    """
+    Modulo 10 checksum of a TLE line, where the minus signs count as one.
+    """
+    return str(sum(int(char) if char.isdigit() else int(char == "-") for char in line[:68]) % 10)
+
+
+def geo_tle_str(epoch: time.struct_time):
+    """
+    Create the sample TLE file contents with the provided epoch.
+    """
+    epoch_field = "%02d%012.8f" % (epoch.tm_year % 100, epoch.tm_yday + epoch.tm_hour / 24.0)
+    lines = []
+    for name, norad_id, designator, inclination, ascending_node, eccentricity, perigee, anomaly in geo_tle_elements:
+        line_1 = "1 %05dU %-8s %s -.00000245  00000-0  00000-0 0  999" % (norad_id, designator, epoch_field)
+        line_2 = "2 %05d %8.4f %8.4f %07d %8.4f %8.4f %11.8f%5d" % (norad_id, inclination, ascending_node,
+                                                                    eccentricity, perigee, anomaly, 1.00271, 3001)
+        lines += [name, line_1 + tle_checksum(line_1), line_2 + tle_checksum(line_2)]
+    return "\n".join(lines) + "\n"
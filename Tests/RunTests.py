@@ -1,7 +1,13 @@
 import unittest
 import Tests.test_astronomy
+import Tests.test_config
+import Tests.test_protocol
+import Tests.test_tle
 
 
 if __name__ == "__main__":
     run = unittest.TextTestRunner()
-    run.run(Tests.test_astronomy.TestConversions())
+    run.run(unittest.defaultTestLoader.loadTestsFromModule(Tests.test_astronomy))
+    run.run(unittest.defaultTestLoader.loadTestsFromModule(Tests.test_tle))
+    run.run(unittest.defaultTestLoader.loadTestsFromModule(Tests.test_protocol))
+    run.run(unittest.defaultTestLoader.loadTestsFromModule(Tests.test_config))
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the astronomical calculations, at the sizes used during the operation of the telescope.
+
+The results are written as JSON and compared against the stored baseline. A benchmark slower than the baseline by more
+than the tolerance factor is reported as a regression and the script exits with a non zero code. The benchmarks run
+offline, using the time data files bundled with the tests and a generated sample TLE file.
+
+Usage:
+    python3 -m Tests.benchmark_astronomy [--filter NAME] [--tolerance FACTOR] [--output FILE] [--update-baseline]
+
+Run it from the root directory of the project, like the tests.
+
+The baseline depends on the machine, so it has to be updated with `--update-baseline` when the reference machine
+changes, or after an intended change in performance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import Tests.DefaultData
+from Core.Astronomy import Astronomy
+from Core.Astronomy.AstronomyContext import AstronomyContext
+from Core.Configuration import ConfigData
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.path.join(TESTS_DIR, "Benchmarks")  # Contains the baseline
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+RESULTS_FILE = os.path.join(BENCHMARK_DIR, "results.json")
+DEFAULT_TOLERANCE = 2.0  # Maximum allowed ratio of the measured time to the baseline
+
+FIXED_DATE = (2019, 3, 23, 22, 0, 0)  # Date outside of the sidereal time table, calculated exactly
+CRAB_NEBULA = (83.63308333, 22.0145)  # Stationary test object
+SATELLITE = Tests.DefaultData.geo_tle_elements[0][0]  # Satellite of the sample TLE file
+
+BENCHMARKS = []  # Registered benchmarks as (name, setup function, calls per repeat, repeats)
+
+
+def benchmark(name: str, number=1, repeat=5):
+    """
+    Register a benchmark. The decorated function receives the `Calculations` object and returns the callable to be
+    timed, so that any preparation is excluded from the measurement.
+
+    Args:
+        name (str): Unique name of the benchmark, used as the key in the results
+        number (int): Calls of the callable in each repeat
+        repeat (int): Number of repeats. The best one is kept.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup, number, repeat))
+        return setup
+    return register
+
+
+def scan_box(points_x: int, points_y: int, system="Equatorial"):
+    """
+    Scanning box of a map with points_x * points_y points (plus the initial point), with a step of 0.1 degrees.
+    """
+    right, bottom = 10.0 + points_x * 0.1, 60.0 - points_y * 0.1
+    return ((10.0, 60.0), (right, 60.0), (right, bottom), (10.0, bottom), system, "2019/03/23"), (0.1, 0.1)
+
+
+@benchmark("hour_angle", number=200)
+def bench_hour_angle(calc):
+    return lambda: calc.hour_angle(CRAB_NEBULA[0], CRAB_NEBULA[1], FIXED_DATE)
+
+
+@benchmark("hour_angle_now", number=200)
+def bench_hour_angle_now(calc):
+    return lambda: calc.hour_angle(CRAB_NEBULA[0], CRAB_NEBULA[1])
+
+
+@benchmark("hour_angle_to_ra", number=200)
+def bench_hour_angle_to_ra(calc):
+    return lambda: calc.hour_angle_to_ra(88.622679, CRAB_NEBULA[1], FIXED_DATE)
+
+
+@benchmark("transit", number=100)
+def bench_transit(calc):
+    return lambda: calc.transit(CRAB_NEBULA[0], CRAB_NEBULA[1], 1900, -6789, 20)
+
+
+@benchmark("hour_angle_array_10k", number=5)
+def bench_hour_angle_array(calc):
+    right_ascensions = np.linspace(0.0, 360.0, 10000)
+    declinations = np.linspace(-80.0, 80.0, 10000)
+    return lambda: calc.hour_angle_array(right_ascensions, declinations, FIXED_DATE)
+
+
+@benchmark("scanning_map_1k", number=20)
+def bench_scanning_map_1k(calc):
+    points, step_size = scan_box(40, 25)
+    return lambda: calc.scanning_map(points, step_size, "Direction: R-Down")
+
+
+@benchmark("scanning_map_10k", number=10)
+def bench_scanning_map_10k(calc):
+    points, step_size = scan_box(100, 100)
+    return lambda: calc.scanning_map(points, step_size, "Direction: R-Down")
+
+
+@benchmark("scanning_map_100k")
+def bench_scanning_map_100k(calc):
+    points, step_size = scan_box(400, 250)
+    return lambda: calc.scanning_map(points, step_size, "Direction: R-Down")
+
+
+@benchmark("scanning_map_galactic_100k")
+def bench_scanning_map_galactic(calc):
+    points, step_size = scan_box(400, 250, "Galactic")
+    return lambda: calc.scanning_map(points, step_size, "Direction: R-Down")
+
+
+@benchmark("scanning_map_generator_10k", number=2)
+def bench_scanning_map_generator(calc):
+    points, step_size = scan_box(100, 100)
+    return lambda: calc.scanning_map_generator(points, step_size, "Direction: R-Down")
+
+
+@benchmark("scanning_points_1k", number=5)
+def bench_scanning_points_1k(calc):
+    points, step_size = scan_box(40, 25)
+    map_points = calc.scanning_map(points, step_size, "Direction: R-Down").map_points
+    return lambda: calc.scanning_point_calculator(map_points, (1900, -6789), step_size)
+
+
+@benchmark("scanning_points_10k")
+def bench_scanning_points_10k(calc):
+    points, step_size = scan_box(100, 100)
+    map_points = calc.scanning_map(points, step_size, "Direction: R-Down").map_points
+    return lambda: calc.scanning_point_calculator(map_points, (1900, -6789), step_size)
+
+
+@benchmark("scanning_points_first_chunk_100k", number=20)
+def bench_scanning_points_first_chunk(calc):
+    points, step_size = scan_box(400, 250)
+    map_points = calc.scanning_map(points, step_size, "Direction: R-Down").map_points
+    return lambda: next(calc.scanning_point_stream(map_points, (1900, -6789), step_size)[2])
+
+
+@benchmark("transit_planetary", number=50)
+def bench_transit_planetary(calc):
+    return lambda: calc.transit_planetary("Jupiter", 1900, -6789, 20)
+
+
+@benchmark("tracking_planetary", number=10)
+def bench_tracking_planetary(calc):
+    return lambda: calc.tracking_planetary("Jupiter", 1900, -6789)
+
+
+@benchmark("geo_sat_position", number=20)
+def bench_geo_sat_position(calc):
+    return lambda: calc.geo_sat_position(SATELLITE)
+
+
+@benchmark("geo_sat_trajectory", number=5)
+def bench_geo_sat_trajectory(calc):
+    def run():
+        calc.trajectories.invalidate()  # Propagate the whole trajectory again
+        calc.geo_sat_position(SATELLITE)
+    return run
+
+
+@benchmark("rank_geostationary_500")
+def bench_rank_geostationary(calc):
+    entries = calc.tle_catalog.entries() * 100  # Size of a full geostationary TLE file
+    return lambda: calc.satellites.rank_geostationary(entries)
+
+
+@benchmark("coordinate_transform_galactic", number=200)
+def bench_coordinate_transform(calc):
+    return lambda: calc.coordinate_transform((-1.5, 184.5), ("Galactic", "2019/03/23"))
+
+
+@benchmark("coordinate_transform_horizontal", number=200)
+def bench_coordinate_transform_horizontal(calc):
+    return lambda: calc.coordinate_transform((45.0, 120.0), ("Horizontal", "2019/03/23 22:00:00"))
+
+
+@benchmark("coordinate_transform_array_ecliptic_100k")
+def bench_coordinate_transform_ecliptic(calc):
+    latitudes, longitudes = np.linspace(-80.0, 80.0, 100000), np.linspace(0.0, 360.0, 100000)
+    return lambda: calc.coordinate_transform_array(latitudes, longitudes, ("Ecliptic", "2019/03/23"))
+
+
+@benchmark("coordinate_transform_array_horizontal_1k")
+def bench_coordinate_transform_array_horizontal(calc):
+    altitudes, azimuths = np.linspace(5.0, 85.0, 1000), np.linspace(0.0, 360.0, 1000)
+    return lambda: calc.coordinate_transform_array(altitudes, azimuths, ("Horizontal", "2019/03/23 22:00:00"))
+
+
+def create_calculations(work_dir: str):
+    """
+    Create the `Calculations` object from the default test settings, with the timescale loaded from the time data
+    files of the tests. The sample TLE file is created in the TLE directory of the working directory.
+
+    Args:
+        work_dir (str): Directory where the settings and the TLE file are created
+
+    Returns:
+        Calculations: The object under benchmark
+    """
+    settings_file = os.path.join(work_dir, "settings.xml")
+    with open(settings_file, "w") as settings:
+        settings.write(Tests.DefaultData.settings_xml_str)
+    os.makedirs(os.path.join(work_dir, "TLE"))
+    with open(os.path.join(work_dir, "TLE", "geo.txt"), "w") as tle_file:
+        tle_file.write(Tests.DefaultData.geo_tle_str(time.gmtime()))
+
+    AstronomyContext(0.0, 0.0, data_dir=TESTS_DIR, builtin_timescale=False).refresh()  # Shared by every context
+    calc = Astronomy.Calculations(ConfigData.ConfData(settings_file))
+    calc.context.sidereal.build()  # Build the sidereal time table now, instead of during the measurements
+    return calc
+
+
+def run_benchmarks(calc, name_filter=None):
+    """
+    Run the registered benchmarks.
+
+    Args:
+        calc: The `Calculations` object
+        name_filter (str): Run only the benchmarks containing this string
+
+    Returns:
+        dict: Best time per call in seconds, with the number of calls and repeats, for each benchmark
+    """
+    results = {}
+    for name, setup, number, repeat in BENCHMARKS:
+        if name_filter is not None and name_filter not in name:
+            continue
+        function = setup(calc)
+        function()  # Warm up any cache that is reused in normal operation
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            best = min(best, (time.perf_counter() - start) / number)
+        results[name] = {"seconds": best, "number": number, "repeat": repeat}
+        print("%-42s %12.6f ms" % (name, best * 1000.0))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    Compare the results against the baseline.
+
+    Args:
+        results (dict): The measured results
+        baseline (dict): The baseline results
+        tolerance (float): Maximum allowed ratio of the measured time to the baseline
+
+    Returns:
+        list: Names of the benchmarks that regressed
+    """
+    regressions = []
+    print("\n%-42s %12s %12s %8s" % ("Benchmark", "Time (ms)", "Base (ms)", "Ratio"))
+    for name, result in results.items():
+        if name not in baseline:
+            print("%-42s %12.6f %12s %8s" % (name, result["seconds"] * 1000.0, "-", "new"))
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        status = ""
+        if ratio > tolerance:
+            regressions.append(name)
+            status = "  REGRESSION"
+        print("%-42s %12.6f %12.6f %8.2f%s" % (name, result["seconds"] * 1000.0, baseline[name]["seconds"] * 1000.0,
+                                               ratio, status))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the astronomical calculations")
+    parser.add_argument("--filter", help="Run only the benchmarks containing this string")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown factor against the baseline (default: %(default)s)")
+    parser.add_argument("--output", default=RESULTS_FILE, help="Results file (default: %(default)s)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file (default: %(default)s)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # The satellite position is read from the TLE directory of the working directory
+    try:
+        results = run_benchmarks(create_calculations(work_dir), args.filter)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                stored = json.load(baseline_file)
+            stored["results"].update(results)  # Keep the benchmarks that were filtered out
+            results = stored["results"]
+        report["results"] = results
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2, sort_keys=True)
+        print("\nBaseline updated: %s" % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline found at %s. Run with --update-baseline to create it." % args.baseline)
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nPerformance regressions (slower than %.1fx the baseline): %s"
+              % (args.tolerance, ", ".join(regressions)), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
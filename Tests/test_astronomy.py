@@ -1,9 +1,17 @@
 import os
 import sys
+import shutil
+import tempfile
 import unittest
 import time
-from Core.Astronomy import Astronomy
+import erfa
+import numpy as np
+import ephem
+import threading
+from PyQt5 import QtCore
+from Core.Astronomy import Astronomy, MatrixCache, SiderealTable, EphemerisPool, RateEstimator
 from Core.Configuration import ConfigData
+from Core.Handlers.AstronomyJobPool import AstronomyJobPool
 
 
 class TestConversions(unittest.TestCase):
@@ -28,6 +36,54 @@ class TestConversions(unittest.TestCase):
         right_ascension = self.astronomy.hour_angle_to_ra(88.622679, -1.9425, (2019, 3, 23, 22, 0, 0))
         self.assertEqual(right_ascension, 85.189772, "The calculated right ascension is incorrect")
 
+    def test_hour_angle_array(self):
+        right_ascensions = [85.18975, 83.63308, 10.0]
+        declinations = [-1.9425, 22.0145, 45.0]
+        dates = [(2019, 3, 23.916667,), (2019, 3, 23, 22, 0, 0), (2019, 3, 24, 1, 30, 0)]
+        hour_angles = self.astronomy.hour_angle_array(right_ascensions, declinations, dates)
+        for i, hour_angle in enumerate(hour_angles):
+            expected = self.astronomy.hour_angle(right_ascensions[i], declinations[i], dates[i])
+            self.assertAlmostEqual(hour_angle, expected, 6, "Batch hour angle differs from the scalar one")
+
+        # Round trip with a single date shared by all the points
+        hour_angles = self.astronomy.hour_angle_array(right_ascensions, declinations, dates[1])
+        calc_ra = self.astronomy.hour_angle_to_ra_array(hour_angles, declinations, dates[1])
+        for i, right_ascension in enumerate(calc_ra):
+            expected = self.astronomy.hour_angle_to_ra(hour_angles[i], declinations[i], dates[1])
+            self.assertAlmostEqual(right_ascension, expected, 6, "Batch right ascension differs from the scalar one")
+
+        with self.assertRaises(ValueError):
+            self.astronomy.hour_angle_array(right_ascensions, declinations, dates[:2])
+
+    def test_context_timescale_shared(self):
+        other_context = Astronomy.AstronomyContext(40.0, 20.0)
+        self.assertIs(other_context.timescale, self.astronomy.context.timescale, "Timescale is loaded more than once")
+        self.assertFalse(other_context.refresh_if_changed(), "Timescale reloaded without any data change")
+
+    def test_timescale_reload(self):
+        context_class = Astronomy.AstronomyContext
+        timescale, stamp = context_class._timescale, context_class._data_stamp
+        data_dir = tempfile.mkdtemp()
+        try:
+            for data_file in ("deltat.data", "deltat.preds", "Leap_Second.dat"):
+                shutil.copy(os.path.join("Tests", data_file), data_dir)
+            context = Astronomy.AstronomyContext(40.0, 20.0, data_dir=data_dir)
+            context.refresh()
+            loaded = context.timescale
+            self.assertFalse(context.refresh_if_changed(), "Timescale reloaded without any data change")
+
+            modified = os.path.getmtime(os.path.join(data_dir, "Leap_Second.dat")) + 10.0
+            os.utime(os.path.join(data_dir, "Leap_Second.dat"), (modified, modified))
+            self.assertTrue(context.refresh_if_changed(), "Timescale not reloaded after the data files changed")
+            self.assertIsNot(context.timescale, loaded, "Timescale object was not replaced")
+
+            builtin = Astronomy.AstronomyContext(40.0, 20.0, data_dir=data_dir, builtin_timescale=True)
+            os.utime(os.path.join(data_dir, "Leap_Second.dat"), (modified + 10.0, modified + 10.0))
+            self.assertFalse(builtin.refresh_if_changed(), "Files are watched, although the bundled data is used")
+        finally:
+            context_class._timescale, context_class._data_stamp = timescale, stamp
+            shutil.rmtree(data_dir)
+
     def test_current_time(self):
         current_time_test = self.astronomy.current_time()  # Get the current time under test
         current_time = time.gmtime()  # Get the actual current time
@@ -48,6 +104,195 @@ class TestConversions(unittest.TestCase):
         self.assertEqual(object_dec, -1.9425, "Objects declinations do not match")
         self.assertEqual(target_ha, 118.262936, "Hour angles do not match")
 
+    def test_scanning_map(self):
+        points = ((10.0, 20.0), (11.0, 20.0), (11.0, 19.0), (10.0, 19.0), "Equatorial", "2019/03/23")
+        map_points, raw_points = self.astronomy.scanning_map_generator(points, (0.5, 0.5), "Direction: R-Down")
+        self.assertEqual(raw_points, ((10.0, 20.0), (10.5, 20.0), (11.0, 20.0), (11.0, 19.5), (10.5, 19.5)),
+                         "The scanning grid is incorrect")
+        self.assertEqual(map_points, raw_points, "Equatorial points should not be transformed")
+
+        map_points, raw_points = self.astronomy.scanning_map_generator(points, (0.5, 0.5), "Direction: L-Up")
+        self.assertEqual(raw_points, ((11.0, 19.0), (10.5, 19.0), (10.0, 19.0), (10.0, 18.5), (10.5, 18.5)),
+                         "The scanning grid of the reverse direction is incorrect")
+
+        scan_map = self.astronomy.scanning_map(points[:4] + ("Galactic", "2000/01/01"), (0.5, 0.5),
+                                               "Direction: R-Down")
+        ra_dec = self.astronomy.coordinate_transform(scan_map.raw_points[3], ("Galactic", "2000/01/01"))
+        np.testing.assert_allclose(scan_map.map_points[3], ra_dec, atol=1e-6)
+
+    def test_coordinate_transform_array(self):
+        latitudes = np.array([-60.0, 0.0, 25.5, 89.0])
+        longitudes = np.array([10.0, 120.0, 250.0, 359.0])
+        for frame, system in ((ephem.Galactic, "Galactic"), (ephem.Ecliptic, "Ecliptic")):  # pylint: disable=no-member
+            right_ascensions, declinations = self.astronomy.coordinate_transform_array(latitudes, longitudes,
+                                                                                       (system, "2019/03/23"))
+            for i, latitude in enumerate(latitudes):
+                expected = np.degrees(frame(np.radians(longitudes[i]), np.radians(latitude),
+                                            epoch="2019/03/23").to_radec())
+                self.assertAlmostEqual(right_ascensions[i], expected[0], 9, "%s RA is incorrect" % system)
+                self.assertAlmostEqual(declinations[i], expected[1], 9, "%s DEC is incorrect" % system)
+        self.assertEqual(self.astronomy.context.frames.statistics()["size"], 2, "Matrices are not cached per system")
+
+        observer = self.astronomy.local_observer("2019/03/23 22:00:00")
+        expected = np.degrees(observer.radec_of(np.radians(120.0), np.radians(45.0)))
+        converted = self.astronomy.coordinate_transform((45.0, 120.0), ("Horizontal", "2019/03/23 22:00:00"))
+        np.testing.assert_allclose(converted, expected, atol=1e-9)
+
+    def test_scanning_point_stream(self):
+        points = ((10.0, 20.0), (13.0, 20.0), (13.0, 18.0), (10.0, 18.0), "Equatorial", "2019/03/23")
+        map_points = self.astronomy.scanning_map(points, (0.25, 0.25), "Direction: R-Down").map_points
+        first_point, rates, chunks = self.astronomy.scanning_point_stream(map_points, (1900, -6789), (0.25, 0.25),
+                                                                          chunk_size=10)
+        chunks = list(chunks)
+        self.assertEqual(rates, (0, 0), "Stationary objects should not have rates of change")
+        self.assertTrue(all(len(chunk) <= 10 for chunk in chunks), "Chunks exceed the requested size")
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(map_points) - 1, "Scan points are missing")
+        self.assertEqual(chunks[0][0][1], map_points[1][1], "Declination should pass through the transit")
+
+        self.astronomy.current_time = lambda *args, **kwargs: (2019, 3, 23, 22, 0, 0)  # Freeze the clock
+        target_ha = self.astronomy.transit_array(map_points[:3, 0], map_points[:3, 1], 1900, -6789, 20)[0]
+        for i, hour_angle in enumerate(target_ha):
+            expected = self.astronomy.transit(map_points[i][0], map_points[i][1], 1900, -6789, 20)[0]
+            self.assertAlmostEqual(hour_angle, expected, 6, "Batch transit differs from the scalar one")
+
+    def test_parallel_scanning_points(self):
+        points = ((10.0, 20.0), (13.0, 20.0), (13.0, 18.0), (10.0, 18.0), "Equatorial", "2019/03/23")
+        map_points = self.astronomy.scanning_map(points, (0.25, 0.25), "Direction: R-Down").map_points
+        before = np.concatenate(list(self.astronomy.scanning_point_stream(map_points, (1900, -6789), (0.25, 0.25),
+                                                                          chunk_size=10)[2]))
+        minimum, Astronomy.PARALLEL_SCAN_MIN_POINTS = Astronomy.PARALLEL_SCAN_MIN_POINTS, 0
+        try:
+            parallel = np.concatenate(list(self.astronomy.scanning_point_stream(
+                map_points, (1900, -6789), (0.25, 0.25), chunk_size=10, workers=2)[2]))
+        finally:
+            Astronomy.PARALLEL_SCAN_MIN_POINTS = minimum
+        after = np.concatenate(list(self.astronomy.scanning_point_stream(map_points, (1900, -6789), (0.25, 0.25),
+                                                                         chunk_size=10)[2]))
+
+        np.testing.assert_array_equal(parallel[:, 1], before[:, 1], "Parallel points are not in the map order")
+        # The hour angles depend on the current time, so they can jump between the serial runs
+        matching = np.isclose(parallel[:, 0], before[:, 0], atol=0.1) | \
+            np.isclose(parallel[:, 0], after[:, 0], atol=0.1)
+        self.assertTrue(matching.all(), "Parallel hour angles do not match the serial ones")
+
+
+class TestMatrixCache(unittest.TestCase):
+    def test_precession_cache(self):
+        cache = MatrixCache.PrecessionCache(tolerance=60.0, max_size=2)
+        first = cache.to_jnow([2458566.0], [0.41667])  # Two dates within the same minute
+        second = cache.to_jnow([2458566.0], [0.41668])
+        self.assertTrue((first == second).all(), "Dates within the tolerance should share the matrix")
+        self.assertEqual(cache.statistics(), {"hits": 1, "misses": 1, "size": 1}, "Wrong cache statistics")
+
+        # Both are rotations and, apart from the ICRS frame bias, inverse to each other
+        inverse = cache.to_j2000([2458566.0], [0.41667])
+        self.assertTrue(abs(first[0].dot(first[0].T) - np.identity(3)).max() < 1e-12, "Matrix is not a rotation")
+        self.assertTrue(abs(inverse[0].dot(first[0]) - np.identity(3)).max() < 1e-6, "Matrices are not inverse")
+
+        cache.to_jnow([2458567.0], [0.0])  # Exceed the size to evict the least recently used
+        self.assertEqual(cache.statistics()["size"], 2, "Least recently used matrix was not evicted")
+
+
+class TestEphemerisPool(unittest.TestCase):
+    def test_position_memoised(self):
+        pool = EphemerisPool.EphemerisPool()
+        self.assertIs(pool.body("Jupiter"), pool.body("Jupiter"), "Body objects are not reused")
+
+        jupiter = ephem.Jupiter()  # pylint: disable=no-member
+        jupiter.compute((2019, 3, 23, 22, 0, 0), epoch="2019/3/23")
+        position = pool.position("Jupiter", (2019, 3, 23, 22, 0, 0), "2019/3/23")
+        self.assertEqual(position, (float(jupiter.a_ra), float(jupiter.a_dec)), "Pooled position is wrong")
+
+        pool.position("Jupiter", (2019, 3, 23, 22, 0, 0), "2019/3/23")
+        self.assertEqual(pool.statistics(), {"hits": 1, "misses": 1, "size": 1}, "Position was not memoised")
+
+        with self.assertRaises(ValueError):
+            pool.position("Vulcan", (2019, 3, 23, 22, 0, 0), "2019/3/23")
+
+
+class TestRateEstimator(unittest.TestCase):
+    def test_linear_motion(self):
+        """
+        Object moving 0.01 degrees per second in RA (crossing 360 degrees) and -0.002 degrees per second in DEC.
+        """
+        start = float(ephem.Date((2019, 3, 23, 22, 0, 0)))
+
+        def position(date, epoch):  # pylint: disable=unused-argument
+            seconds = (float(date) - start) * 86400.0
+            return np.radians(((359.0 + 0.01 * seconds) % 360.0, 10.0 - 0.002 * seconds))
+
+        estimator = RateEstimator.RateEstimator(span=600.0, samples=7)
+        rates = estimator.estimate(position, (2019, 3, 23, 22, 0, 0), "2019/3/23", acceleration=True)
+        self.assertAlmostEqual(rates.ra, 359.0, 6, "Wrong fitted right ascension")
+        self.assertAlmostEqual(rates.ra_rate, 0.01, 9, "Wrong right ascension rate")
+        self.assertAlmostEqual(rates.dec_rate, -0.002, 9, "Wrong declination rate")
+        self.assertAlmostEqual(rates.ra_acceleration, 0.0, 9, "Wrong right ascension acceleration")
+        self.assertLess(rates.dec_residual, 1e-6, "Linear motion should fit without residuals")
+
+
+class TestSiderealTable(unittest.TestCase):
+    def test_interpolation_error(self):
+        context = Astronomy.AstronomyContext(40.6306, 22.9589)
+        table = SiderealTable.SiderealTimeTable(context, span=7200.0, refresh_margin=600.0)
+        now = 1553378400.0  # 23/03/2019 22:00:00 UTC
+        table.build(now)
+
+        for offset in np.linspace(-500.0, 5500.0, 25):
+            date = time.gmtime(now + offset)[:6]
+            gast = table.lookup(*erfa.dtf2d(b'UTC', *date))
+            exact = context.timescale.utc(*date).gast
+            self.assertLess(abs(gast - exact), 1e-10, "Interpolated sidereal time exceeds the error bound")
+
+        outside = erfa.dtf2d(b'UTC', *time.gmtime(now + 7200.0)[:6])
+        self.assertIsNone(table.lookup(*outside), "Dates outside the table should not be interpolated")
+
+
+class TestAstronomyJobPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5.0
+        while not condition() and time.monotonic() < deadline:
+            self.app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+
+    def test_result_and_error(self):
+        pool = AstronomyJobPool()
+        results, errors = [], []
+        job = pool.submit(pow, 2, 10, on_result=results.append)
+        failing = pool.submit(int, "not a number", on_error=errors.append)
+        self.wait_for(lambda: results and errors)
+
+        self.assertEqual(results, [1024], "Result was not delivered")
+        self.assertEqual(job.result(), 1024, "Wrong result of the job")
+        self.assertIsInstance(errors[0], ValueError, "Error was not delivered")
+        self.assertTrue(failing.done(), "Failed job should be done")
+        self.assertRaises(ValueError, failing.result)
+        self.assertEqual(pool.statistics["failed"], 1, "Failed job was not counted")
+        self.assertEqual(pool.jobs, {}, "Delivered jobs should be released")
+
+    def test_stream_cancellation(self):
+        pool = AstronomyJobPool()
+        release = threading.Event()
+
+        def chunks():
+            yield 0
+            release.wait(5.0)
+            for i in range(1, 1000):
+                yield i
+
+        items = []
+        job = pool.submit_stream(chunks, on_item=items.append)
+        self.wait_for(lambda: items)
+        job.cancel()
+        release.set()
+        self.wait_for(lambda: not pool.jobs)
+
+        self.assertEqual(items, [0], "Items were delivered after the cancellation")
+        self.assertTrue(job.cancelled(), "Job was not cancelled")
+        self.assertEqual(pool.statistics["cancelled"], 1, "Cancelled job was not counted")
+
 
 if __name__ == "__main__":
     unittest.main()
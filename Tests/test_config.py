@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from Core.Astronomy import Astronomy
+from Core.Configuration import ConfigData
+
+
+class TestConfData(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "settings.xml")
+        shutil.copy(os.path.abspath('Tests/Settings/settings.xml'), self.filename)
+        self.cfg_data = ConfigData.ConfData(self.filename)
+
+    def tearDown(self):
+        self.cfg_data.flush()
+        shutil.rmtree(self.directory)
+
+    def test_deferred_write(self):
+        self.cfg_data.FLUSH_DELAY = 60.0  # Only the explicit flush writes the file
+        modified = os.stat(self.filename).st_mtime_ns
+        for steps in range(100):
+            self.cfg_data.set_home_steps(steps, -steps)
+        self.cfg_data.set_stell_port(1234)
+
+        self.assertEqual(self.cfg_data.get_home_steps(), ["99", "-99"], "Changes are not visible in memory")
+        self.assertEqual(os.stat(self.filename).st_mtime_ns, modified, "File was written before the flush")
+        self.assertEqual(self.cfg_data.dirty, {("Steps", "ra_to_home"), ("Steps", "dec_to_home"), ("TCPStell", "port")})
+
+        self.assertTrue(self.cfg_data.flush(), "Flush failed")
+        self.assertEqual(self.cfg_data.statistics["writes"], 1, "Changes were not written in one batch")
+        self.assertEqual(os.listdir(self.directory), ["settings.xml"], "Temporary file was left behind")
+        saved = ConfigData.ConfData(self.filename)
+        self.assertEqual(saved.get_home_steps(), ["99", "-99"], "Steps were not saved")
+        self.assertEqual(saved.get_stell_port(), "1234", "Port was not saved")
+
+    def test_delayed_flush(self):
+        self.cfg_data.FLUSH_DELAY = 0.2
+        self.cfg_data.set_altitude(123)
+        self.cfg_data._timer.join(5.0)
+        self.assertEqual(self.cfg_data.dirty, set(), "Delayed flush did not run")
+        self.assertEqual(ConfigData.ConfData(self.filename).get_altitude(), "123", "Altitude was not saved")
+
+    def test_typed_index(self):
+        self.assertEqual(self.cfg_data.get_value("location", "latitude"), 40.6306, "Latitude was not converted")
+        self.assertEqual(self.cfg_data.get_value("TCPStell", "port"), 10002, "Port was not converted")
+        self.assertEqual(self.cfg_data.get_value("TCP", "host"), "127.0.0.1", "Text settings should stay text")
+        self.assertEqual(self.cfg_data.get_config("TCP", "port"), "10001", "String getters should return the text")
+
+        self.cfg_data.set_home_steps(1900, -6789)
+        self.assertEqual(self.cfg_data.get_value("Steps", "ra_to_home"), 1900, "Index was not updated on change")
+        self.assertEqual(self.cfg_data.get_home_steps(), ["1900", "-6789"], "Index was not updated on change")
+
+        self.cfg_data.flush()
+        other = ConfigData.ConfData(self.filename)
+        other.set_stell_port("abc")
+        other.flush()
+        self.cfg_data.parse()
+        self.assertEqual(self.cfg_data.get_stell_port(), "abc", "Index was not rebuilt on parse")
+        self.assertIsNone(self.cfg_data.get_value("TCPStell", "port"), "Invalid numbers should not be indexed")
+
+    def test_change_notifications(self):
+        notifications = []
+        subscription = self.cfg_data.subscribe(notifications.append, [("location", "latitude"),
+                                                                      ("location", "longitude")])
+        self.cfg_data.set_lat_lon((41.0, 23.5))
+        self.cfg_data.set_stell_port(1234)
+        self.cfg_data.set_lat_lon((41.0, 23.5))  # No change
+        self.assertEqual(notifications, [{("location", "latitude"), ("location", "longitude")}],
+                         "Location change should be notified once and only to the location subscribers")
+
+        self.cfg_data.unsubscribe(subscription)
+        self.cfg_data.set_lat_lon((42.0, 24.0))
+        self.assertEqual(len(notifications), 1, "Unsubscribed callback was notified")
+
+    def test_batched_changes(self):
+        notifications = []
+        self.cfg_data.subscribe(notifications.append)
+        with self.cfg_data.changes():
+            self.cfg_data.set_lat_lon((41.0, 23.5))
+            self.cfg_data.set_altitude(123)
+            self.assertEqual(self.cfg_data.get_altitude(), "50", "Staged change was applied before the block exit")
+
+            other = threading.Thread(target=self.cfg_data.set_stell_port, args=(1234,))
+            other.start()
+            other.join(5.0)
+            self.assertFalse(other.is_alive(), "Lock was held while the changes were staged")
+            self.assertEqual(notifications, [{("TCPStell", "port")}], "Change of another thread was not applied")
+
+        self.assertEqual(self.cfg_data.get_lat_lon(), ["41.0", "23.5"], "Staged changes were not applied")
+        self.assertEqual(notifications[1:], [{("location", "latitude"), ("location", "longitude"),
+                                              ("location", "altitude")}], "Changes were not notified once")
+        self.assertTrue({("location", "latitude"), ("location", "altitude")} <= self.cfg_data.dirty,
+                        "Applied changes were not marked dirty")
+
+        with self.assertRaises(RuntimeError):
+            with self.cfg_data.changes():
+                self.cfg_data.set_altitude(456)
+                raise RuntimeError("Failed block")
+        self.assertEqual(self.cfg_data.get_altitude(), "123", "Changes of a failed block were applied")
+
+    def test_location_update(self):
+        astronomy = Astronomy.Calculations(self.cfg_data)
+        previous = astronomy.context.observer
+        self.cfg_data.set_lat_lon((-33.5, 151.25))
+        self.cfg_data.set_altitude(250)
+        self.assertIsNot(astronomy.context.observer, previous, "Location was not replaced as a whole")
+        self.assertAlmostEqual(previous.latitude, 40.6306, 9, "Previous location should not be modified in place")
+        self.assertAlmostEqual(astronomy.context.latitude, -33.5, 9, "Context latitude was not updated")
+        self.assertAlmostEqual(astronomy.context.longitude, 151.25, 9, "Context longitude was not updated")
+        self.assertEqual(astronomy.local_observer("2019/03/23").elevation, 250.0, "Observer altitude was not updated")
+
+
+if __name__ == "__main__":
+    unittest.main()
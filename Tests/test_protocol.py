@@ -0,0 +1,318 @@
+import os
+import shutil
+import tempfile
+import time
+import struct
+import threading
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from PyQt5 import QtCore, QtNetwork
+from Core.Astronomy.Astronomy import Calculations
+from Core.Client.ClientThread import ClientThread
+from Core.Configuration import ConfigData
+from Core.Handlers.OperationHandler import OpHandler
+from Core.Handlers.MessageDispatcher import MessageDispatcher, PositionUpdate, DishPosition
+from Core.Handlers.PositionPublisher import PositionPublisher
+from Core.Stellarium.StellariumFrameReader import StellariumFrameReader
+from Core.Utilities import BinaryProtocol
+from Core.Utilities.BinaryProtocol import MessageType, FrameDecoder
+from Core.Utilities.OutboundQueue import OutboundQueue
+from Core.Utilities.SendWindow import SendWindow
+
+
+class TestBinaryProtocol(unittest.TestCase):
+    def test_text_fallback(self):
+        self.assertEqual(BinaryProtocol.encode_text(MessageType.TRANSIT, (12.3456789, -5.5)),
+                         "TRNST_RA_%.5f_DEC_%.5f\n" % (12.3456789, -5.5), "Wrong transit command")
+        self.assertEqual(BinaryProtocol.encode_text(MessageType.SKY_SCAN, (1.0, 2.0, 0.1, 0.2, 3.0)),
+                         "SKY-SCAN_RA_%f_DEC_%f_RA-SPEED_%f_DEC-SPEED_%f_INT-TIME_%.2f\n" % (1.0, 2.0, 0.1, 0.2, 3.0),
+                         "Wrong scan command")
+        points = np.random.default_rng(1).uniform(-90.0, 90.0, (50, 2))
+        self.assertEqual(BinaryProtocol.encode_text(MessageType.SKY_SCAN_MAP_PART, points),
+                         "SKY-SCAN-MAP-PART_%s\n" % Calculations.format_scan_points(points), "Wrong map points")
+        self.assertEqual(BinaryProtocol.encode_text(MessageType.SKY_SCAN_MAP_END, ()), "SKY-SCAN-MAP-END\n",
+                         "Wrong map end command")
+        self.assertEqual(BinaryProtocol.encode_text(MessageType.SKY_SCAN, (1.0, 2.0, 0.1, 0.2, 3.0), legacy=True),
+                         "SKY-SCAN_RA_%f_DEC_%f_RA-SPEED_%f_DEC-SPEED_%f_INT-TIME_%.2f" % (1.0, 2.0, 0.1, 0.2, 3.0),
+                         "Legacy scan command should not change")
+        self.assertEqual(BinaryProtocol.encode_text(MessageType.SKY_SCAN_MAP, points, legacy=True),
+                         "SKY-SCAN-MAP_%s" % Calculations.format_scan_points(points), "Legacy map should not change")
+
+    def test_parts(self):
+        points = np.random.default_rng(3).uniform(-90.0, 90.0, (25, 2))
+        parts = [(points[:1], 0), (points[1:10], 2), (points[10:], 20)]
+        for legacy in (True, False):
+            text = "".join(BinaryProtocol.encode_text_part(MessageType.SKY_SCAN_MAP, part, position, 50, legacy)
+                           for part, position in parts)
+            self.assertEqual(text, BinaryProtocol.encode_text(MessageType.SKY_SCAN_MAP, points, legacy),
+                             "Joined parts are not the same as the whole command")
+        frame = b"".join(BinaryProtocol.encode_frame_part(MessageType.SKY_SCAN_MAP, part, position, 50)
+                         for part, position in parts)
+        self.assertEqual(frame, BinaryProtocol.encode_frame(MessageType.SKY_SCAN_MAP, points),
+                         "Joined parts are not the same as the whole frame")
+        self.assertEqual(BinaryProtocol.encode_text_part(MessageType.SKY_SCAN_MAP, (), 20, 20), "\n",
+                         "Empty last part should only end the command")
+
+    def test_frames(self):
+        points = np.random.default_rng(2).uniform(-90.0, 90.0, (1000, 2))
+        frame = BinaryProtocol.encode_frame(MessageType.SKY_SCAN_MAP_PART, points)
+        self.assertEqual(len(frame), BinaryProtocol.HEADER.size + points.size * 8, "Wrong frame size")
+        self.assertLess(len(frame), len(BinaryProtocol.encode_text(MessageType.SKY_SCAN_MAP_PART, points)),
+                        "Binary frame is not smaller than the text")
+
+        stream = b"POSUPDATE_RA_1.0_DEC_2.0\n" + frame + BinaryProtocol.encode_frame(MessageType.SKY_SCAN_MAP_END) + \
+            BinaryProtocol.encode_frame(MessageType.DISH_POSITION, (1.5, -2.5, 100.0, 200.0)) + b"MOTORS_ENABLED\n"
+        decoder = FrameDecoder()
+        messages = []
+        for i in range(0, len(stream), 7):  # Split the frames at arbitrary points
+            messages += decoder.feed(stream[i:i + 7])
+
+        self.assertEqual(len(messages), 5, "Messages were lost or split")
+        self.assertEqual(messages[0], "POSUPDATE_RA_1.0_DEC_2.0", "Wrong text line")
+        self.assertEqual(messages[1][0], MessageType.SKY_SCAN_MAP_PART, "Wrong message type")
+        np.testing.assert_array_equal(np.reshape(messages[1][1], (-1, 2)), points, "Values were not preserved")
+        self.assertEqual(messages[2], (MessageType.SKY_SCAN_MAP_END, []), "Wrong empty message")
+        self.assertEqual(messages[3], (MessageType.DISH_POSITION, [1.5, -2.5, 100.0, 200.0]), "Wrong position")
+        self.assertEqual(messages[4], "MOTORS_ENABLED", "Text after the frames was lost")
+        self.assertEqual(len(decoder.buffer), 0, "Bytes were left in the buffer")
+
+
+class TestOutboundQueue(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])  # Kept for the later tests
+
+    def setUp(self):
+        self.server = QtNetwork.QTcpServer()
+        self.server.listen(QtNetwork.QHostAddress.LocalHost, 0)
+        self.client = QtNetwork.QTcpSocket()
+        self.client.connectToHost(QtNetwork.QHostAddress.LocalHost, self.server.serverPort())
+        self.assertTrue(self.client.waitForConnected(1000) and self.server.waitForNewConnection(1000),
+                        "Local connection failed")
+        self.peer = self.server.nextPendingConnection()
+        self.queue = OutboundQueue(self.peer, max_queued_bytes=1000)
+
+    def tearDown(self):
+        self.peer.close()
+        self.client.close()
+        self.server.close()
+
+    def receive(self, size: int):
+        received = b""
+        deadline = time.monotonic() + 2.0
+        while len(received) < size and time.monotonic() < deadline:
+            self.app.processEvents()
+            if self.client.waitForReadyRead(10):
+                received += self.client.readAll().data()
+        return received
+
+    def test_coalescing(self):
+        for i in range(100):
+            self.assertTrue(self.queue.enqueue(b"%03d" % i, key="position"), "Keyed message was dropped")
+        for i in range(10):
+            self.queue.enqueue(b"LINE_%d\n" % i)
+        self.assertEqual(self.queue.statistics["replaced"], 99, "Positions were not replaced")
+
+        self.assertEqual(self.receive(3 + 70), b"099" + b"".join(b"LINE_%d\n" % i for i in range(10)),
+                         "Wrong data received")
+        self.assertEqual(self.queue.statistics["writes"], 1, "Messages were not coalesced")
+
+    def test_backpressure(self):
+        for i in range(10):
+            self.assertTrue(self.queue.enqueue(b"x" * 100, key=i), "Keyed message was dropped before the limit")
+        self.assertFalse(self.queue.enqueue(b"y" * 100, key="position"), "Full queue accepted a keyed message")
+        for i in range(10):
+            self.assertTrue(self.queue.enqueue(b"z" * 100), "Command was dropped")
+        self.assertEqual(self.queue.statistics["dropped"], 1, "Wrong number of dropped messages")
+        self.assertEqual(self.queue.queued_bytes, 2000, "Wrong queue size")
+        self.assertEqual(self.receive(2000), b"x" * 1000 + b"z" * 1000, "Queued messages were not sent")
+        self.assertEqual(self.queue.queued_bytes, 0, "Queue was not emptied")
+
+
+class TestSendWindow(unittest.TestCase):
+    def test_window(self):
+        window = SendWindow(size=2)
+        self.assertTrue(window.acquire(0) and window.acquire(0), "Window was full too early")
+        self.assertFalse(window.acquire(0.05), "Full window accepted a message")
+
+        results = []
+        producer = threading.Thread(target=lambda: results.append(window.acquire()))
+        producer.start()
+        producer.join(0.1)
+        self.assertEqual(results, [], "Producer did not wait for a place")
+        window.release()
+        producer.join(1.0)
+        self.assertEqual(results, [True], "Released place was not taken")
+
+        producer = threading.Thread(target=lambda: results.append(window.acquire()))
+        producer.start()
+        window.close()
+        producer.join(1.0)
+        self.assertEqual(results, [True, False], "Closed window did not stop the producer")
+
+    def test_scan_commands(self):
+        cfg_data = ConfigData.ConfData(os.path.abspath('Tests/Settings/settings.xml'))
+        handler = SimpleNamespace(astronomy=Calculations(cfg_data), scan_workers=1)
+        points = ((10.0, 20.0), (13.0, 20.0), (13.0, 18.0), (10.0, 18.0), "Equatorial", "2019/03/23")
+        map_points = handler.astronomy.scanning_map(points, (0.1, 0.1), "Direction: R-Down").map_points
+        window = SendWindow(size=2)
+        commands = OpHandler.scan_commands(handler, map_points, (1900, -6789), (0.1, 0.1), 0.0, None, False, window)
+
+        self.assertEqual(next(commands)[0], MessageType.SKY_SCAN, "Scan command was not sent first")
+        parts = [next(commands), next(commands)]
+        self.assertEqual([part[2] for part in parts], [0, 2], "Wrong positions of the parts")
+        self.assertTrue(all(part[3] == 2 * len(map_points) and part[4] is window for part in parts), "Wrong parts")
+
+        producer = threading.Thread(target=lambda: parts.append(next(commands)))
+        producer.start()
+        producer.join(0.2)
+        self.assertEqual(len(parts), 2, "Parts were calculated before the previous ones were sent")
+        window.release(2)
+        producer.join(5.0)
+        self.assertEqual(parts[2][2], 2 + parts[1][1].size, "Parts are not contiguous")
+
+        window.close()
+        self.assertEqual(list(commands), [], "Cancelled scan was not stopped")
+
+
+class TestClientNegotiation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, "settings.xml")
+        shutil.copy(os.path.abspath('Tests/Settings/settings.xml'), filename)
+        self.cfg_data = ConfigData.ConfData(filename)
+        self.cfg_data.FLUSH_DELAY = 60.0  # Only the explicit flush writes the file
+        self.server = QtNetwork.QTcpServer()
+        self.server.listen(QtNetwork.QHostAddress.LocalHost, 0)
+        self.cfg_data.set_tcp_client_port(self.server.serverPort())
+        self.client = ClientThread(self.cfg_data)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+        self.cfg_data.flush()
+        shutil.rmtree(self.directory)
+
+    def negotiation(self):
+        self.client.start()
+        self.assertTrue(self.server.waitForNewConnection(1000), "Client did not connect")
+        peer = self.server.nextPendingConnection()
+        received = b""
+        deadline = time.monotonic() + 2.0
+        while b"REPORT_MOTOR_STATUS\n" not in received and time.monotonic() < deadline:
+            self.client.sock.waitForBytesWritten(10)  # The client socket is written from the event loop
+            if peer.waitForReadyRead(10):
+                received += peer.readAll().data()
+        peer.close()
+        return received.decode('utf-8')
+
+    def test_disabled_by_default(self):
+        received = self.negotiation()
+        self.assertTrue(received.startswith("CONNECT_CLIENT\n"), "Initial commands were not sent")
+        self.assertNotIn(BinaryProtocol.PROTOCOL_REQUEST, received, "Binary framing was requested without the setting")
+        self.assertNotIn(BinaryProtocol.SCAN_STREAM_REQUEST, received, "Streaming was requested without the setting")
+
+    def test_enabled(self):
+        self.cfg_data.set_attribute("TCP", "binary", "yes")
+        self.cfg_data.set_attribute("TCP", "scan_stream", "yes")
+        received = self.negotiation()
+        self.assertTrue(received.startswith(BinaryProtocol.PROTOCOL_REQUEST + BinaryProtocol.SCAN_STREAM_REQUEST),
+                        "Enabled protocols were not requested before the initial commands")
+
+
+class TestStellariumFrameReader(unittest.TestCase):
+    def test_stream(self):
+        positions = [(i * 0.2, -80.0 + i * 1.5) for i in range(100)]
+        stream = b"".join(struct.pack("<hhqIi", 20, 0, 0, round(ra * 2147483648.0 / 12.0),
+                                      round(dec * 1073741824.0 / 90.0)) for ra, dec in positions)
+        stream = stream[:600] + struct.pack("<Hh", 8, 5) + b"\x00" * 4 + stream[600:]  # Unknown message type
+
+        reader = StellariumFrameReader()
+        decoded = []
+        for i in range(0, len(stream), 13):  # Split the messages at arbitrary points
+            decoded += reader.feed(stream[i:i + 13])
+
+        self.assertEqual(len(decoded), len(positions), "Messages were dropped")
+        for (ra, dec), (ra_expected, dec_expected) in zip(decoded, positions):
+            self.assertAlmostEqual(ra, ra_expected, 6, "Wrong right ascension")
+            self.assertAlmostEqual(dec, dec_expected, 6, "Wrong declination")
+        self.assertEqual(len(reader.buffer), 0, "Bytes were left in the buffer")
+
+
+class TestPositionPublisher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def test_rate_limit(self):
+        publisher = PositionPublisher(rate=20.0)
+        published = []
+        publisher.positionReady.connect(lambda object_ra, object_dec: published.append((object_ra, object_dec)))
+        publisher.start()
+        for i in range(100):
+            publisher.update(float(i), 0.0)
+        self.assertEqual(published, [], "Position was published before the tick")
+
+        deadline = time.monotonic() + 1.0
+        while not published and time.monotonic() < deadline:
+            self.app.processEvents(QtCore.QEventLoop.AllEvents, 10)
+        self.assertEqual(published, [(99.0, 0.0)], "Only the latest position should be published")
+
+        publisher.publish_now(1.0, 2.0)
+        self.assertEqual(published[-1], (1.0, 2.0), "Final position was not published at once")
+        publisher.set_rate(0)
+        publisher.update(3.0, 4.0)
+        self.assertEqual(published[-1], (3.0, 4.0), "Position was delayed without a rate limit")
+        publisher.stop()
+
+    def test_rate_change(self):
+        publisher = PositionPublisher(rate=20.0)
+        publisher.start()
+        sender = threading.Thread(target=publisher.rateChange.emit, args=(5.0,))
+        sender.start()
+        sender.join()
+        self.assertEqual(publisher.rate, 20.0, "Rate was changed outside of the thread of the publisher")
+
+        self.app.processEvents(QtCore.QEventLoop.AllEvents, 100)
+        self.assertEqual(publisher.rate, 5.0, "Rate change was not delivered")
+        self.assertEqual(publisher.timer.interval(), 200, "Timer was not restarted with the new rate")
+        publisher.stop()
+
+
+class TestMessageDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.received = []
+        self.dispatcher = MessageDispatcher("test")
+        self.dispatcher.register("POSUPDATE", PositionUpdate, [(2, float), (4, float)], self.received.append,
+                                 MessageType.POSITION_UPDATE)
+        self.dispatcher.register("DISHPOS", DishPosition, [(2, float), (4, float), (7, int), (9, int)],
+                                 self.received.append, MessageType.DISH_POSITION)
+
+    def test_dispatch(self):
+        self.assertTrue(self.dispatcher.dispatch("POSUPDATE_RA_1.5_DEC_-20.25"), "Registered message not dispatched")
+        self.assertTrue(self.dispatcher.dispatch("DISHPOS_RA_2.5_DEC_10.0_STEPS_RA_120_DEC_-40"),
+                        "Registered message not dispatched")
+        self.assertTrue(self.dispatcher.dispatch_values(MessageType.DISH_POSITION, [2.5, 10.0, 120.0, -40.0]),
+                        "Binary message not dispatched")
+        self.assertFalse(self.dispatcher.dispatch("MOTORS_ENABLED"), "Unknown message was dispatched")
+        self.assertEqual(self.received, [PositionUpdate(1.5, -20.25), DishPosition(2.5, 10.0, 120, -40),
+                                         DishPosition(2.5, 10.0, 120, -40)], "Wrong typed messages")
+        self.assertIsInstance(self.received[1].ra_steps, int, "Field was not converted")
+
+    def test_statistics(self):
+        for _ in range(10):
+            self.dispatcher.dispatch("POSUPDATE_RA_1.5_DEC_-20.25")
+        self.dispatcher.dispatch("POSUPDATE_RA_invalid")  # Missing and malformed fields
+        self.dispatcher.dispatch("UNKNOWN_1")
+
+        statistics = self.dispatcher.statistics()
+        self.assertEqual(statistics["unknown"], 1, "Unknown messages were not counted")
+        self.assertEqual(statistics["POSUPDATE"]["count"], 10, "Messages were not counted")
+        self.assertEqual(statistics["POSUPDATE"]["errors"], 1, "Malformed message was not counted")
+        self.assertEqual(sum(statistics["POSUPDATE"]["histogram"].values()), 10, "Latencies were not recorded")
+        self.assertEqual(statistics["DISHPOS"]["count"], 0, "Wrong count of an unused message type")
@@ -0,0 +1,239 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import ephem
+import numpy as np
+from PyQt5 import QtCore
+import Tests.DefaultData
+from Core.Astronomy import Astronomy
+from Core.Configuration import ConfigData
+from Core.Astronomy.AstronomyContext import AstronomyContext
+from Core.Astronomy.SatellitePropagator import SatellitePropagator
+from Core.Astronomy.TrajectoryCache import TrajectoryCache
+from Core.Handlers.TLECatalog import TLECatalog
+from Core.Handlers.TLEHandler import TLEHandler
+
+
+class TestTLECatalog(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.tle_file = os.path.join(self.work_dir, "geo.txt")
+        with open(self.tle_file, "w") as tle_file:
+            tle_file.write(Tests.DefaultData.geo_tle_str(time.gmtime()))
+        self.catalog = TLECatalog(self.tle_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.catalog), len(Tests.DefaultData.geo_tle_elements), "Satellites are missing")
+        entry = self.catalog.get("eutelsat 7c")
+        self.assertEqual(entry.name, "EUTELSAT 7C", "Name lookup is not case insensitive")
+        self.assertIs(self.catalog.get(44334), entry, "NORAD ID lookup returned a different entry")
+        self.assertIs(self.catalog.get("44334"), entry, "NORAD ID lookup as string returned a different entry")
+        self.assertTrue(entry.line1.startswith("1 44334U") and entry.line2.startswith("2 44334 "), "Wrong lines")
+        with self.assertRaises(KeyError):
+            self.catalog.get("ASTRA 2E")
+
+    def test_duplicate_names(self):
+        lines = Tests.DefaultData.geo_tle_str(time.gmtime()).splitlines()
+        with open(self.tle_file, "w") as tle_file:
+            tle_file.write("\n".join(["EUTELSAT 7C"] + lines[4:6] + lines[:3]) + "\n")  # Second satellite renamed
+        self.assertEqual(len(self.catalog), 2, "Satellites sharing a name were dropped")
+        self.assertEqual([entry.norad_id for entry in self.catalog.entries()], [int(lines[4][2:7]), 44334],
+                         "Entries are not in the order of the file")
+        self.assertEqual(self.catalog.get("EUTELSAT 7C").norad_id, 44334, "Name lookup should return the last one")
+        self.assertEqual(self.catalog.get(int(lines[4][2:7])).name, "EUTELSAT 7C", "NORAD ID lookup failed")
+
+    def test_invalidation(self):
+        self.catalog.get("ASTRA 1KR")
+        lines = Tests.DefaultData.geo_tle_str(time.gmtime()).splitlines()
+        with open(self.tle_file, "w") as tle_file:
+            tle_file.write("\n".join(lines[3:6]) + "\n")  # Keep only the second satellite
+        self.assertEqual(self.catalog.names(), ["ASTRA 1KR"], "Catalog was not parsed again after the change")
+
+        os.remove(self.tle_file)
+        self.assertNotIn("ASTRA 1KR", self.catalog, "Catalog of a removed file should be empty")
+
+    def test_several_files(self):
+        lines = Tests.DefaultData.geo_tle_str(time.gmtime()).splitlines()
+        other_file = os.path.join(self.work_dir, "other.txt")
+        with open(other_file, "w") as tle_file:
+            tle_file.write("\n".join(["EUTELSAT 7C NEW"] + lines[1:3]) + "\n")  # First satellite renamed
+        self.catalog.set_files([self.tle_file, other_file, os.path.join(self.work_dir, "missing.txt")])
+        self.assertEqual(len(self.catalog), len(Tests.DefaultData.geo_tle_elements), "Satellites were not merged")
+        self.assertEqual(self.catalog.get(44334).name, "EUTELSAT 7C NEW", "Last file should take precedence")
+        self.assertIn("ASTRA 1KR", self.catalog, "Satellites of the first file are missing")
+
+        os.remove(other_file)
+        self.assertEqual(self.catalog.get(44334).name, "EUTELSAT 7C", "Catalog was not parsed again after the change")
+
+    def test_geo_sat_position(self):
+        cfg_data = ConfigData.ConfData(os.path.abspath('Tests/Settings/settings.xml'))
+        astronomy = Astronomy.Calculations(cfg_data, tle_catalog=self.catalog)
+        alt_az, ha_dec = astronomy.geo_sat_position("EUTELSAT 7C")
+        self.assertTrue(-90.0 <= alt_az[0] <= 90.0 and -10.0 <= ha_dec[1] <= 10.0, "Implausible GEO position")
+        self.assertIsNone(astronomy.geo_sat_position("ASTRA 2E"), "Unknown satellite should not have a position")
+
+
+class TestSatellitePropagator(unittest.TestCase):
+    def setUp(self):
+        self.start = time.gmtime()
+        lines = Tests.DefaultData.geo_tle_str(self.start).splitlines()
+        self.entries = [TLECatalog().parse_lines(lines[i:i + 3])[0] for i in range(0, len(lines), 3)]
+        self.propagator = SatellitePropagator(AstronomyContext(40.6, 22.9, 50.0))
+
+    def test_against_pyephem(self):
+        offsets = np.array([0.0, 3600.0, 7200.0])
+        track = self.propagator.propagate(self.entries, offsets, self.start[:6])
+        self.assertEqual(track.altitude.shape, (len(self.entries), offsets.size), "Wrong shape of the results")
+
+        observer = ephem.Observer()
+        observer.lat, observer.lon, observer.elevation = "40.6", "22.9", 50.0
+        observer.pressure = 0  # No refraction
+        for i, entry in enumerate(self.entries):
+            satellite = ephem.readtle(entry.name, entry.line1, entry.line2)
+            for j, offset in enumerate(offsets):
+                observer.date = ephem.Date(ephem.Date(self.start[:6]) + offset * ephem.second)
+                satellite.compute(observer)
+                hour_angle = np.degrees(observer.sidereal_time() - satellite.ra)
+                self.assertAlmostEqual(track.altitude[i][j], np.degrees(satellite.alt), 1, "Wrong altitude")
+                self.assertAlmostEqual(track.azimuth[i][j], np.degrees(satellite.az), 1, "Wrong azimuth")
+                self.assertAlmostEqual((track.hour_angle[i][j] - hour_angle + 180.0) % 360.0 - 180.0, 0.0, 1,
+                                       "Wrong hour angle")
+                self.assertAlmostEqual(track.declination[i][j], np.degrees(satellite.dec), 1, "Wrong declination")
+
+    def test_ranking(self):
+        candidates = self.propagator.rank_geostationary(self.entries, span=7200.0, step=600.0,
+                                                        start=self.start[:6])
+        self.assertTrue(candidates, "Visible geostationary satellites were not found")
+        self.assertTrue(all(candidate.altitude >= 10.0 for candidate in candidates), "Satellite below the horizon")
+        drifts = [candidate.drift for candidate in candidates]
+        self.assertEqual(drifts, sorted(drifts), "Candidates are not sorted by their drift")
+
+
+class TestTrajectoryCache(unittest.TestCase):
+    def setUp(self):
+        self.now = float(int(time.time()))
+        lines = Tests.DefaultData.geo_tle_str(time.gmtime(self.now)).splitlines()
+        self.entries = [TLECatalog().parse_lines(lines[i:i + 3])[0] for i in range(0, len(lines), 3)]
+        self.propagator = SatellitePropagator(AstronomyContext(40.6, 22.9, 50.0))
+        self.cache = TrajectoryCache(self.propagator, span=3600.0, step=60.0)
+
+    def test_interpolation(self):
+        for offset in (0.0, 37.5, 1234.0, 3600.0):
+            track = self.propagator.propagate(self.entries[:1], (offset,), time.gmtime(self.now)[:6])
+            position = self.cache.position(self.entries[0], self.now + offset)
+            self.assertAlmostEqual(position.altitude, track.altitude[0][0], 4, "Wrong interpolated altitude")
+            self.assertAlmostEqual(position.azimuth, track.azimuth[0][0], 4, "Wrong interpolated azimuth")
+            self.assertAlmostEqual(position.hour_angle, track.hour_angle[0][0], 4, "Wrong interpolated hour angle")
+            self.assertAlmostEqual(position.declination, track.declination[0][0], 4, "Wrong interpolated declination")
+        self.assertEqual(self.cache.statistics(), {"hits": 3, "misses": 1, "size": 1}, "Trajectory was not reused")
+
+    def test_invalidation(self):
+        self.cache.position(self.entries[0], self.now)
+        self.cache.position(self.entries[0], self.now + 3601.0)  # Outside of the span
+        self.assertEqual(self.cache.misses, 2, "Expired trajectory was reused")
+
+        lines = Tests.DefaultData.geo_tle_str(time.gmtime(self.now - 86400.0)).splitlines()
+        self.cache.position(TLECatalog().parse_lines(lines[:3])[0], self.now + 3601.0)  # New elements
+        self.assertEqual(self.cache.misses, 3, "Trajectory of the old elements was reused")
+
+
+class TLERequestHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in of a TLE server, which answers the conditional requests with its ETag.
+    """
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"%d"' % hash(body)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # Keep the test output clean
+
+
+class TestTLEDownload(unittest.TestCase):
+    def setUp(self):
+        self.cfg_data = ConfigData.ConfData(os.path.abspath('Tests/Settings/settings.xml'))
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)  # The TLE files are saved in the TLE directory of the working directory
+
+        self.server = HTTPServer(("127.0.0.1", 0), TLERequestHandler)
+        self.server.requests = []
+        self.server.files = {"/geo.txt": Tests.DefaultData.geo_tle_str(time.gmtime()).encode(),
+                             "/other.txt": Tests.DefaultData.geo_tle_str(time.gmtime()).encode()[:209]}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:%d/" % self.server.server_port
+        self.handler = TLEHandler(self.cfg_data)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_conditional_download(self):
+        urls = [self.url + "geo.txt", self.url + "other.txt"]
+        self.assertEqual(self.handler.tle_retriever(urls), [True, ""], "Download failed")
+        for url in urls:
+            with open(self.handler.tle_file(url), "rb") as tle_file:
+                self.assertEqual(tle_file.read(), self.server.files["/" + url.split("/")[-1]], "Wrong contents")
+        self.assertEqual(sorted(os.listdir("TLE")), ["geo.txt", "geo.txt.meta", "other.txt", "other.txt.meta"],
+                         "Temporary files were left")
+
+        self.server.requests.clear()
+        self.assertEqual(self.handler.download(urls[0], self.handler.tle_file(urls[0])), [True, False, ""],
+                         "Unchanged file was downloaded again")
+        self.assertIsNotNone(self.server.requests[0][1], "Request was not conditional")
+
+    def test_failed_download(self):
+        file_path = self.handler.tle_file(self.url + "geo.txt")
+        self.handler.download(self.url + "geo.txt", file_path)
+        result = self.handler.tle_retriever([self.url + "missing.txt"])
+        self.assertFalse(result[0], "Missing file was reported as downloaded")
+        self.assertTrue(os.path.exists(file_path), "Failed download removed an existing file")
+        self.assertEqual(sorted(os.listdir("TLE")), ["geo.txt", "geo.txt.meta"], "Partial files were left")
+
+    def test_background_refresh(self):
+        statuses = []
+        self.handler.tle_urls = lambda: [self.url + "geo.txt"]
+        self.handler.tleStatusSig.connect(statuses.append)
+        self.assertEqual(self.handler.refresh(), "Success^TLE file(s) updated", "Missing file was not downloaded")
+        self.assertEqual(statuses, ["", "Success^TLE file(s) updated"], "Wrong status signals")
+        self.assertEqual(self.handler.refresh(), "", "Valid file was downloaded again")
+
+        os.remove(self.handler.tle_files()[0])
+        self.assertTrue(self.handler.refresh_in_background(), "Refresh was not started")
+        QtCore.QThreadPool.globalInstance().waitForDone(10000)
+        self.assertTrue(os.path.exists(self.handler.tle_files()[0]), "Background refresh did not download the file")
+
+    def test_several_urls(self):
+        self.handler.tle_urls = lambda: [self.url + "geo.txt", self.url + "other.txt"]
+        self.assertEqual(self.handler.refresh(), "Success^TLE file(s) updated", "Missing files were not downloaded")
+        self.assertEqual(self.handler.catalog.file_paths, self.handler.tle_files(), "Not all the files were indexed")
+        self.assertEqual(len(self.handler.catalog), len(Tests.DefaultData.geo_tle_elements),
+                         "Satellites of the files were not merged")
+
+        os.remove(self.handler.tle_files()[1])
+        self.assertEqual(self.handler.tle_expiry_checker(), [False, True, "File not found"],
+                         "Missing second file was not detected")
+        self.assertEqual(self.handler.refresh(), "Success^TLE file(s) updated", "Second file was not downloaded")
+        self.assertTrue(os.path.exists(self.handler.tle_files()[1]), "Second file was not downloaded")